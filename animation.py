@@ -0,0 +1,190 @@
+#!/usr/bin/env python
+# ===============================================================================
+# animation.py
+#
+# Compact binary animation files for the LED 8x8 matrices.
+#
+# File layout, all values little endian:
+#
+#   header  - magic "LEDA", version (u8), matrices per frame (u8),
+#             reserved (u16), frame count (u32)
+#   index   - one entry per frame: data offset (u32), duration in ms (u16),
+#             flags (u8), reserved (u8)
+#   data    - frame data, 8 bytes per matrix (one byte per row, same layout
+#             as the 64 bit icons), optionally run length encoded as
+#             (count, byte) pairs
+#
+# Files are memory-mapped and checked once when opened. Frames are decoded on
+# demand into a single reused buffer, so memory use doesn't grow with the
+# length of the animation.
+# ===============================================================================
+import mmap
+import struct
+import sys
+
+MAGIC = b"LEDA"
+VERSION = 1
+HEADER = struct.Struct("<4sBBHI")
+INDEX_ENTRY = struct.Struct("<IHBx")
+FLAG_RLE = 0x01
+
+
+def screen_to_bytes(screen):
+    """Pack a screen, one 64 bit bitmap per matrix, into frame bytes."""
+    return b"".join(value.to_bytes(8, "little") for value in screen)
+
+
+def rle_encode(data):
+    out = bytearray()
+    i = 0
+    while i < len(data):
+        run = 1
+        while i + run < len(data) and run < 255 and data[i + run] == data[i]:
+            run += 1
+        out.append(run)
+        out.append(data[i])
+        i += run
+    return bytes(out)
+
+
+def write_animation(filename, frames, rle=True):
+    """Write frames, a list of (screen, duration_ms) pairs, to filename. Each
+    frame is run length encoded if rle is set and that makes it smaller.
+    """
+    if not frames:
+        raise ValueError("animation needs at least one frame")
+    matrices = len(frames[0][0])
+    index = []
+    data = bytearray()
+    data_start = HEADER.size + INDEX_ENTRY.size * len(frames)
+    for screen, duration_ms in frames:
+        if len(screen) != matrices:
+            raise ValueError("all frames must cover {} matrices".format(matrices))
+        raw = screen_to_bytes(screen)
+        flags = 0
+        if rle:
+            encoded = rle_encode(raw)
+            if len(encoded) < len(raw):
+                raw = encoded
+                flags |= FLAG_RLE
+        index.append(INDEX_ENTRY.pack(data_start + len(data), duration_ms, flags))
+        data += raw
+    with open(filename, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, matrices, 0, len(frames)))
+        f.write(b"".join(index))
+        f.write(data)
+
+
+class Animation:
+    """Memory-mapped animation file. Frames are decoded into self.frame, a
+    buffer of 8 bytes per matrix that is reused for every frame. Raises
+    ValueError for a file that is not an animation, or is truncated or
+    corrupt.
+    """
+
+    def __init__(self, filename):
+        with open(filename, "rb") as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.view = None
+        try:
+            if len(self.mm) < HEADER.size:
+                raise ValueError("too short")
+            magic, version, self.matrices, _, self.frame_count = HEADER.unpack_from(
+                self.mm
+            )
+            if magic != MAGIC or version != VERSION:
+                raise ValueError("not a version {} animation".format(VERSION))
+            self.view = memoryview(self.mm)
+            self.frame_size = 8 * self.matrices
+            self.frame = bytearray(self.frame_size)
+            self.frame_view = memoryview(self.frame)
+            self.matrix_views = [
+                self.frame_view[8 * m : 8 * m + 8] for m in range(self.matrices)
+            ]
+            # checked once here, so playing never trips over a bad frame
+            for i in range(self.frame_count):
+                self.check_frame(i)
+        except ValueError as e:
+            self.close()
+            raise ValueError("{}: {}".format(filename, e))
+
+    def check_frame(self, i):
+        """Raise ValueError unless frame i decodes to exactly one frame
+        within the file.
+        """
+        entry = HEADER.size + INDEX_ENTRY.size * i
+        if entry + INDEX_ENTRY.size > len(self.mm):
+            raise ValueError("index truncated at frame {}".format(i))
+        offset, duration_ms, flags = INDEX_ENTRY.unpack_from(self.mm, entry)
+        if not flags & FLAG_RLE:
+            if offset + self.frame_size > len(self.mm):
+                raise ValueError("frame {} runs past the end".format(i))
+            return
+        pos = 0
+        pair = offset
+        while pos < self.frame_size:
+            if pair + 2 > len(self.mm):
+                raise ValueError("frame {} runs past the end".format(i))
+            run = self.mm[pair]
+            if run == 0 or pos + run > self.frame_size:
+                raise ValueError("frame {} has a bad run length".format(i))
+            pos += run
+            pair += 2
+
+    def __len__(self):
+        return self.frame_count
+
+    def close(self):
+        if self.view is not None:
+            for view in self.matrix_views:
+                view.release()
+            self.frame_view.release()
+            self.view.release()
+            self.view = None
+        self.mm.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def load_frame(self, i):
+        """Decode frame i into self.frame and return its duration in ms."""
+        offset, duration_ms, flags = INDEX_ENTRY.unpack_from(
+            self.mm, HEADER.size + INDEX_ENTRY.size * i
+        )
+        frame = self.frame
+        if not flags & FLAG_RLE:
+            frame[:] = self.view[offset : offset + self.frame_size]
+            return duration_ms
+        mm = self.mm
+        pos = 0
+        while pos < self.frame_size:
+            run = mm[offset]
+            value = mm[offset + 1]
+            offset += 2
+            for j in range(pos, pos + run):
+                frame[j] = value
+            pos += run
+        return duration_ms
+
+    def matrix_value(self, matrix):
+        """64 bit bitmap of a matrix in the currently loaded frame."""
+        return int.from_bytes(self.matrix_views[matrix], "little")
+
+
+# -------------------------------------------------------------------------------
+#  M A I N
+# -------------------------------------------------------------------------------
+if __name__ == "__main__":
+    from led_disp import LEDDisplay
+
+    if len(sys.argv) < 2:
+        print("usage: {} ANIMATION [LOOPS]".format(sys.argv[0]))
+        sys.exit(1)
+    loops = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+    display = LEDDisplay()
+    display.clear_display()
+    with Animation(sys.argv[1]) as animation:
+        display.play_animation(animation, loops=loops)
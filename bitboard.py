@@ -0,0 +1,128 @@
+# ===============================================================================
+# bitboard.py
+#
+# Game field for the LED games kept as one integer bitmask per row. Bit x of
+# row y is the cell at x, y, which is also the pixel layout of a matrix row,
+# so a board exports to display bitmaps without visiting every cell.
+# ===============================================================================
+
+
+class BitBoard(object):
+    def __init__(self, width, height, val=0):
+        self.width = width
+        self.height = height
+        self.full_row = (1 << width) - 1
+        self.clear(val)
+
+    def clear(self, val=0):
+        """Set every cell to val."""
+        self.rows = [self.full_row if val else 0] * self.height
+
+    def in_bounds(self, x, y):
+        return 0 <= x < self.width and 0 <= y < self.height
+
+    def get(self, x, y):
+        """Returns the cell at x, y, cells outside the board are 0."""
+        if not self.in_bounds(x, y):
+            return 0
+        return self.rows[y] >> x & 0x01
+
+    def set(self, x, y, value):
+        """Set the cell at x, y, cells outside the board are ignored."""
+        if not self.in_bounds(x, y):
+            return
+        if value:
+            self.rows[y] |= 1 << x
+        else:
+            self.rows[y] &= ~(1 << x)
+
+    def row_mask(self, x, width):
+        """Mask covering columns x to x + width - 1, clipped to the board."""
+        if x < 0:
+            width += x
+            x = 0
+        if width <= 0:
+            return 0
+        return ((1 << width) - 1) << x & self.full_row
+
+    def stamp(self, x, y, width, height, value):
+        """Set every cell of the width x height rectangle at x, y to value."""
+        mask = self.row_mask(x, width)
+        if not mask:
+            return
+        for row in range(max(y, 0), min(y + height, self.height)):
+            if value:
+                self.rows[row] |= mask
+            else:
+                self.rows[row] &= ~mask
+
+    def collides(self, x, y, width, height):
+        """Returns True if any cell of the rectangle at x, y is set."""
+        mask = self.row_mask(x, width)
+        if not mask:
+            return False
+        for row in range(max(y, 0), min(y + height, self.height)):
+            if self.rows[row] & mask:
+                return True
+        return False
+
+    def to_raw64(self, matrix=0):
+        """64 bit bitmap of the 8x8 block of the board shown on matrix."""
+        shift = 8 * matrix
+        value = 0
+        for y in range(min(8, self.height)):
+            value |= (self.rows[y] >> shift & 0xFF) << (8 * y)
+        return value
+
+    def screen(self, size):
+        """Board as a screen, one 64 bit bitmap for each of size matrices."""
+        return tuple(self.to_raw64(matrix) for matrix in range(size))
+
+
+class FreeCells(object):
+    """Set of free cell indices (y * width + x) supporting O(1) add, remove
+    and uniform random choice. Free cells are kept packed at the front of
+    self.cells, self.slots maps a cell to its position in self.cells.
+    """
+
+    def __init__(self, num_cells, occupied=0):
+        self.cells = list(range(num_cells))
+        self.slots = list(range(num_cells))
+        self.reset(occupied)
+
+    def reset(self, occupied=0):
+        """Mark every cell free except those set in the occupied bitset."""
+        self.size = len(self.cells)
+        for cell in range(len(self.cells)):
+            if occupied >> cell & 0x01:
+                self.remove(cell)
+
+    def __len__(self):
+        return self.size
+
+    def __contains__(self, cell):
+        return self.slots[cell] < self.size
+
+    def _swap(self, i, j):
+        cells = self.cells
+        cells[i], cells[j] = cells[j], cells[i]
+        self.slots[cells[i]] = i
+        self.slots[cells[j]] = j
+
+    def remove(self, cell):
+        if cell not in self:
+            return
+        self.size -= 1
+        self._swap(self.slots[cell], self.size)
+
+    def add(self, cell):
+        if cell in self:
+            return
+        self._swap(self.slots[cell], self.size)
+        self.size += 1
+
+    def choice(self, rng):
+        """Uniformly random free cell, or None if every cell is taken."""
+        if not self.size:
+            return None
+        return self.cells[rng.randrange(self.size)]
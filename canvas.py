@@ -0,0 +1,178 @@
+# ===============================================================================
+# canvas.py
+#
+# Tiled canvas spanning any grid of 8x8 matrices.
+#
+# A canvas is a width x height pixel bitmap, kept like a BitBoard as one
+# integer per row, split into 8x8 tiles. Each tile says which matrix shows it
+# (I2C bus and address) and how that matrix is mounted, so a wall of matrices
+# wired in any order and orientation, across several buses, can be drawn as
+# one picture. The layout is read from a JSON file:
+#
+#   {
+#     "columns": 8, "rows": 2,
+#     "tiles": [
+#       {"bus": 1, "address": "0x70", "column": 0, "row": 0, "rotation": 0},
+#       ...
+#     ]
+#   }
+#
+# rotation is 0, 90, 180 or 270, the clockwise angle each tile's image is
+# turned before it is written, to make up for matrices mounted turned around.
+# ===============================================================================
+import json
+from collections import namedtuple
+
+from led_disp import DEFAULT_BUS, LEDDisplay
+
+FIRST_ADDRESS = 0x70
+ADDRESSES_PER_BUS = 8
+
+Tile = namedtuple("Tile", ["bus", "address", "column", "row", "rotation"])
+
+
+def _rotated_bit(x, y, rotation):
+    """Bit of a 64 bit bitmap that pixel x, y moves to when rotated."""
+    if rotation == 90:
+        x, y = 7 - y, x
+    elif rotation == 180:
+        x, y = 7 - x, 7 - y
+    elif rotation == 270:
+        x, y = y, 7 - x
+    return 8 * y + x
+
+
+# ROTATE[rotation][y][row_byte] is row y of a bitmap moved to where it goes
+# once rotated, so a bitmap rotates with one lookup per row.
+ROTATE = dict(
+    (
+        rotation,
+        tuple(
+            tuple(
+                sum(
+                    ((byte >> x) & 0x01) << _rotated_bit(x, y, rotation)
+                    for x in range(8)
+                )
+                for byte in range(256)
+            )
+            for y in range(8)
+        ),
+    )
+    for rotation in (90, 180, 270)
+)
+
+
+def rotate_raw64(value, rotation):
+    """Rotate a 64 bit bitmap clockwise by rotation degrees."""
+    if not rotation:
+        return value
+    table = ROTATE[rotation]
+    rotated = 0
+    for y in range(8):
+        rotated |= table[y][value >> (8 * y) & 0xFF]
+    return rotated
+
+
+class TiledCanvas(object):
+    """columns x rows tiles, tiles[i] being the tile shown on matrix i of the
+    display built from the canvas.
+    """
+
+    def __init__(self, columns, rows, tiles):
+        self.columns = columns
+        self.rows = rows
+        self.width = 8 * columns
+        self.height = 8 * rows
+        self.tiles = list(tiles)
+        for tile in self.tiles:
+            if not (0 <= tile.column < columns and 0 <= tile.row < rows):
+                raise ValueError("tile {} is outside the canvas".format(tile))
+            if tile.rotation not in (0, 90, 180, 270):
+                raise ValueError("bad rotation for tile {}".format(tile))
+
+    @classmethod
+    def grid(cls, columns=4, rows=1, rotation=0, buses=(DEFAULT_BUS,)):
+        """Tiles left to right, top to bottom, split evenly between buses in
+        runs of consecutive addresses from 0x70.
+        """
+        num_tiles = columns * rows
+        per_bus = -(-num_tiles // len(buses))
+        if per_bus > ADDRESSES_PER_BUS:
+            raise ValueError("not enough buses for {} matrices".format(num_tiles))
+        tiles = []
+        for i in range(num_tiles):
+            bus_index, offset = divmod(i, per_bus)
+            tiles.append(
+                Tile(
+                    buses[bus_index],
+                    FIRST_ADDRESS + offset,
+                    i % columns,
+                    i // columns,
+                    rotation,
+                )
+            )
+        return cls(columns, rows, tiles)
+
+    @classmethod
+    def load(cls, filename):
+        """Read a canvas layout from a JSON file, see the top of this file."""
+        with open(filename) as f:
+            layout = json.load(f)
+        tiles = []
+        for tile in layout["tiles"]:
+            address = tile["address"]
+            if not isinstance(address, int):
+                address = int(address, 0)
+            tiles.append(
+                Tile(
+                    tile.get("bus", DEFAULT_BUS),
+                    address,
+                    tile["column"],
+                    tile["row"],
+                    tile.get("rotation", 0),
+                )
+            )
+        return cls(layout["columns"], layout["rows"], tiles)
+
+    def __len__(self):
+        return len(self.tiles)
+
+    def layout(self):
+        """(bus, address) of every matrix, for LEDDisplay."""
+        return [(tile.bus, tile.address) for tile in self.tiles]
+
+    def display(self, brightness=0):
+        """Open an LEDDisplay with a matrix for every tile."""
+        return LEDDisplay(brightness=brightness, layout=self.layout())
+
+    def locate(self, x, y):
+        """(matrix, x, y) of the matrix pixel showing canvas pixel x, y, or
+        None if no tile covers it.
+        """
+        for matrix, tile in enumerate(self.tiles):
+            if tile.column == x // 8 and tile.row == y // 8:
+                bit = _rotated_bit(x % 8, y % 8, tile.rotation)
+                return matrix, bit % 8, bit // 8
+        return None
+
+    def tile_raw64(self, rows, tile):
+        """64 bit bitmap of tile cut from a canvas held as one integer per
+        row, bit x of rows[y] being pixel x, y.
+        """
+        shift = 8 * tile.column
+        top = 8 * tile.row
+        value = 0
+        for y in range(8):
+            value |= (rows[top + y] >> shift & 0xFF) << (8 * y)
+        return rotate_raw64(value, tile.rotation)
+
+    def screen(self, rows):
+        """Screen, one 64 bit bitmap per matrix, for the canvas rows."""
+        return tuple(self.tile_raw64(rows, tile) for tile in self.tiles)
+
+
+def load_canvas(filename=None):
+    """Canvas from a layout file, or the original four matrices in a row."""
+    if filename is None:
+        return TiledCanvas.grid(4, 1)
+    return TiledCanvas.load(filename)
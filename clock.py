@@ -7,10 +7,10 @@
 # 2014-09-12
 # Carter Nelson
 # ===============================================================================
+import sys
 import time
 
-from led_disp import LEDDisplay, LEDDisplayPadding, reset_display
-from led8x8icons import LED8x8ICONS as ICONS
+from led_disp import LEDDisplay, LEDDisplayPadding, reset_display, number_screen
 
 
 def time2int(time_struct, format24=True):
@@ -27,35 +27,63 @@ def time2int(time_struct, format24=True):
     return h * 100 + m
 
 
+def clock_padding(format24=True):
+    return LEDDisplayPadding.PAD_ZEROS if format24 else LEDDisplayPadding.PAD_EMPTY
+
+
+def render_clock(format24=True, size=4, now=None):
+    """Return the screen showing the current time, or the time now (seconds
+    since the epoch).
+    """
+    val = time2int(time.localtime(now), format24=format24)
+    return number_screen(val, size, clock_padding(format24))
+
+
 def display_clock(display, format24=True):
     old_val = time2int(time.localtime(), format24=format24)
-    padding = LEDDisplayPadding.PAD_ZEROS if format24 else LEDDisplayPadding.PAD_EMPTY
-    display.disp_number(old_val, scroll=True, padding=padding)
+    display.disp_number(old_val, scroll=True, padding=clock_padding(format24))
     return True
 
 
-def update_display(display, new_val, old_val):
+def update_display(display, new_val, old_val, format24=True):
     """Update the display, one digit at a time, where values differ."""
     if not (isinstance(new_val, int) and isinstance(old_val, int)):
         return
     if new_val == old_val:
         return
-    for i in range(3, -1, -1):
-        new_d = new_val % 10
-        display.scroll_raw64(ICONS["{0}".format(new_d)], i)
-        new_val //= 10
+    size = len(display.matrices)
+    new_screen = number_screen(new_val, size, clock_padding(format24))
+    old_screen = number_screen(old_val, size, clock_padding(format24))
+    if new_screen is None or old_screen is None:
+        return
+    for i, (new_d, old_d) in enumerate(zip(new_screen, old_screen)):
+        if new_d != old_d:
+            display.scroll_raw64(new_d, i)
+
+
+def seconds_to_next_minute(now=None):
+    """Seconds until the wall clock next rolls over to a new minute."""
+    if now is None:
+        now = time.time()
+    return 60 - now % 60
+
+
+def run_clock(display, format24=True):
+    """Loop forever showing the time. Sleeps until each minute boundary and
+    then scrolls in only the digits that changed, usually just the last one.
+    """
+    size = len(display.matrices)
+    while True:
+        display.update_screen(render_clock(format24, size))
+        time.sleep(seconds_to_next_minute())
 
 
 # -------------------------------------------------------------------------------
 #  M A I N
 # -------------------------------------------------------------------------------
 if __name__ == "__main__":
+    format24 = not (len(sys.argv) > 1 and sys.argv[1] == "12")
     display = LEDDisplay()
     reset_display(display)
     time.sleep(5)
-    while True:
-        """Loop forever, updating every 2 seconds."""
-        display_clock(display, format24=True)
-        time.sleep(2)
-        display_clock(display, format24=False)
-        time.sleep(2)
+    run_clock(display, format24=format24)
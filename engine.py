@@ -0,0 +1,145 @@
+# ===============================================================================
+# engine.py
+#
+# Entities shared by the LED games (snake.py, pong.py).
+#
+# Positions and velocities are integer fixed point, FIX_ONE being one cell,
+# so stepping never allocates floats. Pieces are axis aligned boxes of
+# width x height cells whose corner is at their point; everything uses
+# __slots__ to keep the per-tick allocation rate near zero.
+# ===============================================================================
+FIX_SHIFT = 8
+FIX_ONE = 1 << FIX_SHIFT
+
+
+def to_fixed(value):
+    return int(round(value * FIX_ONE))
+
+
+def to_cell(fixed):
+    """Cell index of a fixed point coordinate, truncated towards zero."""
+    if fixed < 0:
+        return -(-fixed >> FIX_SHIFT)
+    return fixed >> FIX_SHIFT
+
+
+class Point(object):
+    __slots__ = ("x", "y", "fvx", "fvy", "max_fvx", "max_fvy")
+
+    def __init__(self, dx, dy, vx=0, vy=0, max_vx=2, max_vy=2):
+        self.x = to_fixed(dx)
+        self.y = to_fixed(dy)
+        self.max_fvx = to_fixed(max_vx)
+        self.max_fvy = to_fixed(max_vy)
+        self.fvx = self._clip_v(to_fixed(vx), self.max_fvx)
+        self.fvy = self._clip_v(to_fixed(vy), self.max_fvy)
+
+    def copy_from(self, other):
+        self.x = other.x
+        self.y = other.y
+        self.fvx = other.fvx
+        self.fvy = other.fvy
+        self.max_fvx = other.max_fvx
+        self.max_fvy = other.max_fvy
+
+    def copy(self):
+        point = Point(0, 0)
+        point.copy_from(self)
+        return point
+
+    @property
+    def dx(self):
+        return self.x / float(FIX_ONE)
+
+    @property
+    def dy(self):
+        return self.y / float(FIX_ONE)
+
+    @property
+    def vx(self):
+        return self.fvx / float(FIX_ONE)
+
+    @property
+    def vy(self):
+        return self.fvy / float(FIX_ONE)
+
+    def cell_x(self):
+        return to_cell(self.x)
+
+    def cell_y(self):
+        return to_cell(self.y)
+
+    def step(self):
+        self.x += self.fvx
+        self.y += self.fvy
+
+    def _clip_v(self, new_v, max_v):
+        v = min(abs(new_v), max_v)
+        if new_v < 0:
+            v *= -1
+        return v
+
+    def set_fvx(self, new_fvx):
+        self.fvx = self._clip_v(new_fvx, self.max_fvx)
+
+    def set_fvy(self, new_fvy):
+        self.fvy = self._clip_v(new_fvy, self.max_fvy)
+
+    def set_vx(self, new_vx):
+        self.set_fvx(to_fixed(new_vx))
+
+    def set_vy(self, new_vy):
+        self.set_fvy(to_fixed(new_vy))
+
+    def __repr__(self):
+        return str(self)
+
+    def __str__(self):
+        return "<Point at dx={}, dy={}, vx={}, vy={}>".format(
+            self.dx, self.dy, self.vx, self.vy
+        )
+
+
+class Piece(object):
+    __slots__ = ("width", "height", "initial_point", "point")
+
+    def __init__(self, width, height, initial_point):
+        self.width = width
+        self.height = height
+        self.initial_point = initial_point
+        self.point = initial_point.copy()
+        self.reset()
+
+    def reset(self):
+        self.point.copy_from(self.initial_point)
+
+    def cell_x(self):
+        """Left column of the piece. Negative positions mirror back onto the
+        board, as the games have always done.
+        """
+        return abs(self.point.cell_x())
+
+    def cell_y(self):
+        """Top row of the piece, mirrored like cell_x."""
+        return abs(self.point.cell_y())
+
+    def get_position(self):
+        """Every cell covered by the piece, for debugging and display."""
+        x = self.cell_x()
+        y = self.cell_y()
+        return [[x + i, y + j] for i in range(self.width) for j in range(self.height)]
+
+    def step(self):
+        self.point.step()
+
+    def set_vx(self, vx):
+        self.point.set_vx(vx)
+
+    def set_vy(self, vy):
+        self.point.set_vy(vy)
+
+    def get_vx(self):
+        return self.point.vx
+
+    def get_vy(self):
+        return self.point.vy
@@ -0,0 +1,321 @@
+#!/usr/bin/env python
+# ===============================================================================
+# events.py
+#
+# Structured event log that never blocks the caller.
+#
+# An event is a name, a severity and some fields. Logging one appends it to a
+# fixed-size ring buffer of recent events, and to a queue that a writer
+# thread empties every few seconds (at once for errors) in one batched write,
+# to a size-rotated file of compact JSON lines (DEFAULT_LOG_DIR/NAME.log
+# unless told otherwise) or, given "-", to stdout. Low severity events can be
+# sampled, keeping a fraction of them. Until start() is called events only go
+# to the ring buffer, so library code can log freely.
+#
+# The ring buffer is dumped to a file on SIGUSR2, or with dump():
+#
+#   python weather_climacell.py climacell_cfg.json --log=/var/log/weather.log
+#   python weather_climacell.py climacell_cfg.json --log-level=debug \
+#       --log-sample=debug=0.1                     # keep a tenth of DEBUG
+#   kill -USR2 $(pgrep -f weather_climacell.py)
+#   python events.py /var/log/weather.log      # print events readably
+# ===============================================================================
+import atexit
+import json
+import os
+import random
+import signal
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+LEVEL_NAMES = {DEBUG: "DEBUG", INFO: "INFO", WARNING: "WARNING", ERROR: "ERROR"}
+LEVELS = dict((name.lower(), level) for level, name in LEVEL_NAMES.items())
+
+# a few hundred bytes per event
+DEFAULT_CAPACITY = 256
+# seconds between batched writes
+DEFAULT_FLUSH_INTERVAL = 5.0
+DEFAULT_MAX_BYTES = 1024 * 1024
+DEFAULT_BACKUPS = 3
+DEFAULT_DUMP_DIR = "/tmp"
+DEFAULT_LOG_DIR = "/tmp"
+
+
+class RotatingFile(object):
+    """Append-only file that moves to path.1 (path.1 to path.2 ...) once it
+    grows past max_bytes, keeping up to backups old files.
+    """
+
+    def __init__(self, path, max_bytes=DEFAULT_MAX_BYTES, backups=DEFAULT_BACKUPS):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.f = open(path, "a")
+
+    def write(self, data):
+        self.f.write(data)
+        self.f.flush()
+        if self.f.tell() >= self.max_bytes:
+            self.rotate()
+
+    def rotate(self):
+        self.f.close()
+        for i in range(self.backups - 1, 0, -1):
+            older = "{}.{}".format(self.path, i)
+            if os.path.exists(older):
+                os.replace(older, "{}.{}".format(self.path, i + 1))
+        if self.backups:
+            os.replace(self.path, self.path + ".1")
+        else:
+            os.unlink(self.path)
+        self.f = open(self.path, "a")
+
+    def close(self):
+        self.f.close()
+
+
+class EventLog(object):
+    def __init__(
+        self,
+        capacity=DEFAULT_CAPACITY,
+        level=INFO,
+        sample=None,
+        rng=None,
+    ):
+        """Keeps the last capacity events. Events below level are dropped,
+        and of those at a level in sample, only that fraction is kept, e.g.
+        {DEBUG: 0.1}.
+        """
+        self.ring = deque(maxlen=capacity)
+        # full, appending pushes the oldest out
+        self.pending = deque(maxlen=capacity)
+        self.capacity = capacity
+        self.level = level
+        self.sample = dict(sample or {})
+        self.rng = rng or random.Random()
+        self.sampled_out = 0
+        self.dropped = 0
+        self.name = "events"
+        self.out = None
+        self.writer = None
+        self.wake = threading.Event()
+        self.dump_requested = False
+        self.dump_dir = DEFAULT_DUMP_DIR
+        self.stopping = False
+
+    def log(self, level, event, **fields):
+        if level < self.level:
+            return
+        rate = self.sample.get(level)
+        if rate is not None and self.rng.random() >= rate:
+            self.sampled_out += 1
+            return
+        record = (time.time(), level, event, fields)
+        self.ring.append(record)
+        if self.writer is not None:
+            pending = self.pending
+            if len(pending) == self.capacity:
+                # the writer has fallen behind, keep the newest. The writer
+                # may empty pending meanwhile, so this can overcount by one,
+                # but never fails
+                self.dropped += 1
+            pending.append(record)
+            if level >= ERROR:
+                self.wake.set()
+
+    def debug(self, event, **fields):
+        self.log(DEBUG, event, **fields)
+
+    def info(self, event, **fields):
+        self.log(INFO, event, **fields)
+
+    def warning(self, event, **fields):
+        self.log(WARNING, event, **fields)
+
+    def error(self, event, **fields):
+        self.log(ERROR, event, **fields)
+
+    def exception(self, event, **fields):
+        """Log an ERROR with the traceback of the exception being handled."""
+        self.log(ERROR, event, traceback=traceback.format_exc(), **fields)
+
+    def recent(self, count=None):
+        """The newest count events (all kept by default), as dicts."""
+        records = list(self.ring)
+        if count is not None:
+            records = records[-count:]
+        return [record_dict(record) for record in records]
+
+    def dump(self, path):
+        """Write the ring buffer to path as JSON lines."""
+        with open(path, "w") as f:
+            f.write("".join(format_record(record) for record in list(self.ring)))
+        return path
+
+    def request_dump(self, *args):
+        """Ask the writer to dump the ring buffer, safe from a signal handler."""
+        self.dump_requested = True
+        self.wake.set()
+
+    def start(
+        self,
+        path=None,
+        name="events",
+        max_bytes=DEFAULT_MAX_BYTES,
+        backups=DEFAULT_BACKUPS,
+        flush_interval=DEFAULT_FLUSH_INTERVAL,
+        dump_dir=DEFAULT_DUMP_DIR,
+        level=None,
+        sample=None,
+    ):
+        """Start writing events to a rotating file at path, to stdout if
+        path is "-", or to DEFAULT_LOG_DIR/name.log by default. level and
+        sample, if given, replace those the log was made with.
+        """
+        self.name = name
+        self.dump_dir = dump_dir
+        if level is not None:
+            self.level = level
+        if sample is not None:
+            self.sample = dict(sample)
+        if path is None:
+            path = default_path(name)
+        self.out = sys.stdout if path == "-" else RotatingFile(path, max_bytes, backups)
+        self.writer = threading.Thread(target=self.run, args=(flush_interval,))
+        self.writer.daemon = True
+        self.writer.start()
+        # write out what is pending on a normal exit
+        atexit.register(self.stop)
+        return self
+
+    def run(self, flush_interval):
+        while not self.stopping:
+            self.wake.wait(flush_interval)
+            self.wake.clear()
+            self.flush()
+            if self.dump_requested:
+                self.dump_requested = False
+                path = os.path.join(
+                    self.dump_dir,
+                    "{}-{}.events".format(self.name, time.strftime("%Y%m%d-%H%M%S")),
+                )
+                try:
+                    self.info("dumped", path=self.dump(path))
+                except OSError as e:
+                    self.error("dump failed", error=str(e))
+
+    def flush(self):
+        batch = []
+        pending = self.pending
+        while pending:
+            batch.append(format_record(pending.popleft()))
+        if batch and self.out is not None:
+            try:
+                self.out.write("".join(batch))
+                if self.out is sys.stdout:
+                    self.out.flush()
+            except (OSError, ValueError):
+                self.dropped += len(batch)
+
+    def stop(self):
+        """Write whatever is pending and stop the writer."""
+        if self.writer is None:
+            return
+        self.stopping = True
+        self.wake.set()
+        self.writer.join()
+        self.writer = None
+        self.flush()
+        if isinstance(self.out, RotatingFile):
+            self.out.close()
+        self.out = None
+        self.stopping = False
+
+
+def default_path(name):
+    return os.path.join(DEFAULT_LOG_DIR, name + ".log")
+
+
+def parse_level(text):
+    """Level named by text, e.g. "debug"."""
+    try:
+        return LEVELS[text.lower()]
+    except KeyError:
+        raise ValueError("unknown level {}".format(text))
+
+
+def parse_sample(text):
+    """Sampling rates from "LEVEL=RATE,...", e.g. "debug=0.1,info=0.5"."""
+    sample = {}
+    for item in text.split(","):
+        name, _, rate = item.partition("=")
+        rate = float(rate)
+        if not 0 <= rate <= 1:
+            raise ValueError("sample rate {} is not between 0 and 1".format(rate))
+        sample[parse_level(name.strip())] = rate
+    return sample
+
+
+def record_dict(record):
+    at, level, event, fields = record
+    result = {"t": round(at, 3), "lvl": LEVEL_NAMES.get(level, level), "ev": event}
+    result.update(fields)
+    return result
+
+
+def format_record(record):
+    return json.dumps(record_dict(record), separators=(",", ":"), default=str) + "\n"
+
+
+LOG = EventLog()
+debug = LOG.debug
+info = LOG.info
+warning = LOG.warning
+error = LOG.error
+exception = LOG.exception
+
+
+def start(path=None, name="events", signum=signal.SIGUSR2, **kwargs):
+    """Start writing the default log, and dump its ring buffer on signum.
+    Call from the main thread.
+    """
+    LOG.start(path, name, **kwargs)
+    signal.signal(signum, LOG.request_dump)
+    return LOG
+
+
+def format_readably(line):
+    record = json.loads(line)
+    at = record.pop("t")
+    level = record.pop("lvl")
+    event = record.pop("ev")
+    tb = record.pop("traceback", None)
+    text = "{} {:<7} {} {}".format(
+        time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(at)),
+        level,
+        event,
+        " ".join("{}={}".format(k, json.dumps(v)) for k, v in record.items()),
+    ).rstrip()
+    if tb:
+        text += "\n" + tb.rstrip()
+    return text
+
+
+# -------------------------------------------------------------------------------
+#  M A I N
+# -------------------------------------------------------------------------------
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("usage: events.py FILE...")
+        sys.exit(1)
+    for filename in sys.argv[1:]:
+        with open(filename) as f:
+            for line in f:
+                print(format_readably(line))
@@ -0,0 +1,301 @@
+#!/usr/bin/env python
+# ===============================================================================
+# frame_channel.py
+#
+# Shared memory frame channel, so several processes can drive one display.
+#
+# The channel is a memory-mapped file (in /dev/shm by default) holding one
+# lane per producer. A lane is a ring of frames, 8 bytes per matrix (32 bytes
+# for four matrices, same layout as animation.py), plus a sequence counter.
+# Producers write straight into their lane; the compositor, the only process
+# holding the LEDDisplay, shows the newest frame of the highest priority lane
+# that is live, so an alert preempts a game which preempts the weather, and
+# the display falls back once the alert stops. Nothing is pickled or sent
+# over a socket.
+#
+# File layout, all values little endian:
+#
+#   header  - magic "LEDF", version (u8), lanes (u8), matrices per frame
+#             (u8), slots per lane (u8)
+#   lanes   - lane header: sequence of the newest frame (u64), priority
+#             (u8), flags (u8), reserved (u16), hold time in ms (u32)
+#             followed by the ring of slots, each: sequence (u64), time in
+#             ns (u64), frame data
+#
+# A slot's sequence is zeroed before its data is written and set after, the
+# compositor copies the data and checks the sequence again, so a frame being
+# overwritten under it is dropped rather than shown torn.
+#
+#   python frame_channel.py compositor
+#   python frame_channel.py message --lane 0 --priority 9 "Storm {STORM}"
+# ===============================================================================
+import argparse
+import mmap
+import os
+import struct
+import time
+
+from animation import screen_to_bytes
+
+MAGIC = b"LEDF"
+VERSION = 1
+HEADER = struct.Struct("<4sBBBB")
+LANE = struct.Struct("<QBBHI")
+SLOT = struct.Struct("<QQ")
+SEQUENCE = struct.Struct("<Q")
+FLAG_LIVE = 0x01
+
+DEFAULT_PATH = "/dev/shm/led_frames"
+DEFAULT_LANES = 8
+DEFAULT_SLOTS = 4
+# how long a lane keeps the display after its last frame
+DEFAULT_HOLD_MS = 1000
+
+
+def frame_to_screen(frame, matrices):
+    """Unpack frame bytes into a screen, one 64 bit bitmap per matrix."""
+    return tuple(
+        int.from_bytes(frame[8 * m : 8 * m + 8], "little") for m in range(matrices)
+    )
+
+
+class FrameChannel:
+    """Memory-mapped channel file, shared by producers and the compositor."""
+
+    def __init__(self, path=DEFAULT_PATH):
+        self.path = path
+        with open(path, "r+b") as f:
+            self.mm = mmap.mmap(f.fileno(), 0)
+        magic, version, lanes, matrices, slots = HEADER.unpack_from(self.mm, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("{} is not a frame channel".format(path))
+        self.lanes = lanes
+        self.matrices = matrices
+        self.slots = slots
+        self.frame_size = 8 * matrices
+        self.slot_size = SLOT.size + self.frame_size
+        self.lane_size = LANE.size + slots * self.slot_size
+
+    @staticmethod
+    def create(path=DEFAULT_PATH, lanes=DEFAULT_LANES, matrices=4, slots=DEFAULT_SLOTS):
+        """Create, or reset, a channel file and open it. An old file is
+        replaced rather than truncated, producers still mapping it keep the
+        old one instead of faulting on pages that went away.
+        """
+        size = HEADER.size + lanes * (
+            LANE.size + slots * (SLOT.size + 8 * matrices)
+        )
+        tmp = "{}.{}".format(path, os.getpid())
+        with open(tmp, "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, lanes, matrices, slots))
+            f.write(bytes(size - HEADER.size))
+        os.replace(tmp, path)
+        return FrameChannel(path)
+
+    def close(self):
+        self.mm.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def lane_offset(self, lane):
+        if not 0 <= lane < self.lanes:
+            raise ValueError("no lane {}".format(lane))
+        return HEADER.size + lane * self.lane_size
+
+    def slot_offset(self, lane, sequence):
+        return (
+            self.lane_offset(lane)
+            + LANE.size
+            + (sequence % self.slots) * self.slot_size
+        )
+
+    def lane_header(self, lane):
+        """(sequence, priority, flags, hold_ms) of lane."""
+        sequence, priority, flags, _, hold_ms = LANE.unpack_from(
+            self.mm, self.lane_offset(lane)
+        )
+        return sequence, priority, flags, hold_ms
+
+    def producer(self, lane, priority=0, hold_ms=DEFAULT_HOLD_MS):
+        return Producer(self, lane, priority, hold_ms)
+
+
+class Producer:
+    """Writes frames into one lane of a channel."""
+
+    def __init__(self, channel, lane, priority=0, hold_ms=DEFAULT_HOLD_MS):
+        self.channel = channel
+        self.lane = lane
+        self.offset = channel.lane_offset(lane)
+        # carry on from where a previous producer on this lane stopped
+        self.sequence = channel.lane_header(lane)[0]
+        self.priority = priority
+        self.hold_ms = hold_ms
+        self.set_flags(FLAG_LIVE)
+
+    def set_flags(self, flags):
+        LANE.pack_into(
+            self.channel.mm,
+            self.offset,
+            self.sequence,
+            self.priority,
+            flags,
+            0,
+            self.hold_ms,
+        )
+
+    def publish(self, screen):
+        """Write a screen, one 64 bit bitmap per matrix, as the newest frame."""
+        channel = self.channel
+        mm = channel.mm
+        self.sequence += 1
+        slot = channel.slot_offset(self.lane, self.sequence)
+        data = screen_to_bytes(screen)[: channel.frame_size]
+        data += bytes(channel.frame_size - len(data))
+        # invalidate the slot while its data is changing
+        SEQUENCE.pack_into(mm, slot, 0)
+        start = slot + SLOT.size
+        mm[start : start + channel.frame_size] = data
+        SLOT.pack_into(mm, slot, self.sequence, time.monotonic_ns())
+        SEQUENCE.pack_into(mm, self.offset, self.sequence)
+
+    def release(self):
+        """Give up the display, lower priority lanes show again."""
+        self.set_flags(0)
+
+
+class Compositor:
+    """Shows the newest frame of the highest priority live lane. A lane is
+    live while its producer holds it and its last frame is no older than the
+    lane's hold time; ties go to the most recent frame.
+    """
+
+    def __init__(self, channel, display):
+        self.channel = channel
+        self.display = display
+        self.view = memoryview(channel.mm)
+        self.seen = [0] * channel.lanes
+        # newest frame copied out of each lane and when it was written
+        self.frames = [bytearray(channel.frame_size) for _ in range(channel.lanes)]
+        # frames are copied here first, and only swapped in once checked
+        self.scratch = bytearray(channel.frame_size)
+        self.frame_times = [None] * channel.lanes
+        self.current = None
+        self.torn = 0
+        self.frames_shown = 0
+
+    def poll_lane(self, lane):
+        """Copy the newest frame of lane, if there is a new one."""
+        channel = self.channel
+        sequence = channel.lane_header(lane)[0]
+        if sequence == self.seen[lane]:
+            return
+        slot = channel.slot_offset(lane, sequence)
+        stamp, written = SLOT.unpack_from(channel.mm, slot)
+        start = slot + SLOT.size
+        self.scratch[:] = self.view[start : start + channel.frame_size]
+        if stamp != sequence or SEQUENCE.unpack_from(channel.mm, slot)[0] != stamp:
+            # overwritten while copying, pick up the next one instead
+            self.torn += 1
+            return
+        self.frames[lane], self.scratch = self.scratch, self.frames[lane]
+        self.seen[lane] = sequence
+        self.frame_times[lane] = written
+
+    def choose(self, now_ns):
+        """Lane to show, or None."""
+        best = None
+        best_key = None
+        for lane in range(self.channel.lanes):
+            written = self.frame_times[lane]
+            if written is None:
+                continue
+            _, priority, flags, hold_ms = self.channel.lane_header(lane)
+            if not flags & FLAG_LIVE or now_ns - written > hold_ms * 1000000:
+                continue
+            key = (priority, written)
+            if best_key is None or key > best_key:
+                best, best_key = lane, key
+        return best
+
+    def step(self):
+        """Poll every lane and show the chosen frame. Returns the lane shown."""
+        for lane in range(self.channel.lanes):
+            self.poll_lane(lane)
+        lane = self.choose(time.monotonic_ns())
+        self.current = lane
+        if lane is not None:
+            screen = frame_to_screen(self.frames[lane], self.channel.matrices)
+            if self.display.write_screen(screen):
+                self.frames_shown += 1
+        return lane
+
+    def close(self):
+        """Let go of the mapping, so the channel can be closed."""
+        self.view.release()
+
+    def run(self, fps=60, running=lambda: True):
+        delay = 1.0 / fps
+        deadline = time.monotonic()
+        while running():
+            self.step()
+            deadline += delay
+            remaining = deadline - time.monotonic()
+            if remaining > 0:
+                time.sleep(remaining)
+            else:
+                deadline = time.monotonic()
+
+
+# -------------------------------------------------------------------------------
+#  M A I N
+# -------------------------------------------------------------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Shared memory frame channel")
+    parser.add_argument("--path", default=DEFAULT_PATH)
+    commands = parser.add_subparsers(dest="command")
+    commands.required = True
+
+    compositor_parser = commands.add_parser("compositor", help="drive the display")
+    compositor_parser.add_argument("--layout", help="canvas layout file")
+    compositor_parser.add_argument("--lanes", type=int, default=DEFAULT_LANES)
+    compositor_parser.add_argument("--fps", type=int, default=60)
+
+    message_parser = commands.add_parser("message", help="scroll a message")
+    message_parser.add_argument("text")
+    message_parser.add_argument("--lane", type=int, default=0)
+    message_parser.add_argument("--priority", type=int, default=0)
+    message_parser.add_argument("--fps", type=int, default=30)
+    args = parser.parse_args()
+
+    from canvas import load_canvas
+
+    if args.command == "compositor":
+        canvas = load_canvas(args.layout)
+        display = canvas.display()
+        display.clear_display()
+        channel = FrameChannel.create(args.path, args.lanes, len(canvas))
+        compositor = Compositor(channel, display)
+        try:
+            compositor.run(args.fps)
+        finally:
+            compositor.close()
+            channel.close()
+            os.unlink(args.path)
+            display.close()
+    else:
+        import marquee
+
+        with FrameChannel(args.path) as channel:
+            producer = channel.producer(args.lane, args.priority)
+            screens = marquee.iter_screens(args.text, channel.matrices)
+            try:
+                for screen in screens:
+                    producer.publish(screen)
+                    time.sleep(1.0 / args.fps)
+            finally:
+                producer.release()
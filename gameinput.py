@@ -0,0 +1,117 @@
+# ===============================================================================
+# gameinput.py
+#
+# Non-blocking keyboard input for the LED games.
+#
+# Keys are read from curses without blocking, using selectors on stdin, and
+# queued with the time they arrived. The game drains the queue at the start
+# of each tick so input is applied in order relative to the simulation, and
+# the time from key press until the frame showing it has been written to the
+# display (input-to-photon latency) is measured.
+# ===============================================================================
+import selectors
+import sys
+import time
+from collections import deque, namedtuple
+
+InputEvent = namedtuple("InputEvent", ["time", "key"])
+
+
+class LatencyStats(object):
+    """Running latency stats, percentiles over the most recent samples."""
+
+    def __init__(self, window=1000):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.samples = deque(maxlen=window)
+
+    def record(self, latency):
+        self.count += 1
+        self.total += latency
+        self.max = max(self.max, latency)
+        self.samples.append(latency)
+
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, pct):
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100.0))]
+
+    def __str__(self):
+        return "<LatencyStats keys={} mean={:.1f}ms p95={:.1f}ms max={:.1f}ms>".format(
+            self.count,
+            self.mean() * 1000,
+            self.percentile(95) * 1000,
+            self.max * 1000,
+        )
+
+
+class InputPipeline(object):
+    """Timestamped key queue shared between the reader and the game thread.
+    deque appends and pops are atomic, so no lock is needed.
+    """
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self.events = deque()
+        self.in_flight = []
+        self.latency = LatencyStats()
+
+    def push(self, key):
+        self.events.append(InputEvent(self.clock(), key))
+
+    def apply(self, handle_key):
+        """Drain queued keys into handle_key, oldest first. Call at the start
+        of a tick. Returns the number of keys applied.
+        """
+        events = self.events
+        applied = 0
+        while events:
+            event = events.popleft()
+            handle_key(event.key)
+            self.in_flight.append(event.time)
+            applied += 1
+        return applied
+
+    def presented(self):
+        """Call once a frame has been written to the display, records the
+        latency of every key applied since the last frame.
+        """
+        if not self.in_flight:
+            return
+        now = self.clock()
+        for pressed in self.in_flight:
+            self.latency.record(now - pressed)
+        del self.in_flight[:]
+
+
+class KeyReader(object):
+    """Reads keys from a curses screen into an InputPipeline without blocking."""
+
+    def __init__(self, screen, pipeline, fd=None):
+        self.screen = screen
+        self.pipeline = pipeline
+        self.screen.nodelay(True)
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(sys.stdin.fileno() if fd is None else fd, selectors.EVENT_READ)
+
+    def poll(self, timeout=None):
+        """Wait up to timeout seconds for input and queue every available key."""
+        if not self.selector.select(timeout):
+            return
+        while True:
+            key = self.screen.getch()
+            if key == -1:
+                break
+            self.pipeline.push(key)
+
+    def run(self, running, timeout=0.05):
+        while running():
+            self.poll(timeout)
+
+    def close(self):
+        self.selector.close()
@@ -0,0 +1,160 @@
+# ===============================================================================
+# gameloop.py
+#
+# Fixed timestep game loop. The simulation is stepped at a constant rate no
+# matter how long rendering and the I2C writes take; the sleep between frames
+# is shortened by the time spent working, and the loop keeps stats on how
+# well it kept pace.
+# ===============================================================================
+import time
+
+import metrics
+import profiling
+
+# seconds, rounding error in the accumulator that still counts as a due tick
+EPSILON = 1e-9
+
+OVERRUNS = metrics.counter(
+    "loop_overruns_total", "Steps whose work outlasted their interval.", ["loop"]
+)
+
+
+class LoopStats(object):
+    def __init__(self):
+        self.ticks = 0
+        self.frames = 0
+        self.overruns = 0
+        self.dropped_ticks = 0
+        self.jitter_total = 0.0
+        self.jitter_max = 0.0
+        self.wakeups = 0
+        self.started = None
+        self.stopped = None
+
+    def record_jitter(self, jitter):
+        jitter = abs(jitter)
+        self.wakeups += 1
+        self.jitter_total += jitter
+        self.jitter_max = max(self.jitter_max, jitter)
+
+    def elapsed(self):
+        if self.started is None:
+            return 0.0
+        return (self.stopped or time.monotonic()) - self.started
+
+    def tick_rate(self):
+        """Achieved ticks per second."""
+        elapsed = self.elapsed()
+        return self.ticks / elapsed if elapsed else 0.0
+
+    def frame_rate(self):
+        elapsed = self.elapsed()
+        return self.frames / elapsed if elapsed else 0.0
+
+    def mean_jitter(self):
+        return self.jitter_total / self.wakeups if self.wakeups else 0.0
+
+    def __str__(self):
+        return (
+            "<LoopStats ticks={} ({:.1f}/s) frames={} ({:.1f}/s) overruns={} "
+            "dropped_ticks={} jitter mean={:.2f}ms max={:.2f}ms>".format(
+                self.ticks,
+                self.tick_rate(),
+                self.frames,
+                self.frame_rate(),
+                self.overruns,
+                self.dropped_ticks,
+                self.mean_jitter() * 1000,
+                self.jitter_max * 1000,
+            )
+        )
+
+
+class FixedTimestepLoop(object):
+    """Calls tick() every tick_interval seconds and render(alpha) after each
+    batch of ticks, alpha being how far (0 to 1) the clock has moved towards
+    the next tick, for renderers that interpolate.
+
+    tick_interval is either a number or a callable returning one, so games
+    whose speed changes (snake gets faster as it grows) can vary it. The loop
+    runs until running() returns False. If the loop falls more than
+    max_catch_up ticks behind, the backlog is dropped rather than replayed in
+    a burst.
+    """
+
+    def __init__(
+        self,
+        tick,
+        render,
+        tick_interval,
+        running,
+        max_fps=None,
+        max_catch_up=5,
+        clock=time.monotonic,
+        sleep=time.sleep,
+    ):
+        self.tick = tick
+        self.render = render
+        self.tick_interval = tick_interval
+        self.running = running
+        self.min_frame_time = 1.0 / max_fps if max_fps else 0.0
+        self.max_catch_up = max_catch_up
+        self.clock = clock
+        self.sleep = sleep
+        self.stats = LoopStats()
+        self.overruns = OVERRUNS.labels(loop="game")
+
+    def interval(self):
+        if callable(self.tick_interval):
+            return self.tick_interval()
+        return self.tick_interval
+
+    def run(self):
+        stats = self.stats
+        stats.started = previous = self.clock()
+        last_render = None
+        accumulator = 0.0
+        while self.running():
+            profiling.poll()
+            now = self.clock()
+            accumulator += now - previous
+            previous = now
+
+            interval = self.interval()
+            ticks = 0
+            while accumulator + EPSILON >= interval and self.running():
+                if ticks >= self.max_catch_up:
+                    stats.overruns += 1
+                    self.overruns.inc()
+                    stats.dropped_ticks += int(accumulator // interval)
+                    accumulator %= interval
+                    break
+                with profiling.span("tick"):
+                    self.tick()
+                stats.ticks += 1
+                ticks += 1
+                accumulator -= interval
+                interval = self.interval()
+
+            if not self.running():
+                break
+
+            if ticks and (
+                last_render is None or now - last_render >= self.min_frame_time
+            ):
+                with profiling.span("render"):
+                    self.render(accumulator / interval)
+                stats.frames += 1
+                last_render = now
+
+            # sleep for what is left of the tick once the work is accounted for
+            wake_at = previous + interval - accumulator
+            remaining = wake_at - self.clock()
+            if remaining > 0:
+                self.sleep(remaining)
+                stats.record_jitter(self.clock() - wake_at)
+            elif -remaining > interval:
+                stats.overruns += 1
+                self.overruns.inc()
+        stats.stopped = self.clock()
+        return stats
@@ -0,0 +1,434 @@
+#!/usr/bin/env python
+# ===============================================================================
+# led_daemon.py
+#
+# Resident process that owns the LED display and the forecast, driven by
+# commands over a Unix socket.
+#
+# The display is opened (and the banner shown) once, so switching between the
+# forecast programs, the clock, the game demos, a scrolling message or frames
+# pushed by another process takes milliseconds instead of a process restart.
+# Commands are JSON objects, one per line, answered with one JSON line:
+#
+#   {"cmd": "program", "names": ["clock", "current_forecast"]}
+#   {"cmd": "program", "names": ["snake"]}
+#   {"cmd": "message", "text": "Hello {SUNNY}"}
+#   {"cmd": "frame", "screen": [0, 255, ...]}
+#   {"cmd": "status"}
+#   {"cmd": "events", "count": 50}
+#
+#   python led_daemon.py serve climacell_cfg.json
+#   python led_daemon.py send program clock
+#   python led_daemon.py send message "Hello {SUNNY}"
+# ===============================================================================
+import argparse
+import errno
+import json
+import os
+import queue
+import socket
+import socketserver
+import stat
+import sys
+import threading
+import time
+
+import events
+import marquee
+import metrics
+import pong
+import snake
+import weather_climacell
+from canvas import load_canvas
+from clock import seconds_to_next_minute
+from led_disp import iter_scroll_screens, reset_display
+
+DEFAULT_SOCKET = "/tmp/led_daemon.sock"
+FORECAST_TIMEOUT = 60 * 60  # 1 hour
+# seconds each forecast program stays up when cycling through several
+PROGRAM_SECONDS = 2
+# seconds between rows when scrolling in a new forecast screen
+SCROLL_DELAY = 0.12
+MESSAGE_FPS = 30
+
+
+class ForecastMode(object):
+    """Cycles through programs from weather_climacell.PROGRAMS. New screens
+    scroll in a row per step, so a command can cut a scroll short.
+    """
+
+    def __init__(self, daemon, names):
+        self.daemon = daemon
+        self.names = names
+        self.index = 0
+        self.scroll = None
+        programs = weather_climacell.PROGRAMS
+        self.clock_only = len(names) == 1 and programs[names[0]].uses_clock
+
+    def step(self):
+        daemon = self.daemon
+        if self.scroll is not None:
+            screen = next(self.scroll, None)
+            if screen is not None:
+                daemon.display.write_screen(screen)
+                return SCROLL_DELAY
+            self.scroll = None
+            return seconds_to_next_minute() if self.clock_only else PROGRAM_SECONDS
+
+        name = self.names[self.index]
+        self.index = (self.index + 1) % len(self.names)
+        forecast = daemon.forecast
+        if not self.clock_only and forecast.is_due() and not forecast.lock.locked():
+            # a fetch can take seconds, commands must not wait for it, so
+            # fetch on another thread and show whatever forecast is current
+            forecast.refresh_in_background()
+        screen = daemon.cache.get_screen(name, daemon.forecast)
+        if screen is None:
+            return PROGRAM_SECONDS
+        self.scroll = iter_scroll_screens(list(daemon.display.shown), screen)
+        return 0
+
+
+class GameMode(object):
+    """Snake or pong playing itself on the whole canvas."""
+
+    def __init__(self, daemon, game):
+        self.daemon = daemon
+        self.game = game
+
+    def step(self):
+        game = self.game
+        game.update()
+        canvas = self.daemon.canvas
+        self.daemon.display.update_screen(
+            canvas.screen(game.board.bits.rows), scroll=False
+        )
+        if callable(game.tick_interval):
+            return game.tick_interval()
+        return game.tick_interval
+
+
+class FrameMode(object):
+    """Holds a screen pushed by a client until the next command."""
+
+    def __init__(self, daemon, screen):
+        self.daemon = daemon
+        self.screen = screen
+
+    def step(self):
+        self.daemon.display.update_screen(self.screen, scroll=False)
+        return None
+
+
+class MessageMode(object):
+    """Scrolls a message once, then goes back to the previous mode."""
+
+    def __init__(self, daemon, text, previous):
+        self.daemon = daemon
+        self.previous = previous
+        self.screens = marquee.iter_canvas_screens(text, daemon.canvas)
+
+    def step(self):
+        screen = next(self.screens, None)
+        if screen is None:
+            self.daemon.mode = self.previous
+            return 0
+        self.daemon.display.update_screen(screen, scroll=False)
+        return 1.0 / MESSAGE_FPS
+
+
+def make_snake(canvas):
+    piece = snake.Snake(
+        snake.Point(0, canvas.height // 2, 1, 0), canvas.width, canvas.height
+    )
+    board = snake.Board(
+        piece, width=canvas.width, height=canvas.height, max_resets=sys.maxsize
+    )
+    return snake.Game(board, attract=True)
+
+
+def make_pong(canvas):
+    width = canvas.width
+    height = canvas.height
+    player1 = pong.AIPlayer(ord("w"), ord("s"), pong.Point(0, height // 2))
+    player2 = pong.AIPlayer(ord("i"), ord("k"), pong.Point(width - 1, height // 2))
+    ball = pong.Ball(pong.Point(width // 2, height // 2, -1, 0))
+    board = pong.Board(player1, player2, ball, width, height, max_resets=sys.maxsize)
+    return pong.Pong(board)
+
+
+GAMES = {
+    "snake": make_snake,
+    "pong": make_pong,
+}
+
+
+class Daemon(object):
+    def __init__(self, display, canvas, forecast):
+        self.display = display
+        self.canvas = canvas
+        self.forecast = forecast
+        self.cache = weather_climacell.RenderCache()
+        self.commands = queue.Queue()
+        self.running = False
+        self.mode = None
+        self.mode_name = None
+        self.switches = 0
+
+    def check_program(self, names):
+        """Raises ValueError unless names is one game or a list of forecast
+        programs.
+        """
+        if not names:
+            raise ValueError("no programs given")
+        if len(names) == 1 and names[0] in GAMES:
+            return
+        for name in names:
+            if name not in weather_climacell.PROGRAMS:
+                raise ValueError("unknown program {}".format(name))
+
+    def program(self, names):
+        """Mode running the programs in names."""
+        self.check_program(names)
+        if names[0] in GAMES:
+            return GameMode(self, GAMES[names[0]](self.canvas))
+        return ForecastMode(self, names)
+
+    def check(self, command):
+        """Validate a command from a client, returns the reply."""
+        cmd = command.get("cmd")
+        if cmd == "status":
+            return {
+                "ok": True,
+                "mode": self.mode_name,
+                "switches": self.switches,
+                "forecast_version": self.forecast.version,
+            }
+        if cmd == "events":
+            return {"ok": True, "events": events.LOG.recent(command.get("count"))}
+        if cmd == "program":
+            self.check_program(command.get("names", []))
+        elif cmd == "frame":
+            screen = command.get("screen", [])
+            if not isinstance(screen, list):
+                raise ValueError("frame needs a list of bitmaps")
+            matrices = len(self.display.matrices)
+            if len(screen) > matrices:
+                raise ValueError("frame has more than {} matrices".format(matrices))
+            for value in screen:
+                if value is None:
+                    continue
+                # bool is an int too, but not a bitmap
+                if (
+                    not isinstance(value, int)
+                    or isinstance(value, bool)
+                    or not 0 <= value < 1 << 64
+                ):
+                    raise ValueError("bad bitmap {!r}".format(value))
+        elif cmd == "message":
+            if not isinstance(command.get("text"), str):
+                raise ValueError("message needs text")
+        else:
+            raise ValueError("unknown command {}".format(cmd))
+        self.commands.put(command)
+        return {"ok": True}
+
+    def execute(self, command):
+        cmd = command["cmd"]
+        if cmd == "program":
+            self.mode = self.program(command["names"])
+            self.mode_name = " ".join(command["names"])
+        elif cmd == "frame":
+            self.mode = FrameMode(self, tuple(command["screen"]))
+            self.mode_name = "frame"
+        elif cmd == "message":
+            self.mode = MessageMode(self, command["text"], self.mode)
+        self.switches += 1
+
+    def run(self, names):
+        """Run the mode for names until stop(), applying commands between
+        steps. Waiting is done on the command queue, so a command takes
+        effect as soon as it arrives.
+        """
+        self.execute({"cmd": "program", "names": names})
+        self.running = True
+        wait = 0
+        while self.running:
+            try:
+                if wait is None:
+                    command = self.commands.get()
+                else:
+                    command = self.commands.get(timeout=wait)
+                if command is None:
+                    break
+                self.execute(command)
+                wait = 0
+                continue
+            except queue.Empty:
+                pass
+            except Exception:
+                events.exception("command failed")
+            try:
+                wait = self.mode.step()
+            except Exception:
+                events.exception("step failed", mode=self.mode_name)
+                wait = PROGRAM_SECONDS
+
+    def stop(self):
+        self.running = False
+        self.commands.put(None)
+
+
+class CommandHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            try:
+                reply = self.server.daemon.check(json.loads(line))
+            except (ValueError, TypeError, AttributeError) as e:
+                reply = {"ok": False, "error": str(e)}
+            self.wfile.write(json.dumps(reply).encode("utf-8") + b"\n")
+
+
+def socket_in_use(path):
+    """True if something answers on the Unix socket at path."""
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(1)
+    try:
+        sock.connect(path)
+        return True
+    except (ConnectionRefusedError, FileNotFoundError):
+        return False
+    except socket.timeout:
+        # listening, just not accepting
+        return True
+    finally:
+        sock.close()
+
+
+class CommandServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path, daemon=None):
+        """Listen on path. Raises OSError if another daemon is listening
+        there or path is not a socket, a stale socket is replaced.
+        """
+        if os.path.exists(path):
+            if not stat.S_ISSOCK(os.stat(path).st_mode):
+                raise OSError(errno.EEXIST, "not a socket", path)
+            if socket_in_use(path):
+                raise OSError(errno.EADDRINUSE, "a daemon is already listening", path)
+            # left behind by a daemon that did not shut down cleanly
+            os.unlink(path)
+        socketserver.UnixStreamServer.__init__(self, path, CommandHandler)
+        self.daemon = daemon
+
+
+def send(command, path=DEFAULT_SOCKET):
+    """Send one command to a running daemon and return its reply."""
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+        sock.sendall(json.dumps(command).encode("utf-8") + b"\n")
+        with sock.makefile("rb") as f:
+            return json.loads(f.readline())
+    finally:
+        sock.close()
+
+
+def open_display(canvas):
+    while True:
+        try:
+            events.info("creating display")
+            # power through any initial I/O errors
+            display = canvas.display()
+            reset_display(display)
+            return display
+        except:
+            events.exception("display failed")
+            time.sleep(1)
+
+
+def serve(args):
+    events.start(args.log, "led_daemon", level=args.log_level, sample=args.log_sample)
+    # before touching the display, which a running daemon owns
+    try:
+        server = CommandServer(args.socket)
+    except OSError as e:
+        events.error("socket unavailable", path=args.socket, error=str(e))
+        sys.exit("led_daemon: {}".format(e))
+    if args.metrics_port or args.metrics_file:
+        metrics.serve(args.metrics_port, args.metrics_file)
+    canvas = load_canvas(args.layout)
+    apikey, lat, lon = weather_climacell.read_config(args.config)
+    fetch = lambda: weather_climacell.get_climacell_forecast(apikey, lat, lon)
+    display = open_display(canvas)
+    daemon = Daemon(
+        display, canvas, weather_climacell.ForecastState(FORECAST_TIMEOUT, fetch)
+    )
+    server.daemon = daemon
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    try:
+        daemon.run(args.programs or ["current_forecast"])
+    finally:
+        server.shutdown()
+        server.server_close()
+        os.unlink(args.socket)
+        display.close()
+
+
+def client(args):
+    if args.cmd == "program":
+        command = {"cmd": "program", "names": args.args}
+    elif args.cmd == "message":
+        command = {"cmd": "message", "text": " ".join(args.args)}
+    elif args.cmd == "frame":
+        command = {"cmd": "frame", "screen": [int(v, 0) for v in args.args]}
+    elif args.cmd == "events":
+        command = {"cmd": "events", "count": int(args.args[0]) if args.args else None}
+    else:
+        command = {"cmd": args.cmd}
+    print(json.dumps(send(command, args.socket)))
+
+
+# -------------------------------------------------------------------------------
+#  M A I N
+# -------------------------------------------------------------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="LED display daemon")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET)
+    commands = parser.add_subparsers(dest="command")
+    commands.required = True
+
+    serve_parser = commands.add_parser("serve", help="run the daemon")
+    serve_parser.add_argument("config", help="climacell config file")
+    serve_parser.add_argument("programs", nargs="*", help="programs to start with")
+    serve_parser.add_argument("--layout", help="canvas layout file")
+    serve_parser.add_argument(
+        "--metrics-port", type=int, default=0, help="serve metrics on localhost"
+    )
+    serve_parser.add_argument("--metrics-file", help="dump metrics to this file")
+    serve_parser.add_argument(
+        "--log",
+        help="write events to this file ({} by default, - for stdout)".format(
+            events.default_path("led_daemon")
+        ),
+    )
+    serve_parser.add_argument(
+        "--log-level", type=events.parse_level, help="lowest level logged"
+    )
+    serve_parser.add_argument(
+        "--log-sample",
+        type=events.parse_sample,
+        help="fraction of events kept per level, e.g. debug=0.1,info=0.5",
+    )
+    serve_parser.set_defaults(func=serve)
+
+    send_parser = commands.add_parser("send", help="send a command")
+    send_parser.add_argument("cmd", choices=["program", "message", "frame", "status", "events"])
+    send_parser.add_argument("args", nargs="*")
+    send_parser.set_defaults(func=client)
+
+    args = parser.parse_args()
+    args.func(args)
@@ -6,17 +6,40 @@
 # 2015-04-15
 # Carter Nelson
 # ===============================================================================
+import queue
+import threading
+from collections import defaultdict
 from enum import Enum
-from time import sleep
+from time import monotonic, sleep
 from contextlib import contextmanager
 
+import metrics
 from led8x8icons import LED8x8ICONS
 
+# the Raspberry Pi's SCL/SDA pins are /dev/i2c-1
+DEFAULT_BUS = 1
+ALL_ON = (1 << 64) - 1
+# bytes the driver sends to show a matrix, start address and display RAM
+SHOW_BYTES = 17
+
+FRAMES = metrics.counter("display_frames_total", "Screens drawn on the display.")
+I2C_BYTES = metrics.counter("i2c_bytes_total", "Bytes sent to the matrices.", ["bus"])
+I2C_ERRORS = metrics.counter("i2c_errors_total", "Display writes that failed.")
+
+
+def banner_screen(text="BLUM", size=4):
+    """Screen showing text, one character per matrix."""
+    return tuple(LED8x8ICONS[icon] for icon in text[:size])
+
 
 def reset_display(display, text="BLUM"):
     display.clear_display()
-    for matrix, icon in enumerate(text):
-        display.scroll_raw64(LED8x8ICONS[icon], matrix)
+    display.scroll_screen(banner_screen(text, len(display.matrices)))
+
+
+def show_banner(display, text="BLUM"):
+    """Draw the banner at once, for a fast first frame."""
+    display.update_screen(banner_screen(text, len(display.matrices)), scroll=False)
 
 
 class LEDDisplayPadding(Enum):
@@ -25,23 +48,159 @@ class LEDDisplayPadding(Enum):
     PAD_ZEROS = 2
 
 
-class LEDDisplay:
-    """Class for interfacing to Raspberry Pi with four Adafruit 8x8 LEDs attached."""
+def number_screen(number, size=4, padding=LEDDisplayPadding.NONE):
+    """Return a screen, a tuple with one 64 bit bitmap per matrix, showing
+    number as integer. Returns None if number is out of range.
+    """
+    if number > 9999 or number < 0:
+        return None
+    num = str(number)
+    pad_size = size - len(num)
+    if padding == LEDDisplayPadding.PAD_EMPTY:
+        pad = " " * pad_size
+    elif padding == LEDDisplayPadding.PAD_ZEROS:
+        pad = "0" * pad_size
+    else:
+        pad = ""
+    screen = [LED8x8ICONS["{0}".format(d)] for d in pad + num]
+    screen += [LED8x8ICONS["ALL_OFF"]] * (size - len(screen))
+    return tuple(screen[:size])
 
-    def __init__(self, size=4, brightness=0):
-        import board
-        import busio
 
-        # Import the HT16K33 LED matrix module.
-        from adafruit_ht16k33 import matrix
+def iter_scroll_screens(shown, screen):
+    """Yield the screens update_screen(screen) steps through when scrolling,
+    one row of one matrix at a time, for callers that pace the scroll
+    themselves. shown is the screen currently on the display.
+    """
+    for matrix, value in enumerate(screen):
+        if value is None or value == shown[matrix]:
+            continue
+        old = shown[matrix] or 0
+        frame = [None] * len(screen)
+        for rows in range(1, 9):
+            # old rows move down, the bottom rows of value come in at the top
+            frame[matrix] = (old << (8 * rows) & ALL_ON) | value >> (8 * (8 - rows))
+            yield tuple(frame)
+
+
+class ParallelFlush(object):
+    """One worker thread per I2C bus. flush() hands every worker the matrices
+    on its bus and waits at a single barrier until all of them are written, so
+    a frame takes as long as the slowest bus instead of the sum of all of them.
+    The I2C writes release the GIL while the bus is busy.
+    """
+
+    def __init__(self, matrices, layout):
+        self.matrices = matrices
+        self.matrix_bus = [bus for bus, _ in layout]
+        self.bus_numbers = sorted(set(self.matrix_bus))
+        self.jobs = dict((bus, queue.Queue(maxsize=1)) for bus in self.bus_numbers)
+        self.barrier = threading.Barrier(len(self.bus_numbers) + 1)
+        self.errors = []
+        self.threads = []
+        for bus in self.bus_numbers:
+            thread = threading.Thread(
+                target=self._work, args=(bus,), name="i2c-{}".format(bus)
+            )
+            thread.daemon = True
+            thread.start()
+            self.threads.append(thread)
+
+    def _work(self, bus):
+        jobs = self.jobs[bus]
+        while True:
+            job = jobs.get()
+            if job is None:
+                return
+            try:
+                for matrix in job:
+                    self.matrices[matrix].show()
+            except Exception as e:
+                self.errors.append(e)
+            finally:
+                self.barrier.wait()
 
+    def flush(self, matrices):
+        """Write the buffers of the given matrices and wait until every bus is
+        done.
+        """
+        groups = defaultdict(list)
+        for matrix in matrices:
+            groups[self.matrix_bus[matrix]].append(matrix)
+        if len(groups) < 2:
+            # nothing to overlap, skip the thread hand off
+            for matrix in matrices:
+                self.matrices[matrix].show()
+            return
+        for bus in self.bus_numbers:
+            self.jobs[bus].put(groups.get(bus, ()))
+        self.barrier.wait()
+        if self.errors:
+            error = self.errors[0]
+            del self.errors[:]
+            raise error
+
+    def close(self):
+        for bus in self.bus_numbers:
+            self.jobs[bus].put(None)
+        for thread in self.threads:
+            thread.join()
+
+
+class LEDDisplay:
+    """Class for interfacing to Raspberry Pi with Adafruit 8x8 LEDs attached,
+    four by default.
+    """
+
+    # used to pace scrolls and animations, replaced to run on a virtual clock
+    sleep = staticmethod(sleep)
+    monotonic = staticmethod(monotonic)
+
+    def __init__(self, size=4, brightness=0, layout=None, parallel=True):
+        """size matrices at consecutive addresses from 0x70 on the default
+        bus, or one matrix per (bus, address) pair in layout, see canvas.py.
+        When the matrices span several buses and parallel is set, frames are
+        written to all buses at once.
+        """
+        if layout is None:
+            layout = [(DEFAULT_BUS, 0x70 + i) for i in range(size)]
+        self.layout = list(layout)
+        self.buses = {}
         self.matrices = []
-        # Create the I2C interface.
-        self.i2c = busio.I2C(board.SCL, board.SDA)
-        for i in range(size):
-            self.matrices.append(matrix.Matrix8x8(self.i2c, address=0x70 + i))
+        for bus, address in self.layout:
+            self.matrices.append(self.make_matrix(self.open_bus(bus), address))
+        # I2C interface of the first matrix
+        self.i2c = self.buses[self.layout[0][0]] if self.layout else None
         for m in self.matrices:
             m.brightness = brightness
+        # 64 bit bitmap currently shown on each matrix, None if unknown
+        self.shown = [None] * len(self.matrices)
+        # byte counter of the bus each matrix is on
+        self.bus_bytes = [I2C_BYTES.labels(bus=bus) for bus, _ in self.layout]
+        self.flusher = None
+        if parallel and len(self.buses) > 1:
+            self.flusher = ParallelFlush(self.matrices, self.layout)
+
+    def make_matrix(self, i2c, address):
+        # Import the HT16K33 LED matrix module.
+        from adafruit_ht16k33 import matrix
+
+        return matrix.Matrix8x8(i2c, address=address)
+
+    def open_bus(self, bus):
+        """I2C interface for bus number bus, opened once and shared."""
+        if bus not in self.buses:
+            if bus == DEFAULT_BUS:
+                import board
+                import busio
+
+                self.buses[bus] = busio.I2C(board.SCL, board.SDA)
+            else:
+                # extra buses, e.g. from dtoverlay=i2c-gpio, by number
+                from adafruit_extended_bus import ExtendedI2C
+
+                self.buses[bus] = ExtendedI2C(bus)
+        return self.buses[bus]
 
     @contextmanager
     def with_auto_write(self, *args, **kwds):
@@ -55,7 +214,7 @@ class LEDDisplay:
 
     def is_valid_matrix(self, matrix):
         """Returns True if matrix number is valid, otherwise False."""
-        return matrix >= 0 and matrix <= len(self.matrices)
+        return matrix >= 0 and matrix < len(self.matrices)
 
     def clear_display(self, matrix=None):
         """Clear specified matrix. If none specified, clear all."""
@@ -63,11 +222,13 @@ class LEDDisplay:
             for m in self.matrices:
                 m.fill(0)
                 m.show()
+            self.shown = [0] * len(self.matrices)
         else:
             if not self.is_valid_matrix(matrix):
                 return
             self.matrices[matrix].fill(0)
             self.matrices[matrix].show()
+            self.shown[matrix] = 0
 
     def set_pixel(self, x, y, matrix=0, value=1, auto_write=True):
         """Set pixel at position x, y for specified matrix to the given value."""
@@ -75,6 +236,7 @@ class LEDDisplay:
             return
         with self.with_auto_write(matrix=matrix, auto_write=auto_write):
             self.matrices[matrix][x, y] = value
+        self.shown[matrix] = None
 
     def show(self, matrix=None):
         if matrix == None:
@@ -90,20 +252,70 @@ class LEDDisplay:
         for x in range(8):
             for y in range(8):
                 self.matrices[matrix][x, y] = bitmap[y][x]
+        self.shown[matrix] = None
         self.show(matrix)
 
+    def buffer_raw64(self, value, matrix=0):
+        """Draw the 64 bit bitmap into the matrix buffer without writing it
+        to the bus.
+        """
+        with self.with_auto_write(matrix=matrix, auto_write=False):
+            self.matrices[matrix].fill(0)
+            for y in range(8):
+                row_byte = value >> (8 * y)
+                for x in range(8):
+                    pixel_bit = row_byte >> x & 0x01
+                    self.matrices[matrix][x, y] = pixel_bit
+        self.shown[matrix] = value
+
     def set_raw64(self, value, matrix=0):
         """Set specified matrix to bitmap defined by 64 bit value."""
         if not self.is_valid_matrix(matrix):
             return
-        self.matrices[matrix].fill(0)
-        for y in range(8):
-            row_byte = value >> (8 * y)
-            for x in range(8):
-                pixel_bit = row_byte >> x & 0x01
-                self.matrices[matrix][x, y] = pixel_bit
+        # write the whole bitmap to the buffer and send it over the bus once
+        self.buffer_raw64(value, matrix)
         self.show(matrix)
 
+    def flush(self, matrices):
+        """Send the buffers of the given matrices over the bus, every bus at
+        once when writing in parallel.
+        """
+        if self.flusher is not None:
+            self.flusher.flush(matrices)
+            return
+        for matrix in matrices:
+            self.matrices[matrix].show()
+
+    def write_screen(self, screen):
+        """Draw every changed bitmap of screen into its matrix buffer, then
+        send the whole frame. Returns the number of matrices written.
+        """
+        changed = []
+        for matrix, value in enumerate(screen):
+            if value is None or value == self.shown[matrix]:
+                continue
+            self.buffer_raw64(value, matrix)
+            changed.append(matrix)
+        if changed:
+            try:
+                self.flush(changed)
+            except Exception:
+                # some of the frame may not have made it to the matrices
+                for matrix in changed:
+                    self.shown[matrix] = None
+                I2C_ERRORS.inc()
+                raise
+            FRAMES.inc()
+            for matrix in changed:
+                self.bus_bytes[matrix].inc(SHOW_BYTES)
+        return len(changed)
+
+    def close(self):
+        """Stop the bus worker threads, if any."""
+        if self.flusher is not None:
+            self.flusher.close()
+            self.flusher = None
+
     def scroll_raw64(self, value, matrix=0, delay=0.12):
         """Scroll out the current bitmap with the supplied bitmap. Can also
         specify a matrix (0-3) and a delay to set scroll rate.
@@ -111,35 +323,84 @@ class LEDDisplay:
         if not self.is_valid_matrix(matrix):
             return
         auto_write = self.matrices[matrix]._auto_write
-        for y in range(7, -1, -1):
-            sleep(delay)
-            self.matrices[matrix].shift_up()
-            with self.with_auto_write(matrix=matrix, auto_write=False):
-                row_byte = value >> (8 * y)
-                for x in range(8):
-                    pixel_bit = row_byte >> x & 0x01
-                    self.matrices[matrix][x, 0] = pixel_bit
-        self.matrices[matrix].show()
+        try:
+            for y in range(7, -1, -1):
+                self.sleep(delay)
+                self.matrices[matrix].shift_up()
+                with self.with_auto_write(matrix=matrix, auto_write=False):
+                    row_byte = value >> (8 * y)
+                    for x in range(8):
+                        pixel_bit = row_byte >> x & 0x01
+                        self.matrices[matrix][x, 0] = pixel_bit
+            self.shown[matrix] = value
+            self.matrices[matrix].show()
+        except Exception:
+            I2C_ERRORS.inc()
+            raise
+        # every row shifted in is shown, then the final bitmap
+        self.bus_bytes[matrix].inc(9 * SHOW_BYTES)
+
+    def scroll_screen(self, screen):
+        """Scroll in a screen, one 64 bit bitmap per matrix. Matrices whose
+        entry is None are left untouched.
+        """
+        for matrix, value in enumerate(screen):
+            if value is not None:
+                self.scroll_raw64(value, matrix)
+
+    def update_screen(self, screen, scroll=True):
+        """Transition from the screen currently shown to the supplied screen.
+        Only matrices whose bitmap differs are redrawn, matrices showing the
+        same bitmap (or whose entry is None) are left untouched. Returns the
+        number of matrices redrawn.
+        """
+        if not scroll:
+            return self.write_screen(screen)
+        changed = 0
+        for matrix, value in enumerate(screen):
+            if value is None or value == self.shown[matrix]:
+                continue
+            self.scroll_raw64(value, matrix)
+            changed += 1
+        if changed:
+            FRAMES.inc()
+        return changed
+
+    def play_animation(self, animation, loops=1):
+        """Play a memory-mapped animation.Animation. Frames are paced against
+        a monotonic deadline so per frame work doesn't accumulate as drift,
+        and only matrices that change between frames are written.
+        """
+        matrices = min(animation.matrices, len(self.matrices))
+        # filled in place every frame
+        screen = [None] * matrices
+        deadline = self.monotonic()
+        for _ in range(loops):
+            for i in range(len(animation)):
+                duration_ms = animation.load_frame(i)
+                for matrix in range(matrices):
+                    screen[matrix] = animation.matrix_value(matrix)
+                self.write_screen(screen)
+                deadline += duration_ms / 1000.0
+                remaining = deadline - self.monotonic()
+                if remaining > 0:
+                    self.sleep(remaining)
+                else:
+                    # running behind, don't try to catch up with a burst of frames
+                    deadline = self.monotonic()
 
     def disp_number(self, number, scroll=False, padding=LEDDisplayPadding.NONE):
         """
         Display number as integer. Valid range is 0 to 9999.
         pad - pad to 4 digits so numbers are consistent in the display
         """
-        if number > 9999 or number < 0:
+        screen = number_screen(number, len(self.matrices), padding)
+        if screen is None:
             return
-        num = str(number)
-        pad_size = len(self.matrices) - len(num)
-        if padding == LEDDisplayPadding.PAD_EMPTY:
-            pad = " " * pad_size
-        elif padding == LEDDisplayPadding.PAD_ZEROS:
-            pad = "0" * pad_size
-        else:
-            pad = ""
         if scroll:
             render_fn = self.scroll_raw64
         else:
             render_fn = self.set_raw64
         self.clear_display()
-        for i, d in enumerate(pad + num):
-            render_fn(LED8x8ICONS["{0}".format(d)], i)
+        for i, value in enumerate(screen):
+            render_fn(value, i)
@@ -0,0 +1,203 @@
+#!/usr/bin/env python
+# ===============================================================================
+# led_sim.py
+#
+# Simulated I2C buses and HT16K33 8x8 matrices, for running the display code
+# without the hardware.
+#
+# A write holds its bus for as long as it would take on the wire (nine clocks
+# a byte, address byte included, plus a fixed per transaction overhead), so
+# frame times come out close to those of the real thing, and every bus
+# counts the transactions and bytes sent. The sleep and monotonic clock are
+# injectable, to run against a virtual clock.
+#
+#   python led_sim.py --columns 8 --rows 2 --buses 2
+# ===============================================================================
+import argparse
+import threading
+import time
+
+from canvas import TiledCanvas
+from led_disp import SHOW_BYTES, LEDDisplay
+
+# standard mode I2C, the Raspberry Pi default
+DEFAULT_FREQUENCY = 100000
+# time spent in the driver for every transaction
+DEFAULT_OVERHEAD = 0.00005
+
+
+class SimBus(object):
+    def __init__(
+        self,
+        number,
+        frequency=DEFAULT_FREQUENCY,
+        overhead=DEFAULT_OVERHEAD,
+        sleep=time.sleep,
+    ):
+        self.number = number
+        self.frequency = frequency
+        self.overhead = overhead
+        self.sleep = sleep
+        self.lock = threading.Lock()
+        self.transactions = 0
+        self.bytes_written = 0
+        self.busy_time = 0.0
+
+    def transfer_time(self, num_bytes):
+        """Seconds the bus is held writing num_bytes to a device."""
+        return (num_bytes + 1) * 9.0 / self.frequency + self.overhead
+
+    def write(self, address, data):
+        # one transaction at a time, like the kernel driver
+        with self.lock:
+            duration = self.transfer_time(len(data))
+            self.sleep(duration)
+            self.transactions += 1
+            self.bytes_written += len(data)
+            self.busy_time += duration
+
+    def __str__(self):
+        return "<SimBus {} transactions={} bytes={} busy={:.1f}ms>".format(
+            self.number, self.transactions, self.bytes_written, self.busy_time * 1000
+        )
+
+
+class SimMatrix8x8(object):
+    """The parts of adafruit_ht16k33.matrix.Matrix8x8 the display uses. The
+    buffer is kept as a 64 bit bitmap, show() sends the 17 bytes the real
+    driver does (start address plus 16 bytes of display RAM).
+    """
+
+    def __init__(self, i2c, address=0x70):
+        self.i2c = i2c
+        self.address = address
+        self.buffer = 0
+        self._auto_write = True
+        self._brightness = 0
+
+    @property
+    def brightness(self):
+        return self._brightness
+
+    @brightness.setter
+    def brightness(self, value):
+        self._brightness = value
+        self.i2c.write(self.address, b"\xe0")
+
+    def raw64(self):
+        return self.buffer
+
+    def fill(self, color):
+        self.buffer = (1 << 64) - 1 if color else 0
+        if self._auto_write:
+            self.show()
+
+    def __getitem__(self, key):
+        x, y = key
+        return self.buffer >> (8 * y + x) & 0x01
+
+    def __setitem__(self, key, value):
+        x, y = key
+        bit = 1 << (8 * y + x)
+        if value:
+            self.buffer |= bit
+        else:
+            self.buffer &= ~bit
+        if self._auto_write:
+            self.show()
+
+    def shift_up(self):
+        # pixels move down a row, the top row is left blank
+        self.buffer = self.buffer << 8 & ((1 << 64) - 1)
+        if self._auto_write:
+            self.show()
+
+    def show(self):
+        self.i2c.write(self.address, bytes(SHOW_BYTES))
+
+
+class SimDisplay(LEDDisplay):
+    """LEDDisplay on simulated buses and matrices."""
+
+    def __init__(
+        self,
+        size=4,
+        brightness=0,
+        layout=None,
+        parallel=True,
+        frequency=DEFAULT_FREQUENCY,
+        overhead=DEFAULT_OVERHEAD,
+        sleep=time.sleep,
+        monotonic=time.monotonic,
+    ):
+        self.frequency = frequency
+        self.overhead = overhead
+        self.sleep = sleep
+        self.monotonic = monotonic
+        # screens that changed something, and matrices redrawn for them
+        self.frames = 0
+        self.redraws = 0
+        super(SimDisplay, self).__init__(size, brightness, layout, parallel)
+
+    def open_bus(self, bus):
+        if bus not in self.buses:
+            self.buses[bus] = SimBus(bus, self.frequency, self.overhead, self.sleep)
+        return self.buses[bus]
+
+    def make_matrix(self, i2c, address):
+        return SimMatrix8x8(i2c, address)
+
+    def update_screen(self, screen, scroll=True):
+        changed = super(SimDisplay, self).update_screen(screen, scroll)
+        if changed:
+            self.frames += 1
+            self.redraws += changed
+        return changed
+
+    def bytes_written(self):
+        return sum(bus.bytes_written for bus in self.buses.values())
+
+    def transactions(self):
+        return sum(bus.transactions for bus in self.buses.values())
+
+
+def frame_time(canvas, parallel, frames=50):
+    """Mean seconds to write a full frame, every matrix changing, to a
+    simulated display laid out as canvas.
+    """
+    display = SimDisplay(layout=canvas.layout(), parallel=parallel)
+    try:
+        rows = [0] * canvas.height
+        start = time.perf_counter()
+        for frame in range(frames):
+            # alternate every pixel so each frame redraws every matrix
+            row = (1 << canvas.width) - 1 if frame % 2 else 0
+            rows[:] = [row] * canvas.height
+            display.write_screen(canvas.screen(rows))
+        return (time.perf_counter() - start) / frames
+    finally:
+        display.close()
+
+
+# -------------------------------------------------------------------------------
+#  M A I N
+# -------------------------------------------------------------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulated display frame times")
+    parser.add_argument("--columns", type=int, default=8)
+    parser.add_argument("--rows", type=int, default=2)
+    parser.add_argument("--buses", type=int, default=2)
+    parser.add_argument("--frames", type=int, default=50)
+    args = parser.parse_args()
+
+    canvas = TiledCanvas.grid(
+        args.columns, args.rows, buses=tuple(range(1, args.buses + 1))
+    )
+    sequential = frame_time(canvas, False, args.frames)
+    parallel = frame_time(canvas, True, args.frames)
+    print(
+        "{} matrices on {} buses: sequential {:.2f}ms/frame, "
+        "parallel {:.2f}ms/frame".format(
+            len(canvas), args.buses, sequential * 1000, parallel * 1000
+        )
+    )
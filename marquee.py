@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+# ===============================================================================
+# marquee.py
+#
+# Scroll arbitrary text, and weather icons, across the LED 8x8 matrices as a
+# single window eight columns wide per matrix (32 pixels for four matrices),
+# or along the middle of a tiled canvas (see canvas.py) of any size.
+#
+# Columns are generated lazily from the glyph atlas so a long message is never
+# turned into a full bitmap, only the visible window is kept around.
+# ===============================================================================
+import sys
+import time
+from collections import deque
+
+from led8x8font import GLYPH_ATLAS, GLYPH_INDEX
+
+# SPREAD[c] moves bit y of column byte c to bit 8 * y, so a column can be
+# or'ed into a 64 bit bitmap at its x position with a single shift.
+SPREAD = tuple(
+    sum(((c >> y) & 0x01) << (8 * y) for y in range(8)) for c in range(256)
+)
+
+
+def iter_glyphs(text):
+    """Yield the atlas entry for every glyph in text. Icons are written by
+    name between braces, e.g. "RAIN {RAIN}". Unknown glyphs are skipped.
+    """
+    i = 0
+    while i < len(text):
+        char = text[i]
+        if char == "{":
+            end = text.find("}", i)
+            if end != -1:
+                name = text[i + 1 : end].upper()
+                if name in GLYPH_INDEX:
+                    yield GLYPH_INDEX[name]
+                i = end + 1
+                continue
+        if char in GLYPH_INDEX:
+            yield GLYPH_INDEX[char]
+        i += 1
+
+
+def iter_columns(text, spacing=1):
+    """Lazily yield the column bytes for text, with spacing blank columns
+    after every glyph.
+    """
+    for offset, width in iter_glyphs(text):
+        for x in range(offset, offset + width):
+            yield GLYPH_ATLAS[x]
+        for _ in range(spacing):
+            yield 0
+
+
+def window_to_screen(window, size):
+    """Convert a window of column bytes into a screen, one 64 bit bitmap per
+    matrix.
+    """
+    screen = []
+    columns = iter(window)
+    for _ in range(size):
+        value = 0
+        for x in range(8):
+            value |= SPREAD[next(columns)] << x
+        screen.append(value)
+    return tuple(screen)
+
+
+def iter_screens(text, size=4, spacing=1):
+    """Yield successive screens scrolling text in from the right until it has
+    scrolled out on the left.
+    """
+    width = 8 * size
+    window = deque([0] * width, maxlen=width)
+    for column in iter_columns(text, spacing):
+        window.append(column)
+        yield window_to_screen(window, size)
+    for _ in range(width):
+        window.append(0)
+        yield window_to_screen(window, size)
+
+
+def iter_canvas_screens(text, canvas, spacing=1):
+    """Like iter_screens, scrolling text along a band eight pixels high in
+    the middle of a tiled canvas.
+    """
+    top = (canvas.height - 8) // 2
+    rows = [0] * canvas.height
+    band = range(top, top + 8)
+    high_bit = canvas.width - 1
+
+    def push(column):
+        # every row moves one pixel left, the new column comes in on the right
+        for bit, y in enumerate(band):
+            rows[y] = rows[y] >> 1 | ((column >> bit) & 0x01) << high_bit
+        return canvas.screen(rows)
+
+    for column in iter_columns(text, spacing):
+        yield push(column)
+    for _ in range(canvas.width):
+        yield push(0)
+
+
+def scroll_text(display, text, fps=30, spacing=1, canvas=None):
+    """Scroll text across the display, laid out as canvas if given, at a
+    steady frame rate. Only matrices whose bitmap changed are written each
+    frame.
+    """
+    if canvas is None:
+        screens = iter_screens(text, len(display.matrices), spacing)
+    else:
+        screens = iter_canvas_screens(text, canvas, spacing)
+    delay = 1.0 / fps
+    deadline = time.monotonic()
+    for screen in screens:
+        display.update_screen(screen, scroll=False)
+        deadline += delay
+        remaining = deadline - time.monotonic()
+        if remaining > 0:
+            time.sleep(remaining)
+        else:
+            # running behind, don't try to catch up with a burst of frames
+            deadline = time.monotonic()
+
+
+# -------------------------------------------------------------------------------
+#  M A I N
+# -------------------------------------------------------------------------------
+if __name__ == "__main__":
+    from canvas import load_canvas
+
+    # a .json argument is the canvas layout, the rest is the message
+    layouts = [arg for arg in sys.argv[1:] if arg.endswith(".json")]
+    words = [arg for arg in sys.argv[1:] if not arg.endswith(".json")]
+    text = " ".join(words) or "Hello {SUNNY}"
+    canvas = load_canvas(layouts[0] if layouts else None)
+    display = canvas.display()
+    display.clear_display()
+    while True:
+        scroll_text(display, text, canvas=canvas)
@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+# ===============================================================================
+# memory.py
+#
+# Memory budget mode, for Pi Zeros sharing 512MB with other services.
+#
+# Once enabled, the resident set size is read from /proc/self/statm at quiet
+# points of the main loop and a warning event logged when it goes over the
+# budget. tracemalloc runs (one frame per trace, to keep its own overhead
+# down) and track() records the peak and retained traced memory of each
+# subsystem: fetch, parse, render and display. All of it is exported as
+# metrics. Quiet points also run a full garbage collection every so often;
+# the first one freezes everything alive after start up (gc.freeze()), so
+# later collections skip the long-lived module state.
+#
+#   python weather_climacell.py climacell_cfg.json --memory-budget=40
+#   python virtual_clock.py --hours 168 --memory   # is memory flat over a week?
+# ===============================================================================
+import gc
+import os
+import tracemalloc
+from contextlib import nullcontext
+
+import events
+import metrics
+
+# seconds between full collections at quiet points
+COLLECT_INTERVAL = 10 * 60
+# seconds between RSS checks at quiet points
+CHECK_INTERVAL = 60
+
+RSS = metrics.gauge("memory_rss_bytes", "Resident set size.")
+BUDGET = metrics.gauge("memory_budget_bytes", "Resident set size budget.")
+PEAK = metrics.gauge(
+    "memory_peak_bytes", "Largest traced memory peak of a subsystem.", ["subsystem"]
+)
+RETAINED = metrics.gauge(
+    "memory_retained_bytes", "Traced memory kept by a subsystem's last run.", ["subsystem"]
+)
+COLLECTED = metrics.counter("gc_collected_total", "Objects freed at quiet points.")
+
+NO_TRACK = nullcontext()
+
+
+def rss_bytes():
+    """Resident set size of this process, None where /proc can't say."""
+    try:
+        # binary, text mode keeps decoder state around
+        with open("/proc/self/statm", "rb") as f:
+            resident = int(f.read().split()[1])
+        return resident * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class Track(object):
+    """Peak and retained traced memory of a block. Nested blocks each get
+    their own peak without losing it from the enclosing block.
+    """
+
+    def __init__(self, budget, subsystem):
+        self.budget = budget
+        self.subsystem = subsystem
+
+    def __enter__(self):
+        stack = self.budget.stack
+        current, peak = tracemalloc.get_traced_memory()
+        if stack:
+            stack[-1].peak = max(stack[-1].peak, peak)
+        tracemalloc.reset_peak()
+        self.start = current
+        self.peak = current
+        stack.append(self)
+
+    def __exit__(self, *exc):
+        stack = self.budget.stack
+        stack.pop()
+        current, peak = tracemalloc.get_traced_memory()
+        peak = max(self.peak, peak)
+        if stack:
+            stack[-1].peak = max(stack[-1].peak, peak)
+        self.budget.record(self.subsystem, peak - self.start, current - self.start)
+
+
+class MemoryBudget(object):
+    def __init__(self):
+        self.enabled = False
+        self.budget = None
+        self.over = False
+        self.stack = []
+        # subsystem -> [largest peak, retained by the last run]
+        self.subsystems = {}
+        self.last_collect = None
+        self.last_check = None
+        self.frozen = False
+
+    def enable(self, budget_bytes=None):
+        """Start tracking, warning when RSS goes over budget_bytes."""
+        self.enabled = True
+        self.budget = budget_bytes
+        if budget_bytes:
+            BUDGET.set(budget_bytes)
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(1)
+
+    def track(self, subsystem):
+        """Context manager recording the memory used by a block."""
+        if not self.enabled:
+            return NO_TRACK
+        return Track(self, subsystem)
+
+    def record(self, subsystem, peak, retained):
+        entry = self.subsystems.get(subsystem)
+        if entry is None:
+            entry = self.subsystems[subsystem] = [0, 0]
+        if peak > entry[0]:
+            entry[0] = peak
+            PEAK.labels(subsystem=subsystem).set(peak)
+        entry[1] = retained
+        RETAINED.labels(subsystem=subsystem).set(retained)
+
+    def check(self):
+        """Read RSS, and log when it crosses the budget."""
+        rss = rss_bytes()
+        if rss is None:
+            return None
+        RSS.set(rss)
+        if self.budget:
+            over = rss > self.budget
+            if over and not self.over:
+                events.warning(
+                    "memory over budget",
+                    rss=rss,
+                    budget=self.budget,
+                    traced=tracemalloc.get_traced_memory()[0],
+                    peaks=dict((name, e[0]) for name, e in self.subsystems.items()),
+                )
+            elif self.over and not over:
+                events.info("memory within budget", rss=rss, budget=self.budget)
+            self.over = over
+        return rss
+
+    def quiet(self, now):
+        """Called where the loop is about to sleep, now being a monotonic
+        time. Checks RSS every CHECK_INTERVAL and collects garbage every
+        COLLECT_INTERVAL.
+        """
+        if not self.enabled:
+            return
+        if self.last_collect is None or now - self.last_collect >= COLLECT_INTERVAL:
+            self.last_collect = now
+            COLLECTED.inc(gc.collect())
+            if not self.frozen:
+                # only once: objects frozen later and then dropped in a
+                # cycle would never be freed
+                gc.freeze()
+                self.frozen = True
+        if self.last_check is None or now - self.last_check >= CHECK_INTERVAL:
+            self.last_check = now
+            self.check()
+
+    def report(self):
+        return {
+            "rss": rss_bytes(),
+            "budget": self.budget,
+            "traced": tracemalloc.get_traced_memory()[0] if self.enabled else None,
+            "subsystems": dict(
+                (name, {"peak": peak, "retained": retained})
+                for name, (peak, retained) in sorted(self.subsystems.items())
+            ),
+        }
+
+
+MEMORY = MemoryBudget()
+enable = MEMORY.enable
+track = MEMORY.track
+quiet = MEMORY.quiet
@@ -0,0 +1,307 @@
+#!/usr/bin/env python
+# ===============================================================================
+# metrics.py
+#
+# Counters, gauges and histograms for the display programs, in the Prometheus
+# text format.
+#
+# Modules declare their metrics at import time on the default registry and
+# update them as they go; updating is a lock and an add, cheap enough for the
+# render loop. The registry can be scraped over HTTP on localhost and dumped
+# to a file every so often (for node_exporter's textfile collector, or just
+# to look at over ssh):
+#
+#   python weather_climacell.py climacell_cfg.json --metrics
+#   curl localhost:9108/metrics
+#   cat /tmp/weather_climacell.prom
+# ===============================================================================
+import bisect
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import events
+
+DEFAULT_PORT = 9108
+DEFAULT_DUMP_INTERVAL = 60
+# seconds, from a fast render to a slow fetch
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10)
+
+
+def format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    if value == -math.inf:
+        return "-Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+def format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(
+        '{}="{}"'.format(name, str(value).replace("\\", "\\\\").replace('"', '\\"'))
+        for name, value in pairs
+    ) + "}"
+
+
+class CounterValue(object):
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.value = 0
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+    def samples(self, name, labels):
+        yield name, labels, self.value
+
+
+class GaugeValue(object):
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.value = 0
+        self.function = None
+
+    def set(self, value):
+        self.value = value
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+    def set_function(self, function):
+        """Read the value from function() at scrape time instead."""
+        self.function = function
+
+    def samples(self, name, labels):
+        value = self.value if self.function is None else self.function()
+        yield name, labels, value
+
+
+class HistogramValue(object):
+    def __init__(self, buckets):
+        self.lock = threading.Lock()
+        self.buckets = buckets
+        # per bucket, not cumulative, the last one is +Inf
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        i = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[i] += 1
+            self.sum += value
+
+    @contextmanager
+    def time(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def samples(self, name, labels):
+        with self.lock:
+            counts = list(self.counts)
+            total = self.sum
+        cumulative = 0
+        for bound, count in zip(self.buckets + (math.inf,), counts):
+            cumulative += count
+            yield name + "_bucket", labels + (("le", format_value(bound)),), cumulative
+        yield name + "_sum", labels, total
+        yield name + "_count", labels, cumulative
+
+
+class Metric(object):
+    """A metric and its values, one per combination of label values. Without
+    labels the metric can be updated directly.
+    """
+
+    def __init__(self, kind, name, help, labelnames, make_value):
+        self.kind = kind
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.make_value = make_value
+        self.lock = threading.Lock()
+        self.values = {}
+        if not self.labelnames:
+            self.values[()] = self.value = make_value()
+
+    def labels(self, **labels):
+        """Value for the given label values. Look it up once and keep it
+        where it is updated often.
+        """
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        value = self.values.get(key)
+        if value is None:
+            with self.lock:
+                value = self.values.setdefault(key, self.make_value())
+        return value
+
+    def __getattr__(self, attr):
+        # inc(), set(), observe()... on a metric without labels
+        if attr in ("value", "values"):
+            raise AttributeError(attr)
+        return getattr(self.value, attr)
+
+    def expose(self):
+        lines = [
+            "# HELP {} {}".format(self.name, self.help),
+            "# TYPE {} {}".format(self.name, self.kind),
+        ]
+        for key, value in sorted(self.values.items()):
+            for name, extra, sample in value.samples(self.name, ()):
+                lines.append(
+                    "{}{} {}".format(
+                        name,
+                        format_labels(self.labelnames, key, extra),
+                        format_value(sample),
+                    )
+                )
+        return lines
+
+
+class Registry(object):
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metrics = {}
+
+    def register(self, kind, name, help, labelnames, make_value):
+        """The metric called name, created if this is its first use."""
+        with self.lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = Metric(kind, name, help, labelnames, make_value)
+                self.metrics[name] = metric
+            elif metric.kind != kind or metric.labelnames != tuple(labelnames):
+                raise ValueError("{} already registered differently".format(name))
+            return metric
+
+    def counter(self, name, help, labelnames=()):
+        return self.register("counter", name, help, labelnames, CounterValue)
+
+    def gauge(self, name, help, labelnames=()):
+        return self.register("gauge", name, help, labelnames, GaugeValue)
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        buckets = tuple(sorted(buckets))
+        return self.register(
+            "histogram", name, help, labelnames, lambda: HistogramValue(buckets)
+        )
+
+    def expose(self):
+        """All metrics in the Prometheus text format."""
+        lines = []
+        for name in sorted(self.metrics):
+            lines.extend(self.metrics[name].expose())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+counter = REGISTRY.counter
+gauge = REGISTRY.gauge
+histogram = REGISTRY.histogram
+
+
+def make_server(port=DEFAULT_PORT, registry=REGISTRY):
+    """Server for the registry at /metrics on localhost, call start() to run
+    it from a daemon thread. The HTTP modules are imported here, they take
+    longer to load than the rest of a program that doesn't serve metrics.
+    """
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path not in ("/", "/metrics"):
+                self.send_error(404)
+                return
+            body = self.server.registry.expose().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    class MetricsServer(ThreadingMixIn, HTTPServer):
+        daemon_threads = True
+
+        def __init__(self):
+            HTTPServer.__init__(self, ("127.0.0.1", port), MetricsHandler)
+            self.registry = registry
+
+        def start(self):
+            thread = threading.Thread(target=self.serve_forever)
+            thread.daemon = True
+            thread.start()
+            return self
+
+    return MetricsServer()
+
+
+def dump(path, registry=REGISTRY):
+    """Write the registry to path, replacing it in one go so readers never
+    see half a file.
+    """
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        f.write(registry.expose())
+    os.replace(tmp, path)
+
+
+class PeriodicDump(object):
+    """Dumps the registry to a file every interval seconds from a daemon
+    thread.
+    """
+
+    def __init__(self, path, interval=DEFAULT_DUMP_INTERVAL, registry=REGISTRY):
+        self.path = path
+        self.interval = interval
+        self.registry = registry
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            try:
+                dump(self.path, self.registry)
+            except OSError as e:
+                events.warning("metrics dump failed", error=str(e))
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+        dump(self.path, self.registry)
+
+
+def serve(port=DEFAULT_PORT, path=None, interval=DEFAULT_DUMP_INTERVAL):
+    """Start the scrape endpoint, unless port is 0, and, given a path, the
+    periodic dump. A port already in use is reported rather than fatal.
+    """
+    server = None
+    if port:
+        try:
+            server = make_server(port).start()
+        except OSError as e:
+            events.warning("metrics not served", port=port, error=str(e))
+    dumper = PeriodicDump(path, interval).start() if path else None
+    return server, dumper
@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+# ===============================================================================
+# parse_bench.py
+#
+# Offline benchmark of every provider's response parser.
+#
+# Each parser is run on made up responses of several sizes (see replay.py),
+# and on any recorded fixtures, and for each one reports the payload size,
+# parse time, peak memory during the parse and the memory still held by the
+# parsed forecast. Output is one JSON object per line, so runs before and
+# after a parser change can be diffed.
+#
+#   python parse_bench.py
+#   python parse_bench.py --providers noaa climacell --scales 1 10 100
+# ===============================================================================
+import argparse
+import gc
+import json
+import sys
+import timeit
+import tracemalloc
+
+import replay
+
+DEFAULT_SCALES = (1, 10, 100)
+
+
+def measure(parse, data, number=None, repeat=5):
+    """Dict of timing and memory figures for parse(data)."""
+    timer = timeit.Timer(lambda: parse(data))
+    if number is None:
+        number, _ = timer.autorange()
+    best = min(timer.repeat(repeat, number)) / number
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        blocks = sys.getallocatedblocks()
+        result = parse(data)
+        retained_blocks = sys.getallocatedblocks() - blocks
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del result
+    return {
+        "bytes": len(data),
+        "parse_us": round(best * 1e6, 1),
+        "peak_bytes": peak - before,
+        "retained_bytes": current - before,
+        "retained_blocks": retained_blocks,
+    }
+
+
+def payloads(name, scales, fixture_dir):
+    """(label, body) of the responses to benchmark provider name on."""
+    for scale in scales:
+        yield "x{}".format(scale), replay.synthesize(name, scale)
+    for label, data in replay.load_fixtures(name, fixture_dir).items():
+        yield "fixture:" + label, data
+
+
+def run(names=None, scales=DEFAULT_SCALES, fixture_dir=replay.FIXTURE_DIR, repeat=5):
+    """Benchmark results, one dict per provider and payload."""
+    results = []
+    for name in names or sorted(replay.PROVIDERS):
+        parse = replay.PROVIDERS[name].parse
+        for label, data in payloads(name, scales, fixture_dir):
+            result = {"provider": name, "payload": label}
+            result.update(measure(parse, data, repeat=repeat))
+            results.append(result)
+    return results
+
+
+# -------------------------------------------------------------------------------
+#  M A I N
+# -------------------------------------------------------------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Provider parse benchmarks")
+    parser.add_argument("--providers", nargs="+", choices=sorted(replay.PROVIDERS))
+    parser.add_argument("--scales", nargs="+", type=int, default=DEFAULT_SCALES)
+    parser.add_argument("--fixtures", default=replay.FIXTURE_DIR)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    for result in run(args.providers, args.scales, args.fixtures, args.repeat):
+        print(json.dumps(result))
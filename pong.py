@@ -1,91 +1,35 @@
 from led8x8icons import LED8x8ICONS
-from led_disp import LEDDisplay
+from canvas import load_canvas
+from bitboard import BitBoard
+from gameloop import FixedTimestepLoop
+from engine import FIX_ONE, Point, Piece, to_cell
+from gameinput import InputPipeline, KeyReader
+import profiling
 from threading import Thread
+from collections import deque
 import random
-import time
-import copy
+import sys
 import curses
 
 DEFAULT_BOARD_WIDTH = 4 * 8
 DEFAULT_BOARD_HEIGHT = 8
 
 
-class Point(object):
-    def __init__(self, dx, dy, vx=0, vy=0, max_vx=2, max_vy=2):
-        self.dx = dx
-        self.dy = dy
-        self.vx = vx
-        self.vy = vy
-        self.max_vx = max_vx
-        self.max_vy = max_vy
-
-    def step(self):
-        self.dx += self.vx
-        self.dy += self.vy
-
-    def _clip_v(self, new_v, max_v):
-        v = min(abs(new_v), max_v)
-        if new_v < 0:
-            v *= -1
-        return v
-
-    def set_vx(self, new_vx):
-        self.vx = self._clip_v(new_vx, self.max_vx)
-
-    def set_vy(self, new_vy):
-        self.vy = self._clip_v(new_vy, self.max_vy)
-
-
-class Piece(object):
-    def __init__(self, width, height, initial_point):
-        self.width = width
-        self.height = height
-        self.initial_point = initial_point
-        self.reset()
-
-    def reset(self):
-        self.point = copy.copy(self.initial_point)
-
-    def get_position(self):
-        old_x = self.point.dx
-        old_y = self.point.dy
-        coords = []
-        for i in range(self.width):
-            for j in range(self.height):
-                pair = (old_x + i, old_y + j)
-                pair = list(map(lambda x: abs(int(x)), pair))
-                coords.append(pair)
-        return coords
-
-    def step(self):
-        old_position = self.get_position()
-        self.point.step()
-        new_position = self.get_position()
-        return old_position, new_position
-
-    def set_vx(self, vx):
-        self.point.set_vx(vx)
-
-    def set_vy(self, vy):
-        self.point.set_vy(vy)
-
-    def get_vx(self):
-        return self.point.vx
-
-    def get_vy(self):
-        return self.point.vy
-
-
 class Ball(Piece):
-    def __init__(self, initial_point, width=1, height=1):
+    __slots__ = ("rng",)
+
+    def __init__(self, initial_point, width=1, height=1, rng=random):
+        self.rng = rng
         super(Ball, self).__init__(width, height, initial_point)
 
     def reset(self):
-        self.initial_point.vy = random.randrange(-10, 10, 1) / 10.0
+        self.initial_point.set_vy(self.rng.randrange(-10, 10, 1) / 10.0)
         super(Ball, self).reset()
 
 
 class Player(Piece):
+    __slots__ = ("upkey", "downkey")
+
     def __init__(self, upkey, downkey, initial_point, width=1, height=3):
         super(Player, self).__init__(width, height, initial_point)
         self.upkey = upkey
@@ -97,10 +41,117 @@ class Player(Piece):
         elif key == self.downkey:
             self.set_vy(1)
 
+    def think(self, board):
+        """Called at the start of every tick, human players have nothing to do."""
+        pass
+
     def step(self):
-        old_pos, new_pos = super(Player, self).step()
-        self.set_vy(self.get_vy() * 0.3)
-        return old_pos, new_pos
+        super(Player, self).step()
+        # slow down to 30% of the speed, truncating towards zero
+        fvy = self.point.fvy
+        if fvy < 0:
+            self.point.fvy = -(-fvy * 3 // 10)
+        else:
+            self.point.fvy = fvy * 3 // 10
+
+
+def bounce(y, fvy, ticks, span):
+    """Closed form for where something at y moving fvy per tick is after
+    ticks ticks, bouncing like the ball in Board.update_position: rows are
+    mirrored about 0 and the velocity flips on the first step at or past
+    +/-span. Every position lies on the lattice y + k * fvy, so the motion
+    is a triangle wave between the lattice points nearest past each wall.
+    """
+    if fvy == 0:
+        return y
+    if fvy < 0:
+        # rows are mirrored about 0, so moving up is moving down mirrored
+        y, fvy = -y, -fvy
+    # turning points, the first lattice points at or beyond +/-span
+    hi = y + max(0, -(-(span - y) // fvy)) * fvy
+    lo = y - max(0, -(-(y + span) // fvy)) * fvy
+    width = hi - lo
+    d = (y + ticks * fvy - lo) % (2 * width)
+    if d > width:
+        d = 2 * width - d
+    return lo + d
+
+
+class AIPlayer(Player):
+    """Computer player. Predicts, in closed form, the row where the ball
+    reaches its column, bouncing the straight line path off the walls like
+    Board.update_position does, and moves its paddle there.
+
+    skill (0 to 1) scales the aiming error and how often it reacts at all,
+    reaction_ticks is how many ticks old the ball position it sees is.
+    """
+
+    __slots__ = ("skill", "rng", "seen", "aim_error", "approaching")
+
+    def __init__(
+        self,
+        upkey,
+        downkey,
+        initial_point,
+        width=1,
+        height=3,
+        skill=0.8,
+        reaction_ticks=2,
+        rng=random,
+    ):
+        super(AIPlayer, self).__init__(upkey, downkey, initial_point, width, height)
+        self.skill = skill
+        self.rng = rng
+        self.seen = deque(maxlen=reaction_ticks + 1)
+        self.aim_error = 0
+        self.approaching = False
+
+    def predict_row(self, board, x, y, fvx, fvy):
+        """Row the ball at x, y moving at fvx, fvy (fixed point) will be in
+        when it reaches this paddle's column, or None if it is moving away.
+        """
+        column = self.cell_x()
+        if fvx < 0 and column == 0:
+            # first tick with x + fvx * t <= FIX_ONE - 1
+            distance = x - (FIX_ONE - 1)
+            speed = -fvx
+        elif fvx > 0 and column > 0:
+            # first tick with x + fvx * t >= column * FIX_ONE
+            distance = column * FIX_ONE - x
+            speed = fvx
+        else:
+            return None
+        ticks = max(0, -(-distance // speed))
+        row = abs(to_cell(bounce(y, fvy, ticks, board.height * FIX_ONE)))
+        return min(row, board.height - 1)
+
+    def think(self, board):
+        point = board.ball.point
+        self.seen.append((point.x, point.y, point.fvx, point.fvy))
+        x, y, fvx, fvy = self.seen[0]
+
+        row = self.predict_row(board, x, y, fvx, fvy)
+        if row is None:
+            # wait in the middle for the return
+            self.approaching = False
+            row = board.height // 2
+        elif not self.approaching:
+            # new volley, pick how far off the aim is this time
+            self.approaching = True
+            spread = (1.0 - self.skill) * board.height / 2.0
+            self.aim_error = int(round(self.rng.uniform(-spread, spread)))
+        if self.approaching:
+            row += self.aim_error
+
+        if self.rng.random() > self.skill:
+            return
+        # players are kept off the top and bottom rows by the board
+        top = min(max(row - self.height // 2, 1), board.height - self.height - 1)
+        current = self.cell_y()
+        if current < top:
+            self.handle_key(self.downkey)
+        elif current > top:
+            self.handle_key(self.upkey)
 
 
 class Board(object):
@@ -119,102 +170,103 @@ class Board(object):
         self.player1 = player1
         self.player2 = player2
         self.ball = ball
-        self.array = self._init_array()
+        self._pieces = [ball, player1, player2]
+        self.bits = BitBoard(width, height)
         self.num_resets = 0
         self.max_resets = max_resets
 
-    def _init_array(self, val=0):
-        array = []
-        for _ in range(self.height):
-            array.append([val] * self.width)
-        return array
-
     def pieces(self):
-        return [self.ball, self.player1, self.player2]
+        return self._pieces
 
     def update_position(self, piece):
-        pos, next_pos = piece.step()
+        point = piece.point
+        old_x, old_y, old_fy = piece.cell_x(), piece.cell_y(), point.y
+        w, h = piece.width, piece.height
+        piece.step()
         # zero out old position
-        self.set_position(pos, 0)
-
-        for x, y in next_pos:
-            vx = piece.get_vx()
-            vy = piece.get_vy()
-
-            if x < 0 or x >= self.width:
-                piece.set_vx(-vx)
-                break
-            if y < 0 or y >= self.height:
-                piece.set_vy(-vy)
-                break
-
-            if self.array[y][x] == 1:
-                if x == 0 or x == self.width - 1:
-                    if x == 0:
-                        player_vy = self.player1.get_vy()
-                    else:
-                        player_vy = self.player2.get_vy()
-                    piece.set_vx(-vx)
-                    piece.set_vy(vy + player_vy)
-                    break
-                if y == 0 or y == self.height - 1:
-                    piece.set_vy(-vy)
-                    break
-
-        if isinstance(piece, Ball):
-            for x, y in next_pos:
-                y = min(y, self.height - 1)
-                if x <= 0 and self.array[y][0] != 1:
+        self.bits.stamp(old_x, old_y, w, h, 0)
+
+        x, y = piece.cell_x(), piece.cell_y()
+        if x + w > self.width:
+            point.set_fvx(-point.fvx)
+        elif y + h > self.height:
+            point.set_fvy(-point.fvy)
+        elif self.bits.collides(x, y, w, h):
+            if x == 0 or x + w == self.width:
+                player = self.player1 if x == 0 else self.player2
+                point.set_fvx(-point.fvx)
+                point.set_fvy(point.fvy + player.point.fvy)
+            elif y == 0 or y + h == self.height:
+                point.set_fvy(-point.fvy)
+
+        if piece is self.ball:
+            for row in range(y, y + h):
+                row = min(row, self.height - 1)
+                if x <= 0 and not self.bits.get(0, row):
                     self.reset()
                     return
-                if x >= self.width - 1 and self.array[y][-1] != 1:
+                if x + w >= self.width and not self.bits.get(self.width - 1, row):
                     self.reset()
                     return
+        elif y <= 0 or y + h >= self.height:
+            # players stop at the edges
+            point.y = old_fy
+            x, y = old_x, old_y
 
-        if isinstance(piece, Player):
-            for _, y in next_pos:
-                if y <= 0 or y >= self.height - 1:
-                    next_pos = pos
-                    break
-
-        self.set_position(next_pos, 1)
+        self.bits.stamp(x, y, w, h, 1)
 
     def reset(self):
         for p in self.pieces():
             p.reset()
-        self.array = self._init_array()
+        self.bits.clear()
         self.num_resets += 1
 
     def exceeded_max_resets(self):
         return self.num_resets >= self.max_resets
 
     def end_game(self):
-        self.array = self._init_array(val=1)
+        self.bits.clear(val=1)
 
     def set_position(self, pos, value):
         for x, y in pos:
-            try:
-                self.array[y][x] = value
-            except IndexError:
-                continue
+            self.bits.set(x, y, value)
 
 
 class Pong(object):
-    def __init__(self, board):
+    def __init__(self, board, tick_interval=0.05):
         self.board = board
         self.running = False
+        self.tick_interval = tick_interval
+        self.loop = None
+        self.input = InputPipeline()
+
+    def tick(self):
+        """Advance the simulation by one step."""
+        self.board.player1.think(self.board)
+        self.board.player2.think(self.board)
+        for piece in self.board.pieces():
+            self.board.update_position(piece)
+
+    def update(self):
+        self.input.apply(self.handle_key)
+        self.tick()
+        if self.board.exceeded_max_resets():
+            self.render_end_game()
+            self.stop_game()
 
     def start_game(self):
         self.running = True
-        while self.running:
-            for piece in self.board.pieces():
-                self.board.update_position(piece)
-            self.render()
-
-            if self.board.exceeded_max_resets():
-                self.render_end_game()
-                self.stop_game()
-            time.sleep(0.05)
+        self.loop = FixedTimestepLoop(
+            self.update,
+            self.present,
+            self.tick_interval,
+            lambda: self.running,
+        )
+        return self.loop.run()
+
+    def present(self, alpha=0.0):
+        self.render()
+        self.input.presented()
 
     def stop_game(self):
         self.running = False
@@ -239,8 +291,9 @@ class TermPong(Pong):
         self.screen = screen
 
     def render(self):
-        for y, row in enumerate(self.board.array):
-            for x, val in enumerate(row):
+        for y, row in enumerate(self.board.bits.rows):
+            for x in range(self.board.width):
+                val = row >> x & 0x01
                 strval = " "
                 if val == 1:
                     strval = "*"
@@ -251,34 +304,44 @@ class TermPong(Pong):
         self.screen.refresh()
 
     def render_end_game(self):
-        for y, row in enumerate(self.board.array):
-            for x, val in enumerate(row):
+        for y in range(self.board.height):
+            for x in range(self.board.width):
                 strval = "*"
                 self.screen.addstr(y, x, strval)
         self.screen.refresh()
 
 
 class PiPong(Pong):
-    def __init__(self, board, screen):
+    def __init__(self, board, screen, canvas=None):
         super(PiPong, self).__init__(board)
-        self.display = LEDDisplay()
+        self.canvas = canvas or load_canvas()
+        self.display = self.canvas.display()
         self.display.clear_display()
 
     def render(self):
-        for y, row in enumerate(self.board.array):
-            for x, value in enumerate(row):
-                matrix = x // 8
-                self.display.set_pixel(
-                    x % 8, y % 8, matrix=matrix, value=value, auto_write=False
-                )
-        self.display.show()
+        # rows of the board are canvas rows, cut them into tiles and write
+        # the matrices that changed
+        screen = self.canvas.screen(self.board.bits.rows)
+        self.display.update_screen(screen, scroll=False)
 
     def render_end_game(self):
-        for matrix in range(len(self.display.matrix)):
+        for matrix in range(len(self.display.matrices)):
             self.display.set_raw64(LED8x8ICONS["UNKNOWN"], matrix)
 
 
 def main():
+    # `pong.py ai` puts the computer on the left, `pong.py demo` on both
+    # sides, `pong.py wall.json` plays on the matrices laid out in wall.json
+    args = sys.argv[1:]
+    left = AIPlayer if "ai" in args or "demo" in args else Player
+    right = AIPlayer if "demo" in args else Player
+    layouts = [arg for arg in args if arg.endswith(".json")]
+    canvas = load_canvas(layouts[0] if layouts else None)
+    width = canvas.width
+    height = canvas.height
+    # SIGUSR1 toggles profiling of the game loop
+    profiling.install("pong")
+
     # get the curses screen window
     screen = curses.initscr()
     # turn off input echoing
@@ -289,21 +352,22 @@ def main():
     screen.keypad(True)
 
     # starts on the left side, centered vertically at rest
-    player1 = Player(ord("w"), ord("s"), Point(0, DEFAULT_BOARD_HEIGHT / 2))
+    player1 = left(ord("w"), ord("s"), Point(0, height / 2))
     # starts on the right side, centered vertically at rest
-    player2 = Player(
+    player2 = right(
         curses.KEY_UP,
         curses.KEY_DOWN,
-        Point(DEFAULT_BOARD_WIDTH - 1, DEFAULT_BOARD_HEIGHT / 2),
+        Point(width - 1, height / 2),
     )
 
     # starts in the center heading left
-    ball = Ball(Point(DEFAULT_BOARD_WIDTH / 2, DEFAULT_BOARD_HEIGHT / 2, -1, 0))
-    board = Board(player1, player2, ball)
-    window = curses.newwin(DEFAULT_BOARD_HEIGHT + 1, DEFAULT_BOARD_WIDTH + 1, 0, 0)
+    ball = Ball(Point(width / 2, height / 2, -1, 0))
+    board = Board(player1, player2, ball, width, height)
+    window = curses.newwin(height + 1, width + 1, 0, 0)
+    pong = None
     try:
         # pong = TermPong(board, window)
-        pong = PiPong(board, window)
+        pong = PiPong(board, window, canvas)
 
         def start():
             return pong.start_game()
@@ -311,10 +375,11 @@ def main():
         thread = Thread(target=start)
         thread.daemon = True
 
+        # keys are queued here and applied by the game thread on its next tick
+        reader = KeyReader(screen, pong.input)
+        pong.running = True
         thread.start()
-        while pong.running:
-            key = screen.getch()
-            pong.handle_key(key)
+        reader.run(lambda: pong.running)
         thread.join()
     finally:
         # shut down cleanly
@@ -322,6 +387,9 @@ def main():
         screen.keypad(0)
         curses.echo()
         curses.endwin()
+        if pong is not None and pong.loop is not None:
+            print(pong.loop.stats)
+            print(pong.input.latency)
 
 
 if __name__ == "__main__":
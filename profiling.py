@@ -0,0 +1,207 @@
+#!/usr/bin/env python
+# ===============================================================================
+# profiling.py
+#
+# Profiling a running program on demand.
+#
+# Programs call install() at start up and poll() once per step of their main
+# loop. Sending the process SIGUSR1 starts a cProfile session and tracemalloc
+# at the next poll; sending it again stops them and writes, timestamped, to
+# DEFAULT_DIR:
+#
+#   NAME-YYYYmmdd-HHMMSS.prof         cProfile stats, for pstats or snakeviz
+#   NAME-YYYYmmdd-HHMMSS.tracemalloc  tracemalloc snapshot
+#   NAME-YYYYmmdd-HHMMSS.spans.json   count, total, mean and max seconds of
+#                                     every span, e.g. each program step
+#
+# cProfile only sees the thread that polls, which is the thread running the
+# loop. A session still running when the program exits is written then.
+# Spans cost a function call and a test while no session is running, and
+# cProfile, pstats and tracemalloc are only imported once one starts.
+#
+#   kill -USR1 $(pgrep -f weather_climacell.py)   # start
+#   kill -USR1 $(pgrep -f weather_climacell.py)   # stop and write
+#   python profiling.py /tmp/led_profiles/weather_climacell-20210101-120000
+# ===============================================================================
+import atexit
+import json
+import os
+import signal
+import sys
+import threading
+import time
+from contextlib import nullcontext
+
+import events
+
+DEFAULT_DIR = "/tmp/led_profiles"
+# frames kept per tracemalloc traceback
+TRACE_FRAMES = 10
+
+NO_SPAN = nullcontext()
+
+
+class Span(object):
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        self.profiler.record(self.name, time.perf_counter() - self.start)
+
+
+class Profiler(object):
+    def __init__(self, name="profile", directory=DEFAULT_DIR):
+        self.name = name
+        self.directory = directory
+        # set from the signal handler, acted on by poll()
+        self.requested = False
+        self.active = False
+        self.profile = None
+        self.started_tracemalloc = False
+        # name -> [count, total seconds, max seconds]
+        self.spans = {}
+
+    def toggle(self, *args):
+        """Ask for a session to start or stop, safe from a signal handler."""
+        self.requested = not self.requested
+
+    def poll(self):
+        """Start or stop a session if one was asked for. Call from the thread
+        to be profiled.
+        """
+        if self.requested != self.active:
+            if self.requested:
+                self.start()
+            else:
+                self.stop()
+
+    def start(self):
+        import cProfile
+        import tracemalloc
+
+        self.spans = {}
+        self.started_tracemalloc = not tracemalloc.is_tracing()
+        if self.started_tracemalloc:
+            tracemalloc.start(TRACE_FRAMES)
+        self.profile = cProfile.Profile()
+        self.active = True
+        self.profile.enable()
+        events.info("profiling", name=self.name)
+
+    def stop(self):
+        """End the session and write its files from a background thread.
+        Returns the thread.
+        """
+        import tracemalloc
+
+        self.profile.disable()
+        self.active = False
+        snapshot = tracemalloc.take_snapshot()
+        if self.started_tracemalloc:
+            tracemalloc.stop()
+        thread = threading.Thread(
+            target=self.write, args=(self.profile, snapshot, self.spans)
+        )
+        thread.start()
+        self.profile = None
+        return thread
+
+    def finish(self):
+        """Stop and write a session that is still running, waiting for the
+        files. Registered with atexit by install().
+        """
+        if self.active:
+            self.stop().join()
+
+    def write(self, profile, snapshot, spans):
+        os.makedirs(self.directory, exist_ok=True)
+        base = os.path.join(
+            self.directory, "{}-{}".format(self.name, time.strftime("%Y%m%d-%H%M%S"))
+        )
+        profile.dump_stats(base + ".prof")
+        snapshot.dump(base + ".tracemalloc")
+        with open(base + ".spans.json", "w") as f:
+            json.dump(
+                dict(
+                    (
+                        name,
+                        {
+                            "count": count,
+                            "total": total,
+                            "mean": total / count,
+                            "max": longest,
+                        },
+                    )
+                    for name, (count, total, longest) in spans.items()
+                ),
+                f,
+                indent=2,
+                sort_keys=True,
+            )
+        events.info("profile written", path=base)
+
+    def span(self, name):
+        """Context manager timing a block as name while a session runs."""
+        if not self.active:
+            return NO_SPAN
+        return Span(self, name)
+
+    def record(self, name, seconds):
+        entry = self.spans.get(name)
+        if entry is None:
+            self.spans[name] = [1, seconds, seconds]
+        else:
+            entry[0] += 1
+            entry[1] += seconds
+            if seconds > entry[2]:
+                entry[2] = seconds
+
+
+PROFILER = Profiler()
+poll = PROFILER.poll
+span = PROFILER.span
+
+
+def install(name, directory=DEFAULT_DIR, signum=signal.SIGUSR1):
+    """Toggle profiling of this program on signum. Call from the main
+    thread.
+    """
+    PROFILER.name = name
+    PROFILER.directory = directory
+    signal.signal(signum, PROFILER.toggle)
+    atexit.register(PROFILER.finish)
+
+
+def report(base, limit=20):
+    """Print the top functions and allocation sites of a written session."""
+    import pstats
+    import tracemalloc
+
+    pstats.Stats(base + ".prof").sort_stats("cumulative").print_stats(limit)
+    snapshot = tracemalloc.Snapshot.load(base + ".tracemalloc")
+    print("top allocations")
+    for stat in snapshot.statistics("lineno")[:limit]:
+        print(stat)
+    with open(base + ".spans.json") as f:
+        spans = json.load(f)
+    print("spans")
+    for name, stats in sorted(spans.items(), key=lambda item: -item[1]["total"]):
+        print(
+            "{:<20} {:>6} x {:8.3f}ms mean {:8.3f}ms max".format(
+                name, stats["count"], stats["mean"] * 1000, stats["max"] * 1000
+            )
+        )
+
+
+# -------------------------------------------------------------------------------
+#  M A I N
+# -------------------------------------------------------------------------------
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("usage: profiling.py BASE  (path of a session, without extension)")
+        sys.exit(1)
+    report(sys.argv[1])
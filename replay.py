@@ -0,0 +1,386 @@
+#!/usr/bin/env python
+# ===============================================================================
+# replay.py
+#
+# Record and replay forecast provider responses.
+#
+# Every provider is reduced to request(config, host, https) returning the raw
+# response body and parse(body) returning its forecast, so responses can be
+# recorded from the live APIs into fixture files, replayed through a local
+# stub HTTP server standing in for all of the providers at once, or made up
+# at any size for benchmarks (see parse_bench.py).
+#
+#   python replay.py record climacell climacell_cfg.json
+#   python replay.py record noaa 98109
+#   python replay.py serve --port 8000
+# ===============================================================================
+import argparse
+import json
+import os
+import random
+import threading
+import time
+from collections import Counter, namedtuple
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+import weather_climacell
+import weather_forecastio
+import weather_metoffice
+import weather_noaa
+import weather_openweather
+
+FIXTURE_DIR = "fixtures"
+
+# read_config(arg) -> config, request(config, host, https) -> body,
+# parse(body) -> forecast, path: request path prefix the stub server answers
+Provider = namedtuple(
+    "Provider", ["read_config", "request", "parse", "path", "suffix", "synthesize"]
+)
+
+
+def climacell_request(config, host=None, https=True):
+    base_url = None
+    if host is not None:
+        base_url = "{}://{}/v4/timelines".format("https" if https else "http", host)
+    apikey, lat, lon = config
+    return weather_climacell.make_climacell_request(apikey, lat, lon, base_url)
+
+
+def noaa_request(config, host=None, https=None):
+    data = weather_noaa.make_noaa_request(config, host, https)
+    if data is None:
+        raise IOError("NOAA request failed")
+    return data
+
+
+def synthesize_climacell(scale, rng):
+    hours = 24 * scale
+    codes = [c for c in weather_climacell.weather_code_map if c]
+    hourly = [
+        {
+            "startTime": "2021-01-01T{:02d}:00:00Z".format(h % 24),
+            "values": {
+                "temperatureApparent": round(rng.uniform(-10, 100), 2),
+                "weatherCode": rng.choice(codes),
+                "moonPhase": rng.randrange(8),
+            },
+        }
+        for h in range(hours)
+    ]
+    daily = [
+        {"startTime": "2021-01-{:02d}T06:00:00Z".format(d % 28 + 1),
+         "values": {"moonPhase": rng.randrange(8)}}
+        for d in range(scale + 1)
+    ]
+    return json.dumps(
+        {
+            "data": {
+                "timelines": [
+                    {"timestep": "1h", "intervals": hourly},
+                    {"timestep": "1d", "intervals": daily},
+                ]
+            }
+        }
+    ).encode("utf-8")
+
+
+NOAA_SUMMARIES = ["Sunny", "Partly Sunny", "Rain Likely", "Chance Snow",
+                  "Mostly Cloudy", "Areas Fog", "Thunderstorms"]
+
+
+def synthesize_noaa(scale, rng):
+    periods = 2 * scale
+    parts = ['<?xml version="1.0"?>\n<dwml version="1.0"><data>']
+    parts.append('<parameters applicable-location="point1">')
+    for typ in ("maximum", "minimum"):
+        parts.append(
+            '<temperature type="{}" units="Fahrenheit" time-layout="k-p24h-n{}-1">'
+            "<name>Daily {} Temperature</name>".format(typ, scale, typ.title())
+        )
+        for _ in range(scale):
+            parts.append("<value>{}</value>".format(rng.randrange(0, 100)))
+        parts.append("</temperature>")
+    parts.append('<weather time-layout="k-p12h-n{}-2"><name>Weather</name>'.format(periods))
+    for _ in range(periods):
+        parts.append(
+            '<weather-conditions weather-summary="{}"/>'.format(
+                rng.choice(NOAA_SUMMARIES)
+            )
+        )
+    parts.append("</weather></parameters></data></dwml>")
+    return "".join(parts).encode("utf-8")
+
+
+def synthesize_metoffice(scale, rng):
+    codes = [c for c in weather_metoffice.ICON_MAP if c != "NA"]
+
+    def rep(half):
+        return {
+            "D": rng.choice(["N", "NE", "E", "SE", "S", "SW", "W", "NW"]),
+            "Gn": str(rng.randrange(40)),
+            "Hn": str(rng.randrange(100)),
+            "PPd": str(rng.randrange(100)),
+            "S": str(rng.randrange(30)),
+            "V": "GO",
+            "Dm": str(rng.randrange(30)),
+            "FDm": str(rng.randrange(30)),
+            "W": str(rng.choice(codes)),
+            "U": str(rng.randrange(9)),
+            "$": half,
+        }
+
+    periods = [
+        {"type": "Day", "value": "2021-01-{:02d}Z".format(d % 28 + 1),
+         "Rep": [rep("Day"), rep("Night")]}
+        for d in range(max(4, 5 * scale))
+    ]
+    return json.dumps(
+        {"SiteRep": {"Wx": {"Param": []},
+                     "DV": {"dataDate": "2021-01-01T00:00:00Z", "type": "Forecast",
+                            "Location": {"i": "3772", "name": "HEATHROW",
+                                         "Period": periods}}}}
+    ).encode("utf-8")
+
+
+def synthesize_forecastio(scale, rng):
+    icons = list(weather_forecastio.ICON_MAP)
+
+    def point(t):
+        return {
+            "time": 1609459200 + t,
+            "summary": "Synthetic",
+            "icon": rng.choice(icons),
+            "precipIntensity": rng.random(),
+            "precipProbability": rng.random(),
+            "temperature": rng.uniform(-10, 100),
+            "apparentTemperature": rng.uniform(-10, 100),
+            "dewPoint": rng.uniform(-10, 70),
+            "humidity": rng.random(),
+            "windSpeed": rng.uniform(0, 30),
+            "windBearing": rng.randrange(360),
+            "cloudCover": rng.random(),
+            "pressure": rng.uniform(990, 1030),
+            "ozone": rng.uniform(250, 350),
+        }
+
+    days = max(4, 8 * scale)
+    return json.dumps(
+        {
+            "latitude": 47.6,
+            "longitude": -122.3,
+            "hourly": {"data": [point(3600 * h) for h in range(48 * scale)]},
+            "daily": {"data": [point(86400 * d) for d in range(days)]},
+        }
+    ).encode("utf-8")
+
+
+def synthesize_openweather(scale, rng):
+    mains = list(weather_openweather.ICON_MAP)
+    entries = [
+        {
+            "dt": 1609459200 + 10800 * i,
+            "main": {"temp": rng.uniform(260, 310), "pressure": rng.uniform(990, 1030),
+                     "humidity": rng.randrange(100)},
+            "weather": [{"id": 800, "main": rng.choice(mains),
+                         "description": "synthetic", "icon": "01d"}],
+            "clouds": {"all": rng.randrange(100)},
+            "wind": {"speed": rng.uniform(0, 20), "deg": rng.randrange(360)},
+            "dt_txt": "2021-01-01 00:00:00",
+        }
+        for i in range(max(32, 40 * scale))
+    ]
+    return json.dumps({"cod": "200", "cnt": len(entries), "list": entries}).encode(
+        "utf-8"
+    )
+
+
+PROVIDERS = {
+    "climacell": Provider(
+        weather_climacell.read_config,
+        climacell_request,
+        weather_climacell.parse_climacell_forecast,
+        "/v4/timelines",
+        "json",
+        synthesize_climacell,
+    ),
+    "noaa": Provider(
+        weather_noaa.validate_zip,
+        noaa_request,
+        lambda data: weather_noaa.parse_noaa_forecast(data, offset=0),
+        weather_noaa.REQ_BASE.rstrip("?"),
+        "xml",
+        synthesize_noaa,
+    ),
+    "metoffice": Provider(
+        weather_metoffice.read_config,
+        lambda config, host=None, https=None: weather_metoffice.make_metoffice_request(
+            *config, host=host, https=https
+        ),
+        weather_metoffice.parse_forecast,
+        weather_metoffice.REQ_BASE,
+        "json",
+        synthesize_metoffice,
+    ),
+    "forecastio": Provider(
+        weather_forecastio.read_config,
+        lambda config, host=None, https=None: weather_forecastio.make_forecastio_request(
+            *config, host=host, https=https
+        ),
+        weather_forecastio.parse_forecast,
+        weather_forecastio.REQ_BASE,
+        "json",
+        synthesize_forecastio,
+    ),
+    "openweather": Provider(
+        weather_openweather.read_config,
+        lambda config, host=None, https=None: weather_openweather.make_openweather_request(
+            *config, host=host, https=https
+        ),
+        weather_openweather.parse_forecast,
+        weather_openweather.REQ_BASE.rstrip("?"),
+        "json",
+        synthesize_openweather,
+    ),
+}
+
+
+def synthesize(name, scale=1, seed=0):
+    """Made up response body for provider name, scale times the usual size."""
+    return PROVIDERS[name].synthesize(scale, random.Random(seed))
+
+
+def fixture_path(name, label, fixture_dir=FIXTURE_DIR):
+    provider = PROVIDERS[name]
+    return os.path.join(fixture_dir, name, "{}.{}".format(label, provider.suffix))
+
+
+def record(name, config_arg, label=None, fixture_dir=FIXTURE_DIR):
+    """Fetch a live response from provider name and save it as a fixture.
+    Returns the fixture path.
+    """
+    provider = PROVIDERS[name]
+    data = provider.request(provider.read_config(config_arg))
+    if label is None:
+        label = time.strftime("%Y%m%d-%H%M%S")
+    path = fixture_path(name, label, fixture_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+    return path
+
+
+def load_fixtures(name, fixture_dir=FIXTURE_DIR):
+    """dict of label -> response body recorded for provider name."""
+    fixtures = {}
+    directory = os.path.join(fixture_dir, name)
+    if not os.path.isdir(directory):
+        return fixtures
+    for filename in sorted(os.listdir(directory)):
+        with open(os.path.join(directory, filename), "rb") as f:
+            fixtures[os.path.splitext(filename)[0]] = f.read()
+    return fixtures
+
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server
+        name = server.provider_for(self.path)
+        server.requests[name] += 1
+        if server.delay:
+            time.sleep(server.delay)
+        body = server.responses.get(name)
+        status = server.status
+        if body is None:
+            status, body = 404, b"no response recorded"
+        elif status != 200:
+            body = b"error"
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class ReplayServer(ThreadingMixIn, HTTPServer):
+    """Local HTTP server answering every provider's requests with the body set
+    in responses[name]. Requests are counted per provider; status and delay
+    make it fail or respond slowly on purpose.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, port=0, responses=None):
+        HTTPServer.__init__(self, ("127.0.0.1", port), ReplayHandler)
+        self.responses = dict(responses or {})
+        self.requests = Counter()
+        self.status = 200
+        self.delay = 0.0
+        self.thread = None
+
+    @property
+    def host(self):
+        return "{}:{}".format(*self.server_address)
+
+    def provider_for(self, path):
+        for name, provider in PROVIDERS.items():
+            if path.startswith(provider.path):
+                return name
+        return None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def fetch(self, name, config):
+        """Fetch and parse provider name's forecast from this server."""
+        provider = PROVIDERS[name]
+        return provider.parse(provider.request(config, self.host, False))
+
+
+# -------------------------------------------------------------------------------
+#  M A I N
+# -------------------------------------------------------------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Record and replay provider responses")
+    parser.add_argument("--fixtures", default=FIXTURE_DIR)
+    commands = parser.add_subparsers(dest="command")
+    commands.required = True
+
+    record_parser = commands.add_parser("record", help="save a live response")
+    record_parser.add_argument("provider", choices=sorted(PROVIDERS))
+    record_parser.add_argument("config", help="config file, or zipcode for noaa")
+    record_parser.add_argument("--label")
+
+    serve_parser = commands.add_parser("serve", help="replay recorded responses")
+    serve_parser.add_argument("--port", type=int, default=8000)
+    serve_parser.add_argument("--label", help="fixture to serve, newest by default")
+    args = parser.parse_args()
+
+    if args.command == "record":
+        print(record(args.provider, args.config, args.label, args.fixtures))
+    else:
+        responses = {}
+        for name in PROVIDERS:
+            fixtures = load_fixtures(name, args.fixtures)
+            if args.label in fixtures:
+                responses[name] = fixtures[args.label]
+            elif fixtures:
+                responses[name] = fixtures[sorted(fixtures)[-1]]
+        server = ReplayServer(args.port, responses)
+        print("replaying {} on {}".format(", ".join(sorted(responses)), server.host))
+        server.serve_forever()
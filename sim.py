@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+# ===============================================================================
+# sim.py
+#
+# Headless, deterministic simulation of the snake and pong games.
+#
+# Boards are stepped from a seeded RNG and a scripted input trace with no
+# sleeping and no rendering, for benchmarking the simulation core and for
+# replaying bug reports exactly. A trace is a JSON list of [tick, key] pairs,
+# key being the curses key code applied before that tick is simulated.
+#
+#   python sim.py snake --seed 1 --steps 100000 --trace trace.json
+# ===============================================================================
+import argparse
+import curses
+import json
+import random
+import sys
+import time
+import tracemalloc
+import zlib
+from collections import defaultdict
+
+import pong
+import snake
+
+
+def load_trace(filename):
+    """Returns a dict of tick -> list of keys from a JSON trace file."""
+    trace = defaultdict(list)
+    if filename is None:
+        return trace
+    with open(filename) as f:
+        for tick, key in json.load(f):
+            trace[int(tick)].append(key)
+    return trace
+
+
+def make_snake(rng):
+    snake_piece = snake.Snake(snake.Point(0, snake.DEFAULT_BOARD_HEIGHT // 2, 1, 0))
+    board = snake.Board(snake_piece, max_resets=sys.maxsize, rng=rng)
+    return snake.Game(board)
+
+
+def make_pong(rng):
+    width = pong.DEFAULT_BOARD_WIDTH
+    height = pong.DEFAULT_BOARD_HEIGHT
+    player1 = pong.Player(ord("w"), ord("s"), pong.Point(0, height // 2))
+    player2 = pong.Player(
+        curses.KEY_UP, curses.KEY_DOWN, pong.Point(width - 1, height // 2)
+    )
+    ball = pong.Ball(pong.Point(width // 2, height // 2, -1, 0), rng=rng)
+    board = pong.Board(player1, player2, ball, max_resets=sys.maxsize)
+    return pong.Pong(board)
+
+
+GAMES = {
+    "snake": make_snake,
+    "pong": make_pong,
+}
+
+
+def board_checksum(game):
+    """CRC of the board state, identical for identical runs."""
+    board = game.board
+    state = (board.bits.rows, board.num_resets)
+    return zlib.crc32(repr(state).encode("ascii"))
+
+
+def run(name, seed, steps, trace, game=None, step_hook=None):
+    """Simulate steps ticks of game name, applying keys from trace. Returns
+    the game. step_hook, if given, is called after every tick.
+    """
+    if game is None:
+        game = GAMES[name](random.Random(seed))
+    for tick in range(steps):
+        for key in trace.get(tick, ()):
+            game.handle_key(key)
+        game.tick()
+        if step_hook is not None:
+            step_hook(tick)
+    return game
+
+
+def benchmark(name, seed=0, steps=10000, trace=None):
+    """Time a run of the simulation, then repeat it under tracemalloc to
+    measure the bytes allocated within each step. Both runs use the same seed
+    and trace, so they are the same simulation.
+    """
+    if trace is None:
+        trace = {}
+    start = time.perf_counter()
+    game = run(name, seed, steps, trace)
+    elapsed = time.perf_counter() - start
+
+    step_bytes = []
+    tracemalloc.start()
+    traced = GAMES[name](random.Random(seed))
+
+    def measure(tick):
+        current, peak = tracemalloc.get_traced_memory()
+        step_bytes.append(peak - base[0])
+        tracemalloc.reset_peak()
+        base[0] = current
+
+    base = [tracemalloc.get_traced_memory()[0]]
+    run(name, seed, steps, trace, game=traced, step_hook=measure)
+    tracemalloc.stop()
+
+    checksum = board_checksum(game)
+    if checksum != board_checksum(traced):
+        raise RuntimeError("simulation is not deterministic")
+    return {
+        "game": name,
+        "seed": seed,
+        "steps": steps,
+        "seconds": elapsed,
+        "steps_per_sec": steps / elapsed if elapsed else float("inf"),
+        "alloc_bytes_per_step": sum(step_bytes) / float(max(steps, 1)),
+        "max_alloc_bytes_per_step": max(step_bytes) if step_bytes else 0,
+        "resets": game.board.num_resets,
+        "checksum": checksum,
+    }
+
+
+# -------------------------------------------------------------------------------
+#  M A I N
+# -------------------------------------------------------------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Headless game simulation")
+    parser.add_argument("game", choices=sorted(GAMES))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--steps", type=int, default=10000)
+    parser.add_argument("--trace", help="JSON list of [tick, key] pairs")
+    args = parser.parse_args()
+
+    result = benchmark(args.game, args.seed, args.steps, load_trace(args.trace))
+    print(json.dumps(result, indent=2, sort_keys=True))
@@ -1,90 +1,25 @@
 from led8x8icons import LED8x8ICONS
-from led_disp import LEDDisplay
+from canvas import load_canvas
+from bitboard import BitBoard, FreeCells
+from gameloop import FixedTimestepLoop
+from engine import Point, Piece
+from gameinput import InputPipeline, KeyReader
+import profiling
+from snake_planner import Planner
+from collections import deque
 from threading import Thread
 import time
-import copy
 import curses
 import random
+import sys
 
 DEFAULT_BOARD_WIDTH = 4 * 8
 DEFAULT_BOARD_HEIGHT = 8
 
 
-class Point(object):
-    def __init__(self, dx, dy, vx, vy, max_vx=2, max_vy=2):
-        self.dx = dx
-        self.dy = dy
-        self.vx = vx
-        self.vy = vy
-        self.max_vx = max_vx
-        self.max_vy = max_vy
-
-    def step(self):
-        self.dx += self.vx
-        self.dy += self.vy
-
-    def _clip_v(self, new_v, max_v):
-        v = min(abs(new_v), max_v)
-        if new_v < 0:
-            v *= -1
-        return v
-
-    def set_vx(self, new_vx):
-        self.vx = self._clip_v(new_vx, self.max_vx)
-
-    def set_vy(self, new_vy):
-        self.vy = self._clip_v(new_vy, self.max_vy)
-
-    def __repr__(self):
-        return str(self)
-
-    def __str__(self):
-        return "<Point at dx={}, dy={}, vx={}, vy={}>".format(
-            self.dx, self.dy, self.vx, self.vy
-        )
-
-
-class Piece(object):
-    def __init__(self, width, height, initial_point):
-        self.width = width
-        self.height = height
-        self.initial_point = initial_point
-        self.point = copy.copy(self.initial_point)
-
-    def reset(self):
-        self.point = copy.copy(self.initial_point)
-
-    def get_position(self):
-        old_x = self.point.dx
-        old_y = self.point.dy
-        coords = []
-        for i in range(self.width):
-            for j in range(self.height):
-                pair = (old_x + i, old_y + j)
-                pair = list(map(lambda x: abs(int(x)), pair))
-                coords.append(pair)
-        return coords
-
-    def step(self):
-        old_position = self.get_position()
-        self.point.step()
-        new_position = self.get_position()
-        return old_position, new_position
-
-    def set_vx(self, vx):
-        self.point.set_vx(vx)
-
-    def set_vy(self, vy):
-        self.point.set_vy(vy)
-
-    def get_vx(self):
-        return self.point.vx
-
-    def get_vy(self):
-        return self.point.vy
-
-
 class Nutrient(Piece):
+    __slots__ = ()
+
     def __init__(self, dx, dy):
         return super(Nutrient, self).__init__(1, 1, Point(dx, dy, 0, 0))
 
@@ -99,42 +34,84 @@ class Nutrient(Piece):
 
 
 class Snake(Piece):
-    def __init__(self, initial_point):
+    """The snake body is a deque of packed cell indices (y * width + x), head
+    first, mirrored in an occupancy bitset so every step is O(1).
+    """
+
+    __slots__ = (
+        "board_width",
+        "board_height",
+        "body",
+        "occupied",
+        "pending_growth",
+        "upkey",
+        "downkey",
+        "leftkey",
+        "rightkey",
+    )
+
+    def __init__(
+        self,
+        initial_point,
+        board_width=DEFAULT_BOARD_WIDTH,
+        board_height=DEFAULT_BOARD_HEIGHT,
+    ):
+        self.board_width = board_width
+        self.board_height = board_height
         super(Snake, self).__init__(1, 1, initial_point)
-        self.arr = [self.point]
+        self.reset()
         self.upkey = curses.KEY_UP
         self.downkey = curses.KEY_DOWN
         self.leftkey = curses.KEY_LEFT
         self.rightkey = curses.KEY_RIGHT
 
-    def append_head(self, x, y):
-        self.arr.insert(1, Point(x, y, 0, 0))
+    def cell(self, x, y):
+        """Packed index of x, y or None if it is off the board."""
+        if not (0 <= x < self.board_width and 0 <= y < self.board_height):
+            return None
+        return y * self.board_width + x
+
+    def coords(self, cell):
+        return cell % self.board_width, cell // self.board_width
+
+    def grow(self):
+        """Keep the tail in place on the next step, growing by one."""
+        self.pending_growth += 1
 
     def get_position(self):
-        coords = []
-        for point in self.arr:
-            coords.append(list(map(lambda x: int(x), (point.dx, point.dy))))
-        return coords
+        return [list(self.coords(cell)) for cell in self.body]
 
     def reset(self):
         super(Snake, self).reset()
-        self.arr = [self.point]
+        head = self.cell(self.point.cell_x(), self.point.cell_y())
+        self.body = deque([head])
+        self.occupied = 1 << head
+        self.pending_growth = 0
 
     def step(self):
-        old_position = self.get_position()
-        head = self.arr[0]
-        tail = self.arr.pop()
-        tail.dx = head.dx
-        tail.dy = head.dy
-        head.step()
-        self.arr.insert(1, tail)
-        new_position = self.get_position()
-        return old_position, new_position
+        """Move the head one step. Returns (vacated, head, collided): the
+        cell the tail left (or None while growing), the new head cell (or
+        None if it left the board) and whether the head ran into the body.
+        """
+        self.point.step()
+        vacated = None
+        if self.pending_growth:
+            self.pending_growth -= 1
+        else:
+            vacated = self.body.pop()
+            self.occupied &= ~(1 << vacated)
+        head = self.cell(self.point.cell_x(), self.point.cell_y())
+        if head is None:
+            return vacated, None, False
+        collided = bool(self.occupied >> head & 0x01)
+        self.body.appendleft(head)
+        self.occupied |= 1 << head
+        return vacated, head, collided
 
     def handle_key(self, key):
         # exactly one of vx or vy is non-zero
-        vx = self.get_vx()
-        vy = self.get_vy()
+        vx = self.point.fvx
+        vy = self.point.fvy
         if abs(vx) > 0:
             if key == self.upkey:
                 self.set_vx(0)
@@ -151,10 +128,10 @@ class Snake(Piece):
                 self.set_vy(0)
 
     def __len__(self):
-        return len(self.arr)
+        return len(self.body)
 
     def __str__(self):
-        return "<Snake {}>".format(self.arr)
+        return "<Snake {}>".format(self.get_position())
 
 
 class Board(object):
@@ -165,101 +142,134 @@ class Board(object):
         width=DEFAULT_BOARD_WIDTH,
         height=DEFAULT_BOARD_HEIGHT,
         max_resets=5,
+        rng=random,
     ):
         self.snake = snake
-        if nutrient is None:
-            nutrient = Nutrient.new_random(width, height)
-        self.nutrient = nutrient
+        self.rng = rng
         self.width = width
         self.height = height
 
-        self.array = self._init_array()
+        self.bits = BitBoard(width, height)
+        self.free = FreeCells(width * height, snake.occupied)
+        self.stamp_snake()
+        self.nutrient = None
+        self.place_nutrient(nutrient)
         self.num_resets = 0
         self.max_resets = max_resets
 
-    def _init_array(self, val=0):
-        array = []
-        for _ in range(self.height):
-            array.append([val] * self.width)
-        return array
+    def place_nutrient(self, nutrient=None):
+        """Place nutrient, or a new one on a uniformly random cell not taken by
+        the snake. Returns False if there is no free cell left.
+        """
+        if nutrient is None:
+            cell = self.free.choice(self.rng)
+            if cell is None:
+                self.nutrient = None
+                return False
+            nutrient = Nutrient(cell % self.width, cell // self.width)
+        self.nutrient = nutrient
+        self.bits.set(nutrient.point.cell_x(), nutrient.point.cell_y(), 1)
+        return True
+
+    def stamp_snake(self):
+        for cell in self.snake.body:
+            self.bits.set(cell % self.width, cell // self.width, 1)
+
+    def is_nutrient(self, x, y):
+        if self.nutrient is None:
+            return False
+        point = self.nutrient.point
+        return point.cell_x() == x and point.cell_y() == y
 
     def update_position(self, piece):
-        pos, next_pos = piece.step()
-        # zero out old position
-        self.set_position(pos, 0)
-
-        for x, y in next_pos:
-            vx = piece.get_vx()
-            vy = piece.get_vy()
-
-            is_collision = False
-            is_nutrient = False
-            if x < 0 or x >= self.width:
-                is_collision = True
-                break
-            if y < 0 or y >= self.height:
-                is_collision = True
-                break
-
-            if self.array[y][x] == 1:
-                is_collision = True
-                if x > 0 and x < self.width:
-                    is_nutrient = True
-                    break
-                if y > 0 and y < self.height:
-                    is_nutrient = True
-                    break
-                break
-
-        if is_nutrient:
-            self.snake.append_head(x, y)
-            # TODO make sure no collision with snake?
-            self.nutrient = Nutrient.new_random(self.width, self.height)
-        elif is_collision:
+        vacated, head, collided = piece.step()
+        if vacated is not None:
+            self.bits.set(vacated % self.width, vacated // self.width, 0)
+            self.free.add(vacated)
+        if head is None or collided:
             self.reset()
             return
 
-        self.set_position(next_pos, 1)
+        x, y = head % self.width, head // self.width
+        self.free.remove(head)
+        self.bits.set(x, y, 1)
+        if self.is_nutrient(x, y):
+            self.snake.grow()
+            if not self.place_nutrient():
+                # the snake fills the board, start over
+                self.reset()
 
     def reset(self):
         self.snake.reset()
-        self.nutrient = Nutrient.new_random(self.width, self.height)
-        self.array = self._init_array()
+        self.bits.clear()
+        self.free.reset(self.snake.occupied)
+        self.stamp_snake()
+        self.place_nutrient()
         self.num_resets += 1
 
     def exceeded_max_resets(self):
         return self.num_resets >= self.max_resets
 
     def end(self):
-        self.array = self._init_array(val=1)
+        self.bits.clear(val=1)
 
     def set_position(self, pos, value):
         for x, y in pos:
-            try:
-                self.array[y][x] = value
-            except IndexError:
-                continue
+            self.bits.set(x, y, value)
 
 
 class Game(object):
-    def __init__(self, board):
+    def __init__(self, board, attract=False, attract_after=10):
         self.board = board
         self.step_speed = 1
         self.running = False
+        self.loop = None
+        self.input = InputPipeline()
+        # in attract mode the planner plays whenever nobody has pressed a key
+        # for attract_after seconds
+        self.planner = Planner(board.snake, board) if attract else None
+        self.attract_after = attract_after
+        self.last_input = None
+
+    def tick(self):
+        """Advance the simulation by one step."""
+        self.board.update_position(self.board.snake)
+
+    def is_idle(self):
+        if self.last_input is None:
+            return True
+        return time.monotonic() - self.last_input >= self.attract_after
+
+    def update(self):
+        if self.input.apply(self.handle_key):
+            self.last_input = time.monotonic()
+        if self.planner is not None and self.is_idle():
+            key = self.planner.choose_key()
+            if key is not None:
+                self.board.snake.handle_key(key)
+        self.tick()
+        if self.board.exceeded_max_resets():
+            self.render_end()
+            self.stop()
+
+    def tick_interval(self):
+        # speeds up as the snake grows
+        self.step_speed = 0.5 / len(self.board.snake)
+        return self.step_speed
 
     def start(self):
         self.running = True
-        while self.running:
-            self.board.update_position(self.board.snake)
-            pos = self.board.nutrient.get_position()
-            self.board.set_position(pos, 1)
-            self.step_speed = 0.5 / len(self.board.snake)
-            self.render()
-
-            if self.board.exceeded_max_resets():
-                self.render_end()
-                self.stop()
-            time.sleep(self.step_speed)
+        self.loop = FixedTimestepLoop(
+            self.update,
+            self.present,
+            self.tick_interval,
+            lambda: self.running,
+        )
+        return self.loop.run()
+
+    def present(self, alpha=0.0):
+        self.render()
+        self.input.presented()
 
     def stop(self):
         self.running = False
@@ -279,13 +289,14 @@ class Game(object):
 
 
 class TermDisp(Game):
-    def __init__(self, board, screen):
-        super(TermDisp, self).__init__(board)
+    def __init__(self, board, screen, **kwargs):
+        super(TermDisp, self).__init__(board, **kwargs)
         self.screen = screen
 
     def render(self):
-        for y, row in enumerate(self.board.array):
-            for x, val in enumerate(row):
+        for y, row in enumerate(self.board.bits.rows):
+            for x in range(self.board.width):
+                val = row >> x & 0x01
                 strval = " "
                 if val == 1:
                     strval = "*"
@@ -296,34 +307,41 @@ class TermDisp(Game):
         self.screen.refresh()
 
     def render_end(self):
-        for y, row in enumerate(self.board.array):
-            for x, val in enumerate(row):
+        for y in range(self.board.height):
+            for x in range(self.board.width):
                 strval = "*"
                 self.screen.addstr(y, x, strval)
         self.screen.refresh()
 
 
 class PiDisp(Game):
-    def __init__(self, board, screen):
-        super(PiDisp, self).__init__(board)
-        self.display = LEDDisplay()
+    def __init__(self, board, screen, canvas=None, **kwargs):
+        super(PiDisp, self).__init__(board, **kwargs)
+        self.canvas = canvas or load_canvas()
+        self.display = self.canvas.display()
         self.display.clear_display()
 
     def render(self):
-        for y, row in enumerate(self.board.array):
-            for x, value in enumerate(row):
-                matrix = x // 8
-                self.display.set_pixel(
-                    x % 8, y % 8, matrix=matrix, value=value, auto_write=False
-                )
-        self.display.show()
+        # rows of the board are canvas rows, cut them into tiles and write
+        # the matrices that changed
+        screen = self.canvas.screen(self.board.bits.rows)
+        self.display.update_screen(screen, scroll=False)
 
     def render_end(self):
-        for matrix in range(len(self.display.matrix)):
+        for matrix in range(len(self.display.matrices)):
             self.display.set_raw64(LED8x8ICONS["UNKNOWN"], matrix)
 
 
 def main():
+    # `snake.py attract` lets the planner play until someone presses a key,
+    # `snake.py wall.json` plays on the matrices laid out in wall.json
+    args = sys.argv[1:]
+    attract = "attract" in args
+    layouts = [arg for arg in args if arg.endswith(".json")]
+    canvas = load_canvas(layouts[0] if layouts else None)
+    # SIGUSR1 toggles profiling of the game loop
+    profiling.install("snake")
+
     # get the curses screen window
     screen = curses.initscr()
     # turn off input echoing
@@ -333,13 +351,21 @@ def main():
     # map arrow keys to special values
     screen.keypad(True)
 
+    game = None
     try:
-        snake = Snake(Point(0, DEFAULT_BOARD_HEIGHT / 2, 1, 0))
+        snake = Snake(
+            Point(0, canvas.height / 2, 1, 0), canvas.width, canvas.height
+        )
 
-        board = Board(snake)
-        window = curses.newwin(DEFAULT_BOARD_HEIGHT + 1, DEFAULT_BOARD_WIDTH + 1, 0, 0)
-        # game = TermDisp(board, window)
-        game = PiDisp(board, window)
+        board = Board(
+            snake,
+            width=canvas.width,
+            height=canvas.height,
+            max_resets=sys.maxsize if attract else 5,
+        )
+        window = curses.newwin(canvas.height + 1, canvas.width + 1, 0, 0)
+        # game = TermDisp(board, window, attract=attract)
+        game = PiDisp(board, window, canvas=canvas, attract=attract)
 
         def start():
             return game.start()
@@ -347,18 +373,23 @@ def main():
         thread = Thread(target=start)
         thread.daemon = True
 
+        # keys are queued here and applied by the game thread on its next tick
+        reader = KeyReader(screen, game.input)
+        game.running = True
         thread.start()
-        while game.running:
-            key = screen.getch()
-            game.handle_key(key)
+        reader.run(lambda: game.running)
         thread.join()
     finally:
-        # shut down cleanly
-        print("snake:", snake.arr, "nutrient:", board.nutrient)
+        # shut down cleanly, then print where curses won't draw over it
         curses.nocbreak()
         screen.keypad(0)
         curses.echo()
         curses.endwin()
+        if game is not None:
+            print("snake:", game.board.snake, "nutrient:", game.board.nutrient)
+            if game.loop is not None:
+                print(game.loop.stats)
+                print(game.input.latency)
 
 
 if __name__ == "__main__":
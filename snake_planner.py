@@ -0,0 +1,198 @@
+# ===============================================================================
+# snake_planner.py
+#
+# Path planner that drives the snake for the attract mode.
+#
+# Searches run directly on the snake's occupancy bitset: a breadth first
+# search expands a whole layer of cells at once with a few shifts and masks
+# on one integer, so a full search of the board costs at most one big-int
+# operation per layer. The snake heads for the nutrient along a shortest
+# path when it can still reach its own tail afterwards, and otherwise follows
+# its tail to stay alive.
+#
+# The work a decision may do is budgeted in search steps, a step expanding
+# one layer, rather than in seconds, so runs are the same on any machine. A
+# move whose safety check ran out of steps counts as unsafe.
+# ===============================================================================
+
+UP = (0, -1)
+DOWN = (0, 1)
+LEFT = (-1, 0)
+RIGHT = (1, 0)
+
+
+def bit_count(value):
+    return bin(value).count("1")
+
+
+class Planner(object):
+    def __init__(self, snake, board, budget=None):
+        """budget is the most search steps one decision may take, by default
+        enough for every search a decision can make to cover the board.
+        """
+        self.snake = snake
+        self.board = board
+        self.width = board.width
+        self.height = board.height
+        num_cells = self.width * self.height
+        self.budget = 8 * num_cells if budget is None else budget
+        self.steps_left = 0
+        self.cut_short = False
+        self.full = (1 << num_cells) - 1
+        first_col = 0
+        for y in range(self.height):
+            first_col |= 1 << (y * self.width)
+        self.not_first_col = self.full & ~first_col
+        self.not_last_col = self.full & ~(first_col << (self.width - 1))
+        self.keys = {
+            UP: snake.upkey,
+            DOWN: snake.downkey,
+            LEFT: snake.leftkey,
+            RIGHT: snake.rightkey,
+        }
+        # decisions that ran out of steps
+        self.over_budget = 0
+
+    def neighbours(self, mask):
+        """Every cell next to a cell in mask."""
+        return (
+            (mask << 1 & self.not_first_col)
+            | (mask >> 1 & self.not_last_col)
+            | (mask << self.width & self.full)
+            | (mask >> self.width)
+        )
+
+    def step(self):
+        """Take a search step from the budget, False if there are none left."""
+        if self.steps_left <= 0:
+            self.cut_short = True
+            return False
+        self.steps_left -= 1
+        return True
+
+    def layers(self, target, free, stop):
+        """Breadth first search over free cells starting at target. Returns
+        the list of layers (bitmasks of cells at distance 0, 1, ...) until a
+        layer reaches a cell in stop, the search runs out of cells or the
+        budget runs out.
+        """
+        layers = [target]
+        seen = target
+        frontier = target
+        while frontier and not frontier & stop and self.step():
+            frontier = self.neighbours(frontier) & free & ~seen
+            seen |= frontier
+            layers.append(frontier)
+        return layers
+
+    def flood(self, start, free, stop=0):
+        """Cells reachable from start through free cells, up to the first
+        layer reaching a cell in stop. Returns them and whether the flood
+        finished rather than ran out of budget.
+        """
+        seen = start
+        frontier = start
+        while frontier and not frontier & stop:
+            if not self.step():
+                return seen, False
+            frontier = self.neighbours(frontier) & free & ~seen
+            seen |= frontier
+        return seen, True
+
+    def candidates(self):
+        """(direction, cell) for every move the snake may make: not off the
+        board and not reversing onto itself.
+        """
+        snake = self.snake
+        hx, hy = snake.coords(snake.body[0])
+        vx = (snake.point.fvx > 0) - (snake.point.fvx < 0)
+        vy = (snake.point.fvy > 0) - (snake.point.fvy < 0)
+        moves = []
+        for direction in (UP, DOWN, LEFT, RIGHT):
+            dx, dy = direction
+            if (dx, dy) == (-vx, -vy):
+                continue
+            cell = snake.cell(hx + dx, hy + dy)
+            if cell is not None:
+                moves.append((direction, cell, (dx, dy) == (vx, vy)))
+        return moves
+
+    def choose_direction(self):
+        """Direction the snake should move next, or None to keep going."""
+        self.steps_left = self.budget
+        self.cut_short = False
+        direction = self.plan()
+        if self.cut_short:
+            self.over_budget += 1
+        return direction
+
+    def plan(self):
+        snake = self.snake
+        occupied = snake.occupied
+        tail = 1 << snake.body[-1]
+        growing = snake.pending_growth > 0
+        # the tail moves out of the way on the next step unless growing
+        free = self.full & ~occupied
+        if not growing:
+            free |= tail
+
+        moves = [m for m in self.candidates() if free >> m[1] & 0x01]
+        if not moves:
+            return None
+        move_mask = 0
+        for _, cell, _ in moves:
+            move_mask |= 1 << cell
+
+        nutrient = self.board.nutrient
+        if nutrient is not None:
+            target = 1 << snake.cell(nutrient.point.cell_x(), nutrient.point.cell_y())
+            layers = self.layers(target, free, move_mask)
+            for direction, cell in self.ranked(moves, layers):
+                if self.is_safe(cell, occupied, tail):
+                    return direction
+
+        # no safe path to the nutrient, chase the tail to buy time
+        if len(snake) > 1:
+            layers = self.layers(tail, free | tail, move_mask)
+            for direction, cell in self.ranked(moves, layers):
+                return direction
+
+        # last resort, the move with the most room
+        best = None
+        best_room = -1
+        for direction, cell, _ in moves:
+            room = bit_count(self.flood(1 << cell, free)[0])
+            if room > best_room:
+                best, best_room = direction, room
+        return best
+
+    def ranked(self, moves, layers):
+        """Moves found in the search layers, nearest first, preferring to
+        carry straight on.
+        """
+        ranked = []
+        for direction, cell, straight in moves:
+            bit = 1 << cell
+            for distance, layer in enumerate(layers):
+                if layer & bit:
+                    ranked.append((distance, not straight, direction, cell))
+                    break
+        ranked.sort()
+        return [(direction, cell) for _, _, direction, cell in ranked]
+
+    def is_safe(self, cell, occupied, tail):
+        """After moving the head to cell, can it still reach the tail? Not
+        if the budget ran out before finding out.
+        """
+        if bit_count(occupied) <= 1:
+            return True
+        body = occupied | 1 << cell
+        free = self.full & ~body | tail
+        return bool(self.flood(1 << cell, free, tail)[0] & tail)
+
+    def choose_key(self):
+        """Key to press for the next move, or None to keep going."""
+        direction = self.choose_direction()
+        if direction is None:
+            return None
+        return self.keys[direction]
@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+# ===============================================================================
+# startup.py
+#
+# Startup timeline for the display programs.
+#
+# Phases are timed from when the process started (read from /proc, so the
+# interpreter start up and imports before the timeline existed count too),
+# and checked against a time to first frame budget. Running this file cold
+# starts a program several times and reports the median of every phase:
+#
+#   python startup.py 5 weather_climacell.py climacell_cfg.json --sim --startup
+# ===============================================================================
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+# seconds from process start until something is drawn, on a Pi Zero
+FIRST_FRAME_BUDGET = 1.5
+REPORT_PREFIX = "startup "
+
+
+def seconds_since_process_start():
+    """Seconds since this process started, or None where /proc can't say."""
+    try:
+        with open("/proc/self/stat") as f:
+            # fields after the command name, which may contain spaces
+            fields = f.read().rsplit(")", 1)[1].split()
+        start = int(fields[19]) / float(os.sysconf("SC_CLK_TCK"))
+        return time.clock_gettime(time.CLOCK_BOOTTIME) - start
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+class StartupTimeline:
+    def __init__(self, budget=FIRST_FRAME_BUDGET):
+        self.budget = budget
+        self.created = time.monotonic()
+        offset = seconds_since_process_start()
+        self.offset = max(offset, 0.0) if offset is not None else 0.0
+        self.phases = []
+
+    def elapsed(self):
+        """Seconds since the process started."""
+        return time.monotonic() - self.created + self.offset
+
+    def mark(self, phase):
+        """Record that phase has finished now."""
+        self.phases.append((phase, self.elapsed()))
+
+    def get(self, phase):
+        for name, at in self.phases:
+            if name == phase:
+                return at
+        return None
+
+    def over_budget(self, phase="first frame"):
+        at = self.get(phase)
+        return at is not None and at > self.budget
+
+    def as_dict(self):
+        return dict(self.phases)
+
+    def __str__(self):
+        parts = []
+        previous = 0.0
+        for name, at in self.phases:
+            parts.append("{} {:.3f}s (+{:.3f}s)".format(name, at, at - previous))
+            previous = at
+        return "<StartupTimeline {}>".format(", ".join(parts))
+
+    def report(self):
+        """Print the timeline, as one JSON line for benchmarks, and warn if the
+        first frame missed its budget.
+        """
+        print(REPORT_PREFIX + json.dumps(self.as_dict()))
+        print(self)
+        if self.over_budget():
+            print(
+                "first frame took {:.3f}s, budget is {:.3f}s".format(
+                    self.get("first frame"), self.budget
+                )
+            )
+
+
+def benchmark(argv, runs=5):
+    """Cold start python argv runs times and return the median time of each
+    phase it reports.
+    """
+    samples = {}
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable] + argv,
+            stdout=subprocess.PIPE,
+            universal_newlines=True,
+            check=True,
+        ).stdout
+        for line in output.splitlines():
+            if line.startswith(REPORT_PREFIX):
+                for phase, at in json.loads(line[len(REPORT_PREFIX) :]).items():
+                    samples.setdefault(phase, []).append(at)
+    return dict((phase, statistics.median(at)) for phase, at in samples.items())
+
+
+# -------------------------------------------------------------------------------
+#  M A I N
+# -------------------------------------------------------------------------------
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print("usage: startup.py RUNS PROGRAM [ARGS...]")
+        sys.exit(1)
+    result = benchmark(sys.argv[2:], int(sys.argv[1]))
+    for phase, at in sorted(result.items(), key=lambda item: item[1]):
+        print("{:<16} {:.3f}s".format(phase, at))
+    first_frame = result.get("first frame")
+    if first_frame is not None:
+        print(
+            "time to first frame {:.3f}s, budget {:.3f}s{}".format(
+                first_frame,
+                FIRST_FRAME_BUDGET,
+                " OVER BUDGET" if first_frame > FIRST_FRAME_BUDGET else "",
+            )
+        )
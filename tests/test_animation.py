@@ -0,0 +1,153 @@
+import struct
+
+import pytest
+
+import led_disp
+from animation import (
+    FLAG_RLE,
+    HEADER,
+    INDEX_ENTRY,
+    Animation,
+    rle_encode,
+    screen_to_bytes,
+    write_animation,
+)
+from led_sim import SimDisplay
+from virtual_clock import VirtualClock
+
+FRAMES = [
+    ((0, 0, 0, 0), 100),
+    ((0xFF, 1 << 63, 0x0102030405060708, 0), 50),
+    ((0x8040201008040201, 0x55AA55AA55AA55AA, 0xFFFFFFFFFFFFFFFF, 7), 20),
+]
+
+
+def decode_all(animation):
+    frames = []
+    for i in range(len(animation)):
+        duration_ms = animation.load_frame(i)
+        screen = tuple(animation.matrix_value(m) for m in range(animation.matrices))
+        frames.append((screen, duration_ms))
+    return frames
+
+
+@pytest.mark.parametrize("rle", [True, False])
+def test_round_trip(tmp_path, rle):
+    path = str(tmp_path / "a.leda")
+    write_animation(path, FRAMES, rle=rle)
+    with Animation(path) as animation:
+        assert animation.matrices == 4
+        assert decode_all(animation) == FRAMES
+
+
+def test_rle_is_only_used_when_smaller(tmp_path):
+    path = str(tmp_path / "a.leda")
+    write_animation(path, FRAMES)
+    with open(path, "rb") as f:
+        data = f.read()
+    flags = [
+        INDEX_ENTRY.unpack_from(data, HEADER.size + INDEX_ENTRY.size * i)[2]
+        for i in range(len(FRAMES))
+    ]
+    assert flags[0] & FLAG_RLE
+    assert not flags[2] & FLAG_RLE
+    assert len(rle_encode(screen_to_bytes(FRAMES[0][0]))) == 2
+
+
+def corrupt(tmp_path, change):
+    path = str(tmp_path / "a.leda")
+    write_animation(path, FRAMES)
+    with open(path, "rb") as f:
+        data = bytearray(f.read())
+    data = change(data)
+    with open(path, "wb") as f:
+        f.write(data)
+    return path
+
+
+def first_offset(data):
+    return INDEX_ENTRY.unpack_from(data, HEADER.size)[0]
+
+
+def set_first_run(data, run):
+    data[first_offset(data)] = run
+    return data
+
+
+@pytest.mark.parametrize(
+    "change",
+    [
+        lambda data: data[: HEADER.size - 1],
+        lambda data: b"LEDX" + data[4:],
+        lambda data: data[: HEADER.size + INDEX_ENTRY.size],
+        lambda data: data[:-3],
+        lambda data: set_first_run(data, 0),
+        lambda data: set_first_run(data, 255),
+        lambda data: data[:8] + struct.pack("<I", 1000) + data[12:],
+    ],
+    ids=[
+        "short header",
+        "bad magic",
+        "truncated index",
+        "truncated data",
+        "zero run",
+        "run past the frame",
+        "frame count too big",
+    ],
+)
+def test_corrupt_files_are_refused_on_open(tmp_path, change):
+    with pytest.raises(ValueError):
+        Animation(corrupt(tmp_path, change))
+
+
+class StubDisplay(object):
+    matrices = [None] * 4
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+        self.screens = []
+        self.screen_ids = set()
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(round(seconds, 3))
+        self.now += seconds
+
+    def write_screen(self, screen):
+        self.screens.append(tuple(screen))
+        self.screen_ids.add(id(screen))
+        if screen[0] == 1:
+            # the bus stalls for a second on the second frame
+            self.now += 1.0
+
+
+def test_playback_does_not_burst_after_a_stall(tmp_path):
+    path = str(tmp_path / "a.leda")
+    write_animation(path, [((i, 0, 0, 0), 100) for i in range(6)])
+    display = StubDisplay()
+    with Animation(path) as animation:
+        led_disp.LEDDisplay.play_animation(display, animation)
+    assert [screen[0] for screen in display.screens] == [0, 1, 2, 3, 4, 5]
+    # after the stall frames are paced again rather than sent back to back
+    assert display.sleeps == [0.1, 0.1, 0.1, 0.1, 0.1]
+    # one screen list, filled in place for every frame
+    assert len(display.screen_ids) == 1
+
+
+def test_playback_on_a_virtual_clock(tmp_path):
+    path = str(tmp_path / "a.leda")
+    write_animation(path, FRAMES)
+    clock = VirtualClock()
+    display = SimDisplay(sleep=clock.sleep, monotonic=clock.monotonic)
+    start = clock.monotonic()
+    try:
+        with Animation(path) as animation:
+            display.play_animation(animation, loops=2)
+    finally:
+        display.close()
+    # bus writes happen within each frame's time, not on top of it
+    assert clock.monotonic() - start == pytest.approx(2 * 0.17)
+    assert tuple(display.shown) == FRAMES[-1][0]
@@ -0,0 +1,64 @@
+import pytest
+
+from bitboard import BitBoard
+
+
+def cells(board):
+    return set(
+        (x, y)
+        for y in range(board.height)
+        for x in range(board.width)
+        if board.get(x, y)
+    )
+
+
+def test_set_get_and_bounds():
+    board = BitBoard(16, 8)
+    board.set(3, 2, 1)
+    board.set(15, 7, 1)
+    board.set(16, 0, 1)
+    board.set(-1, 0, 1)
+    assert cells(board) == {(3, 2), (15, 7)}
+    assert board.get(16, 0) == 0
+    board.set(3, 2, 0)
+    assert cells(board) == {(15, 7)}
+
+
+def test_clear():
+    board = BitBoard(5, 3, val=1)
+    assert len(cells(board)) == 15
+    board.clear()
+    assert not cells(board)
+
+
+@pytest.mark.parametrize("x, y, w, h", [(2, 1, 3, 2), (-2, -1, 4, 3), (14, 6, 5, 5)])
+def test_stamp_and_collides_match_cells(x, y, w, h):
+    board = BitBoard(16, 8)
+    board.stamp(x, y, w, h, 1)
+    expected = set(
+        (cx, cy)
+        for cy in range(y, y + h)
+        for cx in range(x, x + w)
+        if board.in_bounds(cx, cy)
+    )
+    assert cells(board) == expected
+    assert board.collides(x, y, w, h)
+    assert not board.collides(x + w, y, 2, h)
+    board.stamp(x, y, w, h, 0)
+    assert not cells(board)
+
+
+def test_collides_off_board():
+    board = BitBoard(8, 8, val=1)
+    assert not board.collides(-3, 0, 3, 8)
+    assert not board.collides(0, 8, 8, 2)
+
+
+def test_to_raw64_matches_pixels():
+    board = BitBoard(16, 8)
+    board.set(0, 0, 1)
+    board.set(9, 3, 1)
+    board.set(15, 7, 1)
+    assert board.to_raw64(0) == 1
+    assert board.to_raw64(1) == 1 << (8 * 3 + 1) | 1 << 63
+    assert board.screen(2) == (board.to_raw64(0), board.to_raw64(1))
@@ -0,0 +1,84 @@
+import json
+
+import pytest
+
+from canvas import TiledCanvas, Tile, load_canvas, rotate_raw64
+
+
+def pixels(value):
+    return set((bit % 8, bit // 8) for bit in range(64) if value >> bit & 0x01)
+
+
+def rotate_slow(value, rotation):
+    """Clockwise rotation pixel by pixel, (x, y) -> (7 - y, x) per turn."""
+    points = pixels(value)
+    for _ in range(rotation // 90):
+        points = set((7 - y, x) for x, y in points)
+    return sum(1 << (8 * y + x) for x, y in points)
+
+
+@pytest.mark.parametrize("rotation", [0, 90, 180, 270])
+@pytest.mark.parametrize(
+    "value", [0, 1, 0xFF, 0x0102040810204080, 0x00FF00000000FF81, 0x123456789ABCDEF0]
+)
+def test_rotate_matches_pixel_rotation(value, rotation):
+    assert rotate_raw64(value, rotation) == rotate_slow(value, rotation)
+
+
+def test_four_turns_is_identity():
+    value = 0x123456789ABCDEF0
+    turned = value
+    for _ in range(4):
+        turned = rotate_raw64(turned, 90)
+    assert turned == value
+    assert rotate_raw64(rotate_raw64(value, 90), 270) == value
+
+
+def test_grid_splits_buses():
+    canvas = TiledCanvas.grid(4, 2, buses=(1, 3))
+    assert canvas.layout() == [
+        (1, 0x70), (1, 0x71), (1, 0x72), (1, 0x73),
+        (3, 0x70), (3, 0x71), (3, 0x72), (3, 0x73),
+    ]
+    with pytest.raises(ValueError):
+        TiledCanvas.grid(9, 1)
+
+
+def test_bad_tiles_are_refused():
+    with pytest.raises(ValueError):
+        TiledCanvas(1, 1, [Tile(1, 0x70, 1, 0, 0)])
+    with pytest.raises(ValueError):
+        TiledCanvas(1, 1, [Tile(1, 0x70, 0, 0, 45)])
+
+
+def test_screen_and_locate_agree():
+    tiles = [Tile(1, 0x71, 1, 0, 90), Tile(1, 0x70, 0, 0, 180)]
+    canvas = TiledCanvas(2, 1, tiles)
+    for x, y in [(0, 0), (3, 5), (8, 0), (15, 7), (12, 2)]:
+        rows = [0] * canvas.height
+        rows[y] = 1 << x
+        matrix, mx, my = canvas.locate(x, y)
+        screen = canvas.screen(rows)
+        assert screen[matrix] == 1 << (8 * my + mx)
+        assert screen[1 - matrix] == 0
+    assert canvas.locate(16, 0) is None
+
+
+def test_load(tmp_path):
+    path = tmp_path / "canvas.json"
+    path.write_text(
+        json.dumps(
+            {
+                "columns": 2,
+                "rows": 1,
+                "tiles": [
+                    {"address": "0x72", "column": 1, "row": 0, "rotation": 270},
+                    {"bus": 3, "address": 113, "column": 0, "row": 0},
+                ],
+            }
+        )
+    )
+    canvas = load_canvas(str(path))
+    assert canvas.layout() == [(1, 0x72), (3, 0x71)]
+    assert canvas.tiles[0].rotation == 270
+    assert len(load_canvas()) == 4
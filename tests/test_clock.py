@@ -0,0 +1,46 @@
+import time
+
+import pytest
+
+from clock import render_clock, seconds_to_next_minute, update_display
+from led8x8icons import LED8x8ICONS
+from led_sim import SimDisplay
+
+# 2021-01-01 13:45:30 UTC
+NOW = 1609508730.0
+
+
+@pytest.fixture
+def utc(monkeypatch):
+    monkeypatch.setenv("TZ", "UTC")
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+def digits(text):
+    return tuple(LED8x8ICONS[c] if c != " " else LED8x8ICONS["ALL_OFF"] for c in text)
+
+
+def test_seconds_to_next_minute():
+    assert seconds_to_next_minute(NOW) == 30
+    assert seconds_to_next_minute(NOW + 30) == 60
+    assert seconds_to_next_minute(NOW + 29.5) == 0.5
+
+
+def test_render_clock(utc):
+    assert render_clock(True, now=NOW) == digits("1345")
+    assert render_clock(False, now=NOW) == digits(" 145")
+    assert render_clock(True, now=NOW - 13 * 3600) == digits("0045")
+
+
+def test_update_display_scrolls_only_changed_digits():
+    display = SimDisplay(sleep=lambda seconds: None)
+    display.update_screen(digits("1345"), scroll=False)
+    scrolled = []
+    display.scroll_raw64 = lambda value, matrix: scrolled.append(matrix)
+    update_display(display, 1346, 1345)
+    update_display(display, 1400, 1359)
+    assert scrolled == [3, 1, 2, 3]
+    display.close()
@@ -0,0 +1,54 @@
+import pytest
+
+from engine import FIX_ONE, Piece, Point, to_cell, to_fixed
+
+
+def test_to_fixed_round_trip():
+    assert to_fixed(1) == FIX_ONE
+    assert to_fixed(0.5) == FIX_ONE // 2
+    assert to_fixed(-2.25) == -2 * FIX_ONE - FIX_ONE // 4
+
+
+@pytest.mark.parametrize("value", [0, 0.99, 1, 3.5, -0.5, -1, -3.75])
+def test_to_cell_truncates_towards_zero(value):
+    assert to_cell(to_fixed(value)) == int(value)
+
+
+def test_step_is_exact_in_fixed_point():
+    point = Point(0, 0, 0.25, -0.5)
+    for _ in range(1000):
+        point.step()
+    assert (point.x, point.y) == (250 * FIX_ONE, -500 * FIX_ONE)
+    assert (point.cell_x(), point.cell_y()) == (250, -500)
+
+
+def test_velocity_is_clipped_keeping_sign():
+    point = Point(0, 0, 5, -5, max_vx=2, max_vy=1)
+    assert (point.vx, point.vy) == (2, -1)
+    point.set_vx(-3)
+    point.set_vy(0.5)
+    assert (point.vx, point.vy) == (-2, 0.5)
+
+
+def test_copy_is_independent():
+    point = Point(1, 2, 1, 0)
+    other = point.copy()
+    other.step()
+    assert point.dx == 1 and other.dx == 2
+    assert other.max_fvx == point.max_fvx
+
+
+def test_piece_reset_and_mirrored_cells():
+    piece = Piece(2, 1, Point(1, 0, -1, 0))
+    piece.step()
+    piece.step()
+    assert piece.point.cell_x() == -1
+    assert piece.get_position() == [[1, 0], [2, 0]]
+    piece.reset()
+    assert piece.cell_x() == 1
+    assert piece.initial_point.dx == 1
+
+
+def test_slots():
+    with pytest.raises(AttributeError):
+        Point(0, 0).z = 1
@@ -0,0 +1,104 @@
+import json
+import os
+import random
+
+import pytest
+
+import events
+from events import DEBUG, ERROR, INFO, EventLog, RotatingFile
+
+
+def test_ring_keeps_the_newest_events():
+    log = EventLog(capacity=3)
+    for i in range(5):
+        log.info("tick", i=i)
+    assert [e["i"] for e in log.recent()] == [2, 3, 4]
+    assert [e["i"] for e in log.recent(2)] == [3, 4]
+
+
+def test_level_and_sampling():
+    log = EventLog(
+        capacity=2000, level=INFO, sample={INFO: 0.5}, rng=random.Random(1)
+    )
+    log.debug("dropped")
+    for _ in range(1000):
+        log.info("sampled")
+    log.error("kept")
+    kept = log.recent()
+    assert all(e["ev"] != "dropped" for e in kept)
+    assert kept[-1]["ev"] == "kept"
+    assert 400 < log.sampled_out < 600
+    assert len(kept) == 1000 - log.sampled_out + 1
+
+
+def test_pending_drops_the_oldest_when_the_writer_falls_behind():
+    log = EventLog(capacity=4)
+    # pretend a writer is running, without one emptying pending
+    log.writer = object()
+    for i in range(10):
+        log.info("tick", i=i)
+    assert log.dropped == 6
+    assert [record[3]["i"] for record in log.pending] == [6, 7, 8, 9]
+
+
+def test_start_writes_batches_to_a_file(tmp_path):
+    path = str(tmp_path / "events.log")
+    log = EventLog()
+    log.start(path, "test", flush_interval=60, level=DEBUG, sample={})
+    log.debug("hello", who="world")
+    log.error("boom")
+    log.stop()
+    with open(path) as f:
+        records = [json.loads(line) for line in f]
+    assert [(r["lvl"], r["ev"]) for r in records] == [
+        ("DEBUG", "hello"),
+        ("ERROR", "boom"),
+    ]
+    assert records[0]["who"] == "world"
+
+
+def test_start_defaults_to_a_file_named_after_the_program(tmp_path, monkeypatch):
+    monkeypatch.setattr(events, "DEFAULT_LOG_DIR", str(tmp_path))
+    log = EventLog()
+    log.start(name="prog")
+    log.info("hello")
+    log.stop()
+    assert os.path.exists(str(tmp_path / "prog.log"))
+
+
+def test_rotating_file(tmp_path):
+    path = str(tmp_path / "rot.log")
+    f = RotatingFile(path, max_bytes=10, backups=2)
+    for text in ["a" * 10, "b" * 10, "c" * 10, "d" * 4]:
+        f.write(text + "\n")
+    f.close()
+    contents = {}
+    for name in sorted(os.listdir(str(tmp_path))):
+        with open(str(tmp_path / name)) as g:
+            contents[name] = g.read()
+    assert contents == {
+        "rot.log": "d" * 4 + "\n",
+        "rot.log.1": "c" * 10 + "\n",
+        "rot.log.2": "b" * 10 + "\n",
+    }
+
+
+def test_dump_and_format_readably(tmp_path):
+    log = EventLog()
+    log.warning("storm", speed=80)
+    path = log.dump(str(tmp_path / "dump.events"))
+    with open(path) as f:
+        line = f.readline()
+    text = events.format_readably(line)
+    assert "WARNING" in text and "storm" in text and "speed=80" in text
+
+
+def test_parse_level_and_sample():
+    assert events.parse_level("Debug") == DEBUG
+    assert events.parse_sample("debug=0.1, error=1") == {DEBUG: 0.1, ERROR: 1.0}
+    with pytest.raises(ValueError):
+        events.parse_level("loud")
+    with pytest.raises(ValueError):
+        events.parse_sample("info=2")
+    with pytest.raises(ValueError):
+        events.parse_sample("info")
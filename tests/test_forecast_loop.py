@@ -0,0 +1,40 @@
+import virtual_clock
+import weather_climacell
+from led_sim import SimDisplay
+
+
+def overruns():
+    return weather_climacell.OVERRUNS.labels(loop="forecast").value
+
+
+def test_scrolling_steps_are_not_overruns():
+    before = overruns()
+    result = virtual_clock.fast_forward(
+        ["current_forecast", "8_hr_forecast"], hours=0.5
+    )
+    assert result["matrix_redraws"] > 100
+    assert overruns() == before
+
+
+def test_slow_refresh_is_an_overrun():
+    clock = virtual_clock.VirtualClock()
+    provider = virtual_clock.StubProvider()
+
+    def slow_fetch():
+        clock.sleep(weather_climacell.PROGRAM_SECONDS + 1)
+        return provider()
+
+    forecast = weather_climacell.ForecastState(3600, slow_fetch, clock)
+    display = SimDisplay(sleep=clock.sleep)
+    before = overruns()
+    try:
+        weather_climacell.run(
+            display,
+            ["current_forecast"],
+            forecast,
+            clock=clock,
+            until=clock.time() + 60,
+        )
+    finally:
+        display.close()
+    assert overruns() == before + 1
@@ -0,0 +1,86 @@
+import pytest
+
+from frame_channel import (
+    SEQUENCE,
+    SLOT,
+    Compositor,
+    FrameChannel,
+    frame_to_screen,
+)
+
+
+class RecordingDisplay(object):
+    def __init__(self):
+        self.screens = []
+
+    def write_screen(self, screen):
+        self.screens.append(screen)
+        return True
+
+
+@pytest.fixture
+def channel(tmp_path):
+    channel = FrameChannel.create(str(tmp_path / "frames"), lanes=2, matrices=4)
+    yield channel
+    channel.close()
+
+
+@pytest.fixture
+def display():
+    return RecordingDisplay()
+
+
+@pytest.fixture
+def compositor(channel, display):
+    compositor = Compositor(channel, display)
+    yield compositor
+    compositor.close()
+
+
+def test_publish_and_show(channel, display, compositor):
+    channel.producer(0).publish((1, 2, 3, 4))
+    assert compositor.step() == 0
+    assert display.screens == [(1, 2, 3, 4)]
+
+
+def test_higher_priority_lane_wins_until_released(channel, display, compositor):
+    low = channel.producer(0, priority=1)
+    high = channel.producer(1, priority=5)
+    low.publish((1, 1, 1, 1))
+    high.publish((2, 2, 2, 2))
+    assert compositor.step() == 1
+    high.release()
+    assert compositor.step() == 0
+    assert display.screens[-1] == (1, 1, 1, 1)
+
+
+def test_torn_slot_is_not_shown(channel, display, compositor):
+    producer = channel.producer(0)
+    producer.publish((5, 6, 7, 8))
+    compositor.step()
+
+    # a producer stopped half way through writing the next frame: the lane
+    # points at it, but the slot is invalidated and half written
+    sequence = producer.sequence + 1
+    slot = channel.slot_offset(0, sequence)
+    SEQUENCE.pack_into(channel.mm, slot, 0)
+    start = slot + SLOT.size
+    channel.mm[start : start + channel.frame_size] = b"\xff" * channel.frame_size
+    SEQUENCE.pack_into(channel.mm, channel.lane_offset(0), sequence)
+
+    compositor.step()
+    assert compositor.torn == 1
+    assert frame_to_screen(compositor.frames[0], 4) == (5, 6, 7, 8)
+    assert display.screens[-1] == (5, 6, 7, 8)
+
+
+def test_create_replaces_a_mapped_file(tmp_path):
+    path = str(tmp_path / "frames")
+    old = FrameChannel.create(path, 2, 4)
+    producer = old.producer(0)
+    FrameChannel.create(path, 1, 1).close()
+    # the old mapping keeps its pages, writing to it doesn't fault
+    producer.publish((1, 2, 3, 4))
+    old.close()
+    with FrameChannel(path) as channel:
+        assert (channel.lanes, channel.matrices) == (1, 1)
@@ -0,0 +1,71 @@
+import os
+
+from gameinput import InputPipeline, KeyReader, LatencyStats
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeScreen(object):
+    def __init__(self, keys):
+        self.keys = list(keys)
+
+    def nodelay(self, flag):
+        self.nodelay_flag = flag
+
+    def getch(self):
+        return self.keys.pop(0) if self.keys else -1
+
+
+def test_latency_stats():
+    stats = LatencyStats(window=10)
+    for i in range(1, 21):
+        stats.record(i / 1000.0)
+    assert stats.count == 20
+    assert stats.max == 0.020
+    assert abs(stats.mean() - 0.0105) < 1e-12
+    # only the last 10 samples are kept for percentiles
+    assert stats.percentile(0) == 0.011
+    assert stats.percentile(95) == 0.020
+    assert LatencyStats().percentile(50) == 0.0
+
+
+def test_pipeline_applies_in_order_and_measures_latency():
+    clock = FakeClock()
+    pipeline = InputPipeline(clock=clock)
+    pipeline.push(1)
+    clock.now = 0.010
+    pipeline.push(2)
+    seen = []
+    assert pipeline.apply(seen.append) == 2
+    assert seen == [1, 2]
+    assert pipeline.apply(seen.append) == 0
+    clock.now = 0.030
+    pipeline.presented()
+    assert pipeline.latency.count == 2
+    assert abs(pipeline.latency.max - 0.030) < 1e-12
+    pipeline.presented()
+    assert pipeline.latency.count == 2
+
+
+def test_key_reader_queues_available_keys():
+    read_fd, write_fd = os.pipe()
+    try:
+        pipeline = InputPipeline()
+        screen = FakeScreen([65, 66])
+        reader = KeyReader(screen, pipeline, fd=read_fd)
+        assert screen.nodelay_flag is True
+        reader.poll(0)
+        assert not pipeline.events
+        os.write(write_fd, b"x")
+        reader.poll(0)
+        assert [event.key for event in pipeline.events] == [65, 66]
+        reader.close()
+    finally:
+        os.close(read_fd)
+        os.close(write_fd)
@@ -0,0 +1,71 @@
+from gameloop import FixedTimestepLoop
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def make_loop(clock, ticks, work=lambda tick: 0.0, **kwargs):
+    done = []
+
+    def tick():
+        done.append(clock.now)
+        clock.now += work(len(done))
+
+    loop = FixedTimestepLoop(
+        tick,
+        lambda alpha: None,
+        0.1,
+        lambda: len(done) < ticks,
+        clock=clock,
+        sleep=clock.sleep,
+        **kwargs
+    )
+    return loop, done
+
+
+def test_ticks_at_a_fixed_rate():
+    clock = FakeClock()
+    loop, done = make_loop(clock, 50, work=lambda tick: 0.03)
+    stats = loop.run()
+    assert stats.ticks == 50
+    assert stats.overruns == 0 and stats.dropped_ticks == 0
+    # work is taken out of the sleep, ticks don't drift
+    assert abs(done[-1] - done[0] - 49 * 0.1) < 1e-6
+
+
+def test_backlog_after_a_stall_is_dropped():
+    clock = FakeClock()
+    # the tenth tick stalls for two seconds, twenty ticks' worth
+    loop, done = make_loop(
+        clock, 30, work=lambda tick: 2.0 if tick == 10 else 0.0, max_catch_up=5
+    )
+    stats = loop.run()
+    assert stats.overruns >= 1
+    assert stats.dropped_ticks >= 10
+    # at most max_catch_up ticks were run back to back
+    gaps = [b - a for a, b in zip(done, done[1:])]
+    assert sum(1 for gap in gaps if gap < 1e-9) <= 5
+
+
+def test_variable_interval():
+    clock = FakeClock()
+    intervals = iter([0.1] * 5 + [0.05] * 100)
+    ticks = []
+    loop = FixedTimestepLoop(
+        lambda: ticks.append(clock.now),
+        lambda alpha: None,
+        lambda: next(intervals),
+        lambda: len(ticks) < 20,
+        clock=clock,
+        sleep=clock.sleep,
+    )
+    loop.run()
+    assert abs(ticks[-1] - ticks[-2] - 0.05) < 1e-6
@@ -0,0 +1,135 @@
+import threading
+import time
+
+import pytest
+
+import weather_climacell
+from canvas import load_canvas
+from led_daemon import CommandServer, Daemon, send
+from led_sim import SimDisplay
+
+
+class StubDisplay(object):
+    matrices = [None] * 4
+
+
+class StubForecast(object):
+    version = 3
+
+
+@pytest.fixture
+def daemon():
+    return Daemon(StubDisplay(), None, StubForecast())
+
+
+def test_status(daemon):
+    reply = daemon.check({"cmd": "status"})
+    assert reply["ok"] and reply["forecast_version"] == 3
+    assert daemon.commands.empty()
+
+
+def test_valid_commands_are_queued(daemon):
+    commands = [
+        {"cmd": "program", "names": ["clock", "current_forecast"]},
+        {"cmd": "program", "names": ["snake"]},
+        {"cmd": "frame", "screen": [0, None, (1 << 64) - 1]},
+        {"cmd": "message", "text": "Hello {SUNNY}"},
+    ]
+    for command in commands:
+        assert daemon.check(command) == {"ok": True}
+    assert [daemon.commands.get_nowait() for _ in commands] == commands
+
+
+@pytest.mark.parametrize(
+    "screen",
+    [
+        [1.5],
+        [True],
+        ["255"],
+        [-1],
+        [1 << 64],
+        [0, 0, 0, 0, 0],
+        "0000",
+        7,
+    ],
+)
+def test_bad_frames_are_refused(daemon, screen):
+    with pytest.raises(ValueError):
+        daemon.check({"cmd": "frame", "screen": screen})
+    assert daemon.commands.empty()
+
+
+@pytest.mark.parametrize(
+    "command",
+    [
+        {"cmd": "program", "names": []},
+        {"cmd": "program", "names": ["nope"]},
+        {"cmd": "program", "names": ["snake", "pong"]},
+        {"cmd": "message"},
+        {"cmd": "reboot"},
+    ],
+)
+def test_bad_commands_are_refused(daemon, command):
+    with pytest.raises(ValueError):
+        daemon.check(command)
+    assert daemon.commands.empty()
+
+
+def test_commands_do_not_wait_for_a_fetch():
+    fetching = threading.Event()
+    release = threading.Event()
+
+    def slow_fetch():
+        fetching.set()
+        release.wait(10)
+        return None
+
+    display = SimDisplay(sleep=lambda seconds: None)
+    forecast = weather_climacell.ForecastState(3600, slow_fetch)
+    daemon = Daemon(display, load_canvas(), forecast)
+    thread = threading.Thread(target=daemon.run, args=(["current_forecast"],))
+    thread.start()
+    try:
+        assert fetching.wait(5)
+        frame = [1, 2, 3, 4]
+        daemon.check({"cmd": "frame", "screen": frame})
+        deadline = time.monotonic() + 1
+        while display.shown != frame and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert display.shown == frame
+        assert forecast.lock.locked()
+    finally:
+        release.set()
+        daemon.stop()
+        thread.join(5)
+        display.close()
+
+
+def test_a_second_server_is_refused(tmp_path, daemon):
+    path = str(tmp_path / "led.sock")
+    server = CommandServer(path, daemon)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    try:
+        with pytest.raises(OSError):
+            CommandServer(path, daemon)
+        assert send({"cmd": "status"}, path)["ok"]
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join(5)
+
+
+def test_a_stale_socket_is_replaced(tmp_path, daemon):
+    path = str(tmp_path / "led.sock")
+    CommandServer(path, daemon).server_close()
+    server = CommandServer(path, daemon)
+    server.server_close()
+
+
+def test_other_files_are_left_alone(tmp_path, daemon):
+    path = tmp_path / "led.sock"
+    path.write_text("keep me")
+    with pytest.raises(OSError):
+        CommandServer(str(path), daemon)
+    assert path.read_text() == "keep me"
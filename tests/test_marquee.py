@@ -0,0 +1,49 @@
+from canvas import TiledCanvas
+from led8x8font import GLYPH_ATLAS, GLYPH_INDEX
+from marquee import iter_canvas_screens, iter_columns, iter_glyphs, iter_screens
+
+
+def naive_screen(columns, size):
+    screen = []
+    for m in range(size):
+        value = 0
+        for x in range(8):
+            for y in range(8):
+                if columns[8 * m + x] >> y & 0x01:
+                    value |= 1 << (8 * y + x)
+        screen.append(value)
+    return tuple(screen)
+
+
+def test_iter_glyphs_icons_and_unknowns():
+    glyphs = list(iter_glyphs("A{rain}é{NOPE}B"))
+    assert glyphs == [GLYPH_INDEX["A"], GLYPH_INDEX["RAIN"], GLYPH_INDEX["B"]]
+
+
+def test_iter_glyphs_unclosed_brace_is_a_character():
+    assert list(iter_glyphs("{A")) == [GLYPH_INDEX["{"], GLYPH_INDEX["A"]]
+
+
+def test_iter_columns_spacing():
+    offset, width = GLYPH_INDEX["A"]
+    columns = list(iter_columns("A", spacing=2))
+    assert columns == list(GLYPH_ATLAS[offset : offset + width]) + [0, 0]
+
+
+def test_iter_screens_matches_bit_by_bit():
+    text = "Hi {SUN}"
+    size = 2
+    columns = list(iter_columns(text))
+    window = [0] * (8 * size)
+    screens = list(iter_screens(text, size=size))
+    assert len(screens) == len(columns) + 8 * size
+    for i, screen in enumerate(screens):
+        window = window[1:] + [columns[i] if i < len(columns) else 0]
+        assert screen == naive_screen(window, size)
+    assert screens[-1] == (0,) * size
+
+
+def test_canvas_row_matches_iter_screens():
+    canvas = TiledCanvas.grid(4, 1)
+    text = "Weather 12C"
+    assert list(iter_canvas_screens(text, canvas)) == list(iter_screens(text))
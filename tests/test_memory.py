@@ -0,0 +1,86 @@
+import tracemalloc
+
+import pytest
+
+import memory
+from memory import MemoryBudget
+
+
+@pytest.fixture
+def budget():
+    was_tracing = tracemalloc.is_tracing()
+    budget = MemoryBudget()
+    budget.enable()
+    yield budget
+    if not was_tracing:
+        tracemalloc.stop()
+
+
+@pytest.fixture
+def logged(monkeypatch):
+    logged = []
+    monkeypatch.setattr(
+        memory.events, "warning", lambda message, **f: logged.append(message)
+    )
+    monkeypatch.setattr(
+        memory.events, "info", lambda message, **f: logged.append(message)
+    )
+    return logged
+
+
+def test_disabled_tracking_is_free():
+    budget = MemoryBudget()
+    assert budget.track("fetch") is memory.NO_TRACK
+    with budget.track("fetch"):
+        pass
+    assert budget.subsystems == {}
+
+
+def test_nested_tracks_keep_their_own_peaks(budget):
+    with budget.track("render"):
+        with budget.track("parse"):
+            scratch = bytearray(200000)
+            del scratch
+        kept = bytearray(50000)
+    parse_peak, parse_retained = budget.subsystems["parse"]
+    render_peak, render_retained = budget.subsystems["render"]
+    assert parse_peak >= 200000
+    assert parse_retained < 10000
+    # the inner peak counts towards the outer block too
+    assert render_peak >= parse_peak
+    assert render_retained >= 50000
+    del kept
+
+
+def test_largest_peak_is_kept(budget):
+    budget.record("fetch", 500, 10)
+    budget.record("fetch", 100, 20)
+    assert budget.subsystems["fetch"] == [500, 20]
+
+
+def test_over_budget_is_logged_once(budget, logged, monkeypatch):
+    rss = [100]
+    monkeypatch.setattr(memory, "rss_bytes", lambda: rss[0])
+    budget.budget = 1000
+    assert budget.check() == 100
+    rss[0] = 2000
+    budget.check()
+    budget.check()
+    assert logged == ["memory over budget"]
+    rss[0] = 500
+    budget.check()
+    assert logged == ["memory over budget", "memory within budget"]
+
+
+def test_quiet_runs_on_intervals(budget, logged, monkeypatch):
+    collected = []
+    frozen = []
+    checked = []
+    monkeypatch.setattr(memory.gc, "collect", lambda: collected.append(1) or 0)
+    monkeypatch.setattr(memory.gc, "freeze", lambda: frozen.append(1))
+    monkeypatch.setattr(budget, "check", lambda: checked.append(1))
+    for now in range(0, memory.COLLECT_INTERVAL + 1, 30):
+        budget.quiet(now)
+    assert len(collected) == 2
+    assert len(frozen) == 1
+    assert len(checked) == memory.COLLECT_INTERVAL // memory.CHECK_INTERVAL + 1
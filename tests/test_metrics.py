@@ -0,0 +1,97 @@
+import math
+import urllib.request
+
+import pytest
+
+import metrics
+from metrics import Registry, format_labels, format_value
+
+
+def test_format_value():
+    assert format_value(3) == "3"
+    assert format_value(2.0) == "2"
+    assert format_value(0.25) == "0.25"
+    assert format_value(math.inf) == "+Inf"
+    assert format_value(-math.inf) == "-Inf"
+
+
+def test_format_labels_escapes():
+    assert format_labels((), ()) == ""
+    assert format_labels(("a", "b"), ("x", 'say "hi" \\')) == (
+        '{a="x",b="say \\"hi\\" \\\\"}'
+    )
+    assert format_labels(("bus",), ("1",), (("le", "+Inf"),)) == (
+        '{bus="1",le="+Inf"}'
+    )
+
+
+def test_counter_and_gauge_exposition():
+    registry = Registry()
+    fetches = registry.counter("fetches_total", "Forecast fetches.", ["provider"])
+    fetches.labels(provider="noaa").inc()
+    fetches.labels(provider="climacell").inc(2)
+    fetches.labels(provider="noaa").inc()
+    up = registry.gauge("up", "Is it up.")
+    up.set(1)
+    queued = registry.gauge("queued", "Read at scrape time.")
+    queued.set_function(lambda: 7)
+    assert registry.expose() == (
+        "# HELP fetches_total Forecast fetches.\n"
+        "# TYPE fetches_total counter\n"
+        'fetches_total{provider="climacell"} 2\n'
+        'fetches_total{provider="noaa"} 2\n'
+        "# HELP queued Read at scrape time.\n"
+        "# TYPE queued gauge\n"
+        "queued 7\n"
+        "# HELP up Is it up.\n"
+        "# TYPE up gauge\n"
+        "up 1\n"
+    )
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = Registry()
+    latency = registry.histogram("render_seconds", "Render time.", buckets=(1, 0.1))
+    for value in (0.05, 0.1, 0.5, 3):
+        latency.observe(value)
+    lines = registry.expose().splitlines()
+    assert lines[2:] == [
+        'render_seconds_bucket{le="0.1"} 2',
+        'render_seconds_bucket{le="1"} 3',
+        'render_seconds_bucket{le="+Inf"} 4',
+        "render_seconds_sum 3.65",
+        "render_seconds_count 4",
+    ]
+
+
+def test_register_returns_the_same_metric():
+    registry = Registry()
+    first = registry.counter("c", "C.", ["a"])
+    assert registry.counter("c", "C.", ["a"]) is first
+    with pytest.raises(ValueError):
+        registry.gauge("c", "C.", ["a"])
+    with pytest.raises(ValueError):
+        registry.counter("c", "C.", ["b"])
+
+
+def test_dump_replaces_the_file(tmp_path):
+    registry = Registry()
+    registry.counter("c", "C.").inc()
+    path = str(tmp_path / "metrics.prom")
+    metrics.dump(path, registry)
+    with open(path) as f:
+        assert f.read() == registry.expose()
+    assert not (tmp_path / "metrics.prom.tmp").exists()
+
+
+def test_server_serves_the_registry():
+    registry = Registry()
+    registry.gauge("g", "G.").set(5)
+    server = metrics.make_server(0, registry).start()
+    try:
+        url = "http://127.0.0.1:{}/metrics".format(server.server_address[1])
+        with urllib.request.urlopen(url, timeout=5) as response:
+            assert response.read().decode("utf-8") == registry.expose()
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,60 @@
+import threading
+
+import pytest
+
+from led_sim import SimDisplay
+
+LAYOUT = [(1, 0x70), (1, 0x71), (3, 0x70), (3, 0x71)]
+
+
+@pytest.fixture
+def display():
+    display = SimDisplay(layout=LAYOUT, sleep=lambda seconds: None)
+    yield display
+    display.close()
+
+
+def test_one_worker_per_bus(display):
+    assert display.flusher is not None
+    assert sorted(t.name for t in display.flusher.threads) == ["i2c-1", "i2c-3"]
+    assert SimDisplay(layout=LAYOUT[:2]).flusher is None
+
+
+def test_buses_are_written_at_the_same_time(display):
+    # every bus write waits for one on the other bus, so the frame only
+    # completes if both buses are busy at once
+    meet = threading.Barrier(2)
+    for bus in display.buses.values():
+        bus.sleep = lambda seconds: meet.wait(timeout=5)
+    before = dict((n, bus.transactions) for n, bus in display.buses.items())
+    assert display.write_screen((1, 2, 3, 4)) == 4
+    assert [m.buffer for m in display.matrices] == [1, 2, 3, 4]
+    for number, bus in display.buses.items():
+        assert bus.transactions - before[number] == 2
+
+
+def test_single_bus_frames_skip_the_workers(display):
+    assert display.write_screen((5, 6, None, None)) == 2
+    assert display.shown[:2] == [5, 6]
+
+
+def test_errors_reach_the_caller(display):
+    def broken():
+        raise IOError("bus 3 gone")
+
+    display.matrices[2].show = broken
+    with pytest.raises(IOError):
+        display.write_screen((1, 2, 3, 4))
+    assert display.shown == [None] * 4
+
+    del display.matrices[2].show
+    assert display.write_screen((1, 2, 3, 4)) == 4
+    assert display.shown == [1, 2, 3, 4]
+
+
+def test_close_stops_the_workers():
+    display = SimDisplay(layout=LAYOUT, sleep=lambda seconds: None)
+    threads = display.flusher.threads
+    display.close()
+    assert display.flusher is None
+    assert not any(thread.is_alive() for thread in threads)
@@ -0,0 +1,76 @@
+import random
+
+import pytest
+
+import pong
+from engine import FIX_ONE, Point, to_cell
+
+HEIGHT = pong.DEFAULT_BOARD_HEIGHT
+WIDTH = pong.DEFAULT_BOARD_WIDTH
+SPAN = HEIGHT * FIX_ONE
+
+
+def step_rows(y, fvy, ticks, span):
+    """The ball's position the slow way, one step at a time like
+    Board.update_position: flip on leaving the board, rows mirrored about 0.
+    """
+    for _ in range(ticks):
+        y += fvy
+        if abs(to_cell(y)) + 1 > span // FIX_ONE:
+            fvy = -fvy
+    return y
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_bounce_matches_stepping(seed):
+    rng = random.Random(seed)
+    y = rng.randrange(-SPAN + 1, SPAN)
+    fvy = rng.choice([-1, 1]) * rng.randrange(1, 2 * FIX_ONE + 1)
+    for ticks in range(0, 200, 7):
+        closed = pong.bounce(y, fvy, ticks, SPAN)
+        stepped = step_rows(y, fvy, ticks, SPAN)
+        assert abs(to_cell(closed)) == abs(to_cell(stepped))
+
+
+def test_bounce_without_vertical_speed():
+    assert pong.bounce(3 * FIX_ONE, 0, 1000, SPAN) == 3 * FIX_ONE
+
+
+def make_board(ai, ball_point):
+    player1 = pong.Player(ord("w"), ord("s"), Point(0, HEIGHT // 2))
+    ball = pong.Ball(ball_point, rng=random.Random(0))
+    return pong.Board(player1, ai, ball)
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_predict_row_matches_flight(seed):
+    rng = random.Random(seed)
+    ai = pong.AIPlayer(1, 2, Point(WIDTH - 1, HEIGHT // 2), rng=rng)
+    x = rng.randrange(2 * FIX_ONE, (WIDTH - 2) * FIX_ONE)
+    y = rng.randrange(0, (HEIGHT - 1) * FIX_ONE)
+    fvx = rng.randrange(FIX_ONE // 4, FIX_ONE + 1)
+    fvy = rng.choice([-1, 1]) * rng.randrange(0, 2 * FIX_ONE)
+    board = make_board(ai, Point(0, 0))
+
+    predicted = ai.predict_row(board, x, y, fvx, fvy)
+
+    point = Point(0, 0, max_vx=4, max_vy=4)
+    point.x, point.y, point.fvx, point.fvy = x, y, fvx, fvy
+    while abs(to_cell(point.x)) < WIDTH - 1:
+        point.step()
+        if abs(to_cell(point.y)) + 1 > HEIGHT:
+            point.fvy = -point.fvy
+    assert predicted == min(abs(to_cell(point.y)), HEIGHT - 1)
+
+
+def test_predict_row_ignores_ball_moving_away():
+    ai = pong.AIPlayer(1, 2, Point(WIDTH - 1, HEIGHT // 2))
+    board = make_board(ai, Point(0, 0))
+    assert ai.predict_row(board, 10 * FIX_ONE, 0, -FIX_ONE, 0) is None
+
+
+def test_ai_moves_towards_prediction():
+    ai = pong.AIPlayer(1, 2, Point(WIDTH - 1, 1), skill=1.0, reaction_ticks=0)
+    board = make_board(ai, Point(WIDTH - 4, HEIGHT - 2, 1, 0))
+    ai.think(board)
+    assert ai.point.fvy > 0
@@ -0,0 +1,53 @@
+import json
+import os
+import tracemalloc
+
+from profiling import NO_SPAN, Profiler
+
+
+def session_files(directory):
+    return sorted(os.path.splitext(name)[1] for name in os.listdir(directory))
+
+
+def test_spans_only_record_during_a_session(tmp_path):
+    profiler = Profiler("test", str(tmp_path))
+    assert profiler.span("idle") is NO_SPAN
+    profiler.toggle()
+    profiler.poll()
+    for _ in range(3):
+        with profiler.span("step"):
+            sum(range(1000))
+    profiler.toggle()
+    profiler.poll()
+    assert not profiler.active
+    assert profiler.spans["step"][0] == 3
+
+
+def test_session_is_written_when_stopped(tmp_path):
+    profiler = Profiler("test", str(tmp_path))
+    profiler.start()
+    with profiler.span("step"):
+        sum(range(1000))
+    profiler.stop().join()
+    assert session_files(str(tmp_path)) == [".json", ".prof", ".tracemalloc"]
+
+
+def test_finish_writes_a_running_session(tmp_path):
+    profiler = Profiler("test", str(tmp_path))
+    profiler.toggle()
+    profiler.poll()
+    with profiler.span("step"):
+        sum(range(1000))
+    profiler.finish()
+    assert not profiler.active
+    assert not tracemalloc.is_tracing()
+    assert session_files(str(tmp_path)) == [".json", ".prof", ".tracemalloc"]
+    spans = [name for name in os.listdir(str(tmp_path)) if name.endswith(".json")]
+    with open(os.path.join(str(tmp_path), spans[0])) as f:
+        assert json.load(f)["step"]["count"] == 1
+
+
+def test_finish_without_a_session_does_nothing(tmp_path):
+    profiler = Profiler("test", str(tmp_path / "never"))
+    profiler.finish()
+    assert not os.path.exists(str(tmp_path / "never"))
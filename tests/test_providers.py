@@ -0,0 +1,63 @@
+import json
+
+import pytest
+
+import weather_forecastio
+import weather_metoffice
+import weather_openweather
+from led8x8icons import LED8x8ICONS
+
+
+def metoffice_response(codes):
+    periods = [{"Rep": [{"W": code}, {"W": "NA"}]} for code in codes]
+    return json.dumps({"SiteRep": {"DV": {"Location": {"Period": periods}}}})
+
+
+def forecastio_response(icons):
+    return json.dumps({"daily": {"data": [{"icon": icon} for icon in icons]}})
+
+
+def openweather_response(mains):
+    # three-hourly, eight entries a day
+    entries = []
+    for main in mains:
+        entries += [{"weather": [{"main": main}]}] * 8
+    return json.dumps({"list": entries})
+
+
+CASES = [
+    (weather_metoffice, metoffice_response, [1, 3, 12, 30, 7], [1, 3, 12, 30]),
+    (
+        weather_forecastio,
+        forecastio_response,
+        ["clear-day", "rain", "snow", "wind"],
+        ["clear-day", "rain", "snow", "wind"],
+    ),
+    (
+        weather_openweather,
+        openweather_response,
+        ["Clear", "Rain", "Snow", "Clouds"],
+        ["Clear", "Rain", "Snow", "Clouds"],
+    ),
+]
+
+
+@pytest.mark.parametrize("module, response, days, expected", CASES)
+def test_parse_and_render(module, response, days, expected):
+    forecast = module.parse_forecast(response(days))
+    assert forecast[:4] == expected
+    screen = module.render_forecast(forecast)
+    assert len(screen) == 4
+    assert all(value in LED8x8ICONS.values() for value in screen)
+
+
+@pytest.mark.parametrize("module, response, days, expected", CASES)
+def test_short_forecast_raises_value_error(module, response, days, expected):
+    with pytest.raises(ValueError):
+        module.parse_forecast(response(days[:3]))
+
+
+@pytest.mark.parametrize("module", [m for m, _, _, _ in CASES])
+def test_render_pads_missing_days(module):
+    screen = module.render_forecast([], size=4)
+    assert screen == (LED8x8ICONS["UNKNOWN"],) * 4
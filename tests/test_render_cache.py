@@ -0,0 +1,80 @@
+from weather_climacell import (
+    PROGRAMS,
+    Forecast,
+    Prediction,
+    Program,
+    RenderCache,
+)
+
+
+class FakeClock(object):
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+
+class FakeForecastState(object):
+    def __init__(self, forecast=None):
+        self.forecast = forecast
+        self.version = 0
+
+    def get_forecast(self):
+        return self.forecast
+
+
+def counting_programs():
+    calls = []
+
+    def render(name):
+        def fn(forecast, now):
+            calls.append(name)
+            return (len(calls), 0, 0, 0)
+
+        return fn
+
+    programs = {
+        "forecast": Program(render("forecast"), False),
+        "clock": Program(render("clock"), True),
+    }
+    return programs, calls
+
+
+def test_forecast_programs_render_once_per_version():
+    programs, calls = counting_programs()
+    clock = FakeClock()
+    state = FakeForecastState()
+    cache = RenderCache(programs, clock)
+    first = cache.get_screen("forecast", state)
+    clock.now += 3600
+    assert cache.get_screen("forecast", state) is first
+    state.version += 1
+    assert cache.get_screen("forecast", state) != first
+    assert calls == ["forecast", "forecast"]
+
+
+def test_clock_programs_render_once_per_minute():
+    programs, calls = counting_programs()
+    clock = FakeClock(60 * 1000)
+    state = FakeForecastState()
+    cache = RenderCache(programs, clock)
+    for seconds in range(0, 120, 5):
+        clock.now = 60 * 1000 + seconds
+        state.version += 1
+        cache.get_screen("clock", state)
+    assert calls == ["clock", "clock"]
+
+
+def test_real_programs_render_a_forecast():
+    forecast = Forecast(
+        predictions=[Prediction(temp=21, condition_icon="SUNNY", moon_icon="FULL")]
+        * 8
+    )
+    state = FakeForecastState(forecast)
+    state.version = 1
+    cache = RenderCache(clock=FakeClock(1609459200.0))
+    for name in PROGRAMS:
+        screen = cache.get_screen(name, state)
+        assert screen is not None and len(screen) == 4
+    assert cache.get_screen("current_forecast", FakeForecastState()) is None
@@ -0,0 +1,64 @@
+import pytest
+
+import replay
+import weather_noaa
+
+CONFIGS = {
+    "climacell": ("key", 47.6, -122.3),
+    "noaa": 98109,
+    "metoffice": ("key", "3772"),
+    "forecastio": ("key", 47.6, -122.3),
+    "openweather": ("key", 47.6, -122.3),
+}
+
+
+@pytest.fixture
+def server():
+    responses = dict(
+        (name, replay.synthesize(name, 1, seed=3)) for name in replay.PROVIDERS
+    )
+    server = replay.ReplayServer(responses=responses).start()
+    yield server
+    server.stop()
+
+
+@pytest.mark.parametrize("name", sorted(replay.PROVIDERS))
+def test_fetch_matches_parsing_the_response(server, name):
+    if name == "climacell":
+        # the only provider fetching through requests
+        pytest.importorskip("requests")
+    provider = replay.PROVIDERS[name]
+    expected = provider.parse(replay.synthesize(name, 1, seed=3))
+    assert server.fetch(name, CONFIGS[name]) == expected
+    assert server.requests[name] == 1
+
+
+def test_failure_injection(server):
+    server.status = 500
+    assert server.fetch("noaa", CONFIGS["noaa"]) is None
+    with pytest.raises(ValueError):
+        server.fetch("openweather", CONFIGS["openweather"])
+
+
+def test_synthesize_is_seeded():
+    for name in replay.PROVIDERS:
+        assert replay.synthesize(name, 2, seed=1) == replay.synthesize(name, 2, seed=1)
+
+
+class FailingConnection(object):
+    closed = 0
+
+    def __init__(self, host, timeout=None):
+        pass
+
+    def request(self, *args, **kwargs):
+        raise OSError("connection refused")
+
+    def close(self):
+        FailingConnection.closed += 1
+
+
+def test_noaa_request_closes_the_connection_on_failure(monkeypatch):
+    monkeypatch.setattr(weather_noaa.http.client, "HTTPConnection", FailingConnection)
+    assert weather_noaa.make_noaa_request(98109, "localhost", https=False) is None
+    assert FailingConnection.closed == 1
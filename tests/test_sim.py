@@ -0,0 +1,36 @@
+import curses
+import json
+
+import pytest
+
+import sim
+
+
+@pytest.mark.parametrize("name", sorted(sim.GAMES))
+def test_same_seed_same_board(name):
+    first = sim.board_checksum(sim.run(name, 3, 2000, {}))
+    second = sim.board_checksum(sim.run(name, 3, 2000, {}))
+    assert first == second
+
+
+def test_trace_changes_the_run():
+    trace = {5: [curses.KEY_UP], 9: [curses.KEY_LEFT]}
+    plain = sim.board_checksum(sim.run("snake", 0, 50, {}))
+    steered = sim.board_checksum(sim.run("snake", 0, 50, trace))
+    assert plain != steered
+    again = sim.board_checksum(sim.run("snake", 0, 50, trace))
+    assert steered == again
+
+
+def test_load_trace(tmp_path):
+    path = tmp_path / "trace.json"
+    path.write_text(json.dumps([[3, 259], ["3", 260], [7, 258]]))
+    trace = sim.load_trace(str(path))
+    assert trace == {3: [259, 260], 7: [258]}
+    assert sim.load_trace(None) == {}
+
+
+def test_benchmark_reports_steps():
+    result = sim.benchmark("pong", seed=1, steps=200)
+    assert result["steps"] == 200
+    assert result["checksum"] == sim.board_checksum(sim.run("pong", 1, 200, {}))
@@ -0,0 +1,66 @@
+import random
+
+from bitboard import FreeCells
+from snake import Board, Nutrient, Point, Snake
+
+
+def test_free_cells_tracks_membership():
+    free = FreeCells(10, occupied=0b1010)
+    assert len(free) == 8
+    assert 1 not in free and 3 not in free
+    free.remove(5)
+    free.remove(5)
+    free.add(1)
+    free.add(1)
+    assert len(free) == 8
+    assert sorted(free.cells[: len(free)]) == [0, 1, 2, 4, 6, 7, 8, 9]
+    for cell in range(10):
+        assert free.cells[free.slots[cell]] == cell
+
+
+def test_free_cells_choice():
+    rng = random.Random(1)
+    free = FreeCells(4, occupied=0b0111)
+    assert [free.choice(rng) for _ in range(5)] == [3] * 5
+    free.remove(3)
+    assert free.choice(rng) is None
+
+
+def make_board(x=2, y=3, vx=1, vy=0):
+    snake = Snake(Point(x, y, vx, vy))
+    return Board(snake, nutrient=Nutrient(0, 0), rng=random.Random(0))
+
+
+def test_step_moves_and_reports_vacated():
+    board = make_board()
+    snake = board.snake
+    snake.grow()
+    assert snake.step() == (None, snake.cell(3, 3), False)
+    assert snake.step() == (snake.cell(2, 3), snake.cell(4, 3), False)
+    assert list(snake.body) == [snake.cell(4, 3), snake.cell(3, 3)]
+    assert snake.occupied == 1 << snake.cell(4, 3) | 1 << snake.cell(3, 3)
+
+
+def test_step_off_board():
+    snake = Snake(Point(31, 0, 1, 0))
+    vacated, head, collided = snake.step()
+    assert head is None and not collided
+
+
+def test_board_keeps_free_cells_and_bits_in_sync():
+    board = make_board()
+    rng = random.Random(4)
+    keys = [board.snake.upkey, board.snake.downkey,
+            board.snake.leftkey, board.snake.rightkey]
+    for _ in range(500):
+        board.snake.handle_key(rng.choice(keys))
+        board.update_position(board.snake)
+        snake = board.snake
+        assert len(set(snake.body)) == len(snake.body)
+        for cell in range(board.width * board.height):
+            taken = bool(snake.occupied >> cell & 0x01)
+            assert (cell in board.free) != taken
+            x, y = cell % board.width, cell // board.width
+            assert not (taken and board.is_nutrient(x, y))
+            lit = taken or board.is_nutrient(x, y)
+            assert board.bits.get(x, y) == lit
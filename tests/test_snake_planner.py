@@ -0,0 +1,59 @@
+import random
+import sys
+
+import pytest
+
+import snake
+
+
+def make_game(seed):
+    piece = snake.Snake(snake.Point(0, snake.DEFAULT_BOARD_HEIGHT // 2, 1, 0))
+    board = snake.Board(piece, max_resets=sys.maxsize, rng=random.Random(seed))
+    return snake.Game(board, attract=True)
+
+
+def play(game, ticks):
+    """Let the planner play, returns the snake length after every tick."""
+    piece = game.board.snake
+    lengths = []
+    for _ in range(ticks):
+        key = game.planner.choose_key()
+        if key is not None:
+            piece.handle_key(key)
+        game.tick()
+        lengths.append(len(piece))
+    return lengths
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_planner_does_not_crash(seed):
+    game = make_game(seed)
+    play(game, 3000)
+    assert game.board.num_resets == 0
+    assert game.planner.over_budget == 0
+    assert len(game.board.snake) > 20
+
+
+def test_runs_are_reproducible():
+    assert play(make_game(5), 1000) == play(make_game(5), 1000)
+
+
+def test_running_out_of_budget_is_counted():
+    game = make_game(0)
+    game.planner.budget = 2
+    game.planner.choose_direction()
+    assert game.planner.over_budget == 1
+
+
+def test_unfinished_safety_check_is_unsafe():
+    game = make_game(0)
+    planner = game.planner
+    piece = game.board.snake
+    piece.grow()
+    play(game, 2)
+    tail = 1 << piece.body[-1]
+    cell = planner.candidates()[0][1]
+    planner.steps_left = planner.budget
+    assert planner.is_safe(cell, piece.occupied, tail)
+    planner.steps_left = 0
+    assert not planner.is_safe(cell, piece.occupied, tail)
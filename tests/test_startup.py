@@ -0,0 +1,53 @@
+import json
+
+import startup
+
+
+def test_process_start_is_in_the_past():
+    seconds = startup.seconds_since_process_start()
+    if seconds is not None:
+        assert seconds >= 0
+
+
+def test_timeline_marks_in_order(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(startup, "seconds_since_process_start", lambda: 0.25)
+    monkeypatch.setattr(startup.time, "monotonic", lambda: now[0])
+    timeline = startup.StartupTimeline(budget=1.0)
+    now[0] = 100.5
+    timeline.mark("imports")
+    now[0] = 101.0
+    timeline.mark("first frame")
+    assert timeline.as_dict() == {"imports": 0.75, "first frame": 1.25}
+    assert timeline.get("missing") is None
+    assert timeline.over_budget()
+    assert not timeline.over_budget("imports")
+    assert "imports 0.750s (+0.750s)" in str(timeline)
+    assert "first frame 1.250s (+0.500s)" in str(timeline)
+
+
+def test_unknown_process_start_counts_from_creation(monkeypatch):
+    monkeypatch.setattr(startup, "seconds_since_process_start", lambda: None)
+    assert startup.StartupTimeline().offset == 0.0
+
+
+def test_report_line_round_trips(capsys):
+    timeline = startup.StartupTimeline(budget=1000.0)
+    timeline.mark("first frame")
+    timeline.report()
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[0].startswith(startup.REPORT_PREFIX)
+    assert json.loads(lines[0][len(startup.REPORT_PREFIX) :]) == timeline.as_dict()
+    assert len(lines) == 2
+
+
+def test_benchmark_takes_the_median(tmp_path):
+    program = tmp_path / "program.py"
+    program.write_text(
+        "import os, json\n"
+        "path = os.path.join(os.path.dirname(__file__), 'count')\n"
+        "n = int(open(path).read()) if os.path.exists(path) else 0\n"
+        "open(path, 'w').write(str(n + 1))\n"
+        "print('startup ' + json.dumps({'first frame': [0.3, 0.1, 0.2][n]}))\n"
+    )
+    assert startup.benchmark([str(program)], runs=3) == {"first frame": 0.2}
@@ -0,0 +1,56 @@
+import pytest
+
+from led_disp import iter_scroll_screens
+from led_sim import SimDisplay
+
+
+@pytest.fixture
+def display():
+    display = SimDisplay(sleep=lambda seconds: None)
+    yield display
+    display.close()
+
+
+def buffers(display):
+    return tuple(matrix.buffer for matrix in display.matrices)
+
+
+@pytest.mark.parametrize("scroll", [True, False])
+def test_only_changed_matrices_are_redrawn(display, scroll):
+    assert display.update_screen((1, 2, 3, 4), scroll) == 4
+    written = display.transactions()
+    assert display.update_screen((1, 2, 3, 4), scroll) == 0
+    assert display.transactions() == written
+    assert display.update_screen((1, 9, None, 4), scroll) == 1
+    assert buffers(display) == (1, 9, 3, 4)
+    assert display.shown == [1, 9, 3, 4]
+
+
+def test_a_write_sends_each_changed_matrix_once(display):
+    display.update_screen((0, 0, 0, 0), scroll=False)
+    before = display.transactions()
+    display.update_screen((5, 0, 6, 0), scroll=False)
+    assert display.transactions() - before == 2
+
+
+def test_unknown_contents_are_redrawn(display):
+    display.update_screen((1, 2, 3, 4), scroll=False)
+    display.set_pixel(0, 0, matrix=2)
+    assert display.shown[2] is None
+    assert display.update_screen((1, 2, 3, 4), scroll=False) == 1
+    assert buffers(display) == (1, 2, 3, 4)
+
+
+def test_scroll_screens_end_on_the_new_screen():
+    shown = (0x11, 0x22, 0x33, 0x44)
+    screen = (0x11, 0xFFFF00000000FFFF, None, 0x8000000000000001)
+    current = list(shown)
+    frames = list(iter_scroll_screens(shown, screen))
+    # eight rows for each of the two matrices that change
+    assert len(frames) == 16
+    for frame in frames:
+        assert [i for i, value in enumerate(frame) if value is not None] in ([1], [3])
+        for i, value in enumerate(frame):
+            if value is not None:
+                current[i] = value
+    assert current == [0x11, 0xFFFF00000000FFFF, 0x33, 0x8000000000000001]
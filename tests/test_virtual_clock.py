@@ -0,0 +1,65 @@
+import threading
+
+import pytest
+
+import virtual_clock
+from virtual_clock import DEFAULT_START, StubProvider, VirtualClock
+
+
+def test_virtual_clock_only_moves_on_sleep():
+    clock = VirtualClock()
+    assert clock.time() == DEFAULT_START
+    assert clock.monotonic() == 0.0
+    clock.sleep(1.5)
+    clock.sleep(-3)
+    assert clock.monotonic() == 1.5
+    assert clock.time() == DEFAULT_START + 1.5
+    assert clock.sleeps == 2
+    assert clock.now().timestamp() == pytest.approx(clock.time())
+
+
+def test_sleeps_from_threads_add_up():
+    clock = VirtualClock()
+    threads = [
+        threading.Thread(target=lambda: [clock.sleep(0.5) for _ in range(100)])
+        for _ in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert clock.monotonic() == 200.0
+    assert clock.sleeps == 400
+
+
+def test_stub_provider_fails_at_the_given_rate():
+    provider = StubProvider(failure_rate=0.5, seed=1)
+    results = []
+    for _ in range(200):
+        try:
+            results.append(provider())
+        except IOError:
+            pass
+    assert provider.calls == 200
+    assert provider.failures == 200 - len(results)
+    assert 60 < provider.failures < 140
+    assert all(results)
+
+
+def test_fast_forward_is_repeatable():
+    first = virtual_clock.fast_forward(["current_forecast"], hours=3)
+    second = virtual_clock.fast_forward(["current_forecast"], hours=3)
+    first.pop("wall_seconds")
+    second.pop("wall_seconds")
+    assert first == second
+    assert first["virtual_hours"] >= 3
+    assert first["api_calls"] >= 3
+    assert first["frames"] > 0
+
+
+def test_fast_forward_survives_provider_failures():
+    result = virtual_clock.fast_forward(
+        ["current_forecast"], hours=3, failure_rate=0.5, seed=2
+    )
+    assert result["api_failures"] > 0
+    assert result["virtual_hours"] >= 3
@@ -0,0 +1,189 @@
+#!/usr/bin/env python
+# ===============================================================================
+# virtual_clock.py
+#
+# Clocks for the main loops: the system clock, and a virtual clock for
+# running them fast-forward.
+#
+# A clock has time() (seconds since the epoch), now() (a datetime),
+# monotonic() and sleep(). Sleeping on a virtual clock returns at once and
+# moves its time on, so the weather_climacell.py loop can be run against a
+# simulated display and a stub provider for a day of virtual time in
+# seconds. Running this file does that and reports the API calls made,
+# frames drawn and bytes sent over the bus:
+#
+#   python virtual_clock.py --hours 24 current_forecast 8_hr_forecast
+#   python virtual_clock.py --hours 24 --failure-rate 0.3 clock
+#   python virtual_clock.py --hours 168 --memory
+# ===============================================================================
+import argparse
+import json
+import math
+import random
+import threading
+import time
+from datetime import datetime
+
+# 2021-01-01 00:00:00 UTC
+DEFAULT_START = 1609459200.0
+
+
+class SystemClock(object):
+    def time(self):
+        return time.time()
+
+    def now(self):
+        return datetime.now()
+
+    def monotonic(self):
+        return time.monotonic()
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+
+SYSTEM_CLOCK = SystemClock()
+
+
+class VirtualClock(object):
+    """Clock whose time only moves when something sleeps on it. Sleeps from
+    several threads add up rather than overlap, so parallel bus writes count
+    as if they were sequential.
+    """
+
+    def __init__(self, start=DEFAULT_START):
+        self.start = start
+        self.elapsed = 0.0
+        self.sleeps = 0
+        self.lock = threading.Lock()
+
+    def time(self):
+        return self.start + self.elapsed
+
+    def now(self):
+        return datetime.fromtimestamp(self.time())
+
+    def monotonic(self):
+        return self.elapsed
+
+    def sleep(self, seconds):
+        with self.lock:
+            self.elapsed += max(seconds, 0)
+            self.sleeps += 1
+
+
+class StubProvider(object):
+    """Fetch function standing in for ClimaCell, returning forecasts parsed
+    from made up responses (see replay.py). Fails at random, failure_rate of
+    the time, to exercise the backoff.
+    """
+
+    def __init__(self, failure_rate=0.0, seed=0):
+        import replay
+
+        self.failure_rate = failure_rate
+        self.rng = random.Random(seed)
+        self.synthesize = lambda: replay.synthesize("climacell", 1, self.calls)
+        self.parse = replay.PROVIDERS["climacell"].parse
+        self.calls = 0
+        self.failures = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.rng.random() < self.failure_rate:
+            self.failures += 1
+            raise IOError("stub provider failure")
+        return self.parse(self.synthesize())
+
+
+def fast_forward(
+    programs, hours=24, failure_rate=0.0, seed=0, timeout=60 * 60, track_memory=False
+):
+    """Run the weather_climacell.py loop for hours of virtual time on a
+    simulated display. Returns a dict of what it did, with the traced memory
+    at every virtual hour when track_memory is set.
+    """
+    import events
+    import memory
+    import tracemalloc
+    import weather_climacell
+    from led_sim import SimDisplay
+
+    clock = VirtualClock()
+    provider = StubProvider(failure_rate, seed)
+    display = SimDisplay(sleep=clock.sleep, monotonic=clock.monotonic)
+    forecast = weather_climacell.ForecastState(timeout, provider, clock)
+    cache = weather_climacell.RenderCache(clock=clock)
+    if track_memory:
+        memory.enable()
+    traced = []
+    started = time.perf_counter()
+    try:
+        for hour in range(int(math.ceil(hours))):
+            weather_climacell.run(
+                display,
+                programs,
+                forecast,
+                cache,
+                clock,
+                until=clock.start + min(hour + 1, hours) * 3600,
+            )
+            if track_memory:
+                traced.append(tracemalloc.get_traced_memory()[0])
+    finally:
+        display.close()
+    result = {
+        "programs": programs,
+        "virtual_hours": clock.monotonic() / 3600,
+        "wall_seconds": round(time.perf_counter() - started, 3),
+        "api_calls": provider.calls,
+        "api_failures": provider.failures,
+        "forecast_versions": forecast.version,
+        "frames": display.frames,
+        "matrix_redraws": display.redraws,
+        "bus_transactions": display.transactions(),
+        "bus_bytes": display.bytes_written(),
+    }
+    if track_memory:
+        # skip the first hour, it includes warming up every cache
+        steady = traced[1:] or traced
+        result["memory"] = memory.MEMORY.report()
+        # the event ring buffer grows until it is full, ten days or so in
+        result["memory"]["events_kept"] = len(events.LOG.ring)
+        result["memory"]["traced_hourly"] = {
+            "first": steady[0],
+            "last": steady[-1],
+            "min": min(steady),
+            "max": max(steady),
+        }
+    return result
+
+
+# -------------------------------------------------------------------------------
+#  M A I N
+# -------------------------------------------------------------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Run the forecast loop in virtual time on a simulated display"
+    )
+    parser.add_argument("programs", nargs="*", default=["current_forecast"])
+    parser.add_argument("--hours", type=float, default=24)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--memory", action="store_true", help="track memory and report its trend"
+    )
+    args = parser.parse_args()
+
+    print(
+        json.dumps(
+            fast_forward(
+                args.programs,
+                args.hours,
+                args.failure_rate,
+                args.seed,
+                track_memory=args.memory,
+            ),
+            indent=2,
+        )
+    )
@@ -6,8 +6,7 @@
 #   * https://developer.climacell.co/v3/reference#get-hourly
 #   * Setup an API config according to the readme
 # ===============================================================================
-import requests
-import traceback
+import threading
 import time
 import random
 import sys
@@ -15,12 +14,45 @@ import json
 from collections import namedtuple
 from datetime import datetime, tzinfo, timedelta
 
-from led_disp import LEDDisplay, reset_display
-from clock import display_clock
+import events
+import memory
+import metrics
+import profiling
+from led_disp import LEDDisplay, show_banner
+from clock import render_clock, seconds_to_next_minute
 from led8x8icons import LED8x8ICONS
-
+from startup import StartupTimeline
+from virtual_clock import SYSTEM_CLOCK
+
+
+FETCH_TIME = metrics.histogram(
+    "forecast_fetch_seconds", "Time taken by forecast fetches.", ["provider"]
+)
+FETCHES = metrics.counter(
+    "forecast_fetches_total", "Forecast fetches by outcome.", ["provider", "outcome"]
+)
+BACKOFF = metrics.gauge(
+    "forecast_backoff_seconds", "Wait before retrying a failed fetch.", ["provider"]
+)
+FORECAST_AGE = metrics.gauge(
+    "forecast_age_seconds", "Age of the forecast shown, -1 if none.", ["provider"]
+)
+RENDER_TIME = metrics.histogram(
+    "render_seconds", "Time taken to render a program's screen.", ["program"]
+)
+STEP_TIME = metrics.histogram(
+    "step_seconds", "Time taken to refresh, render and draw a step.", ["program"]
+)
+OVERRUNS = metrics.counter(
+    "loop_overruns_total", "Steps whose work outlasted their interval.", ["loop"]
+)
 
 url = "https://api.tomorrow.io/v4/timelines"
+# seconds each program's screen stays up before the next one
+PROGRAM_SECONDS = 2
+METRICS_FILE = "/tmp/weather_climacell.prom"
+# seconds to wait for the forecast server before giving up on a fetch
+REQUEST_TIMEOUT = 10
 icons = ["SUNNY", "RAIN", "CLOUD", "SHOWERS", "SNOW", "STORM"]
 synonym_map = {
     "SUNNY": [
@@ -120,10 +152,17 @@ class simple_utc(tzinfo):
         return timedelta(0)
 
 
-def make_climacell_request(apikey, lat, lon):
+def make_climacell_request(apikey, lat, lon, base_url=None):
+    """Make request to ClimaCell, or base_url in place of url, and return the
+    raw response body.
+    """
+    # requests (and urllib3, charset detection...) is slow to import on a Pi
+    # Zero, so it is only loaded once the first frame is up
+    import requests
+
     r = requests.request(
         "GET",
-        url,
+        base_url or url,
         params={
             "location": "{},{}".format(lat, lon),
             "apikey": apikey,
@@ -135,8 +174,9 @@ def make_climacell_request(apikey, lat, lon):
             "timesteps": ["1h", "1d"],
             "fields": ["temperatureApparent", "weatherCode", "moonPhase"],
         },
+        timeout=REQUEST_TIMEOUT,
     )
-    return r.json()
+    return r.content
 
 
 def normalize_condition_icon(condition):
@@ -147,7 +187,7 @@ def normalize_condition_icon(condition):
         for synonym in synonyms:
             if synonym in condition:
                 return icon
-    print("Missing icon for daily forecast", condition)
+    events.warning("missing icon", condition=condition)
     return "UNKNOWN"
 
 
@@ -174,11 +214,12 @@ def make_prediction(resp_prediction):
     )
 
 
-def get_climacell_forecast(apikey, lat, lon):
-    response = make_climacell_request(apikey, lat, lon)
+def parse_climacell_forecast(data):
+    """Return a Forecast from a raw response body, None if it has none."""
+    response = json.loads(data)
     resp = response.get("data", {}).get("timelines", [])
     if not isinstance(resp, list) or len(resp) == 0:
-        print("unexpected response {}".format(response))
+        events.error("unexpected response", response=str(response)[:500])
         return None
     for d in resp:
         if d.get("timestep", "") == "1h":
@@ -186,10 +227,16 @@ def get_climacell_forecast(apikey, lat, lon):
             predictions = list(map(make_prediction, intervals))
             # restrict this to just the next 8 hours
             return Forecast(predictions=predictions[:8])
-    print("unexpected response {}".format(response))
+    events.error("unexpected response", response=str(response)[:500])
     return None
 
 
+def get_climacell_forecast(apikey, lat, lon):
+    data = make_climacell_request(apikey, lat, lon)
+    with memory.track("parse"):
+        return parse_climacell_forecast(data)
+
+
 def print_forecast(forecast=None):
     """Print forecast to screen."""
     print("-" * 20)
@@ -202,83 +249,200 @@ def print_forecast(forecast=None):
             print(p)
 
 
-def display_hi_low(display, forecast=None, show_hi=True):
-    """Display forecast as icons on LED 8x8 matrices."""
+def render_temp(screen, temp):
+    """Render a temperature, right aligned, onto the last matrices of screen."""
+    temp = str(temp).zfill(2)
+    offset = 1 if len(temp) == 3 else 2
+    for i, d in enumerate(temp):
+        screen[i + offset] = LED8x8ICONS["{0}".format(d)]
+
+
+def render_hi_low(forecast=None, show_hi=True):
+    """Render forecast hi or low temperature as a screen of icons."""
     if forecast is None or not len(forecast.predictions):
-        return False
+        return None
 
     prediction = forecast.predictions[0]
-    display.scroll_raw64(LED8x8ICONS[prediction[0].condition_icon], 0)
-
     icon = "UP_ARROW" if show_hi else "DOWN_ARROW"
-    display.scroll_raw64(LED8x8ICONS[icon], 1)
+    screen = [LED8x8ICONS[prediction.condition_icon], LED8x8ICONS[icon], None, None]
 
     fn = max if show_hi else min
-    temp = str(fn(forecast.predictions, key=lambda x: x.temp).temp).zfill(2)
-    offset = 1 if len(temp) == 3 else 2
-    for i, d in enumerate(temp):
-        display.scroll_raw64(LED8x8ICONS["{0}".format(d)], i + offset)
-    return True
+    render_temp(screen, fn(forecast.predictions, key=lambda x: x.temp).temp)
+    return tuple(screen)
 
 
-def display_current_forecast(display, forecast=None):
-    """Display forecast as icons on LED 8x8 matrices."""
+def render_current_forecast(forecast=None):
+    """Render current moon phase, condition and temperature as a screen of icons."""
     if forecast is None or not len(forecast.predictions):
-        return False
+        return None
     prediction = forecast.predictions[0]
 
-    display.scroll_raw64(LED8x8ICONS[prediction.moon_icon], 0)
-    display.scroll_raw64(LED8x8ICONS[prediction.condition_icon], 1)
+    screen = [
+        LED8x8ICONS[prediction.moon_icon],
+        LED8x8ICONS[prediction.condition_icon],
+        None,
+        None,
+    ]
+    render_temp(screen, prediction.temp)
+    return tuple(screen)
 
-    temp = str(prediction.temp).zfill(2)
-    offset = 1 if len(temp) == 3 else 2
-    for i, d in enumerate(temp):
-        display.scroll_raw64(LED8x8ICONS["{0}".format(d)], i + offset)
-    return True
 
-
-def display_8_hr_forecast(display, forecast=None):
-    """Display forecast as icons on LED 8x8 matrices."""
-    if forecast is None:
-        return False
+def render_8_hr_forecast(forecast=None):
+    """Render the condition every couple of hours as a screen of icons."""
+    if forecast is None or not len(forecast.predictions):
+        return None
 
     max_i = 4
-    offset = len(forecast.predictions) // max_i
+    screen = [LED8x8ICONS["ALL_OFF"]] * max_i
+    offset = max(1, len(forecast.predictions) // max_i)
     for i, pidx in enumerate(range(0, len(forecast.predictions), offset)):
         if i >= max_i:
             break
         condition_icon = forecast.predictions[pidx].condition_icon
-        display.scroll_raw64(LED8x8ICONS[condition_icon], i)
+        screen[i] = LED8x8ICONS[condition_icon]
+    return tuple(screen)
+
+
+def display_screen(display, screen):
+    if screen is None:
+        return False
+    display.scroll_screen(screen)
     return True
 
 
+def display_hi_low(display, forecast=None, show_hi=True):
+    """Display forecast as icons on LED 8x8 matrices."""
+    return display_screen(display, render_hi_low(forecast, show_hi))
+
+
+def display_current_forecast(display, forecast=None):
+    """Display forecast as icons on LED 8x8 matrices."""
+    return display_screen(display, render_current_forecast(forecast))
+
+
+def display_8_hr_forecast(display, forecast=None):
+    """Display forecast as icons on LED 8x8 matrices."""
+    return display_screen(display, render_8_hr_forecast(forecast))
+
+
+# render: fn(forecast, now) -> screen or None, now in seconds since the epoch
+# uses_clock: the screen changes every minute, independent of the forecast
+Program = namedtuple("Program", ["render", "uses_clock"])
+
+PROGRAMS = {
+    "clock": Program(lambda f, now: render_clock(now=now), True),  # 24h default
+    "clock_12": Program(lambda f, now: render_clock(False, now=now), True),
+    "clock_24": Program(lambda f, now: render_clock(True, now=now), True),
+    "hi_forecast": Program(lambda f, now: render_hi_low(f, show_hi=False), False),
+    "low_forecast": Program(lambda f, now: render_hi_low(f), False),
+    # moon phase || current condition || temp
+    "current_forecast": Program(lambda f, now: render_current_forecast(f), False),
+    "8_hr_forecast": Program(lambda f, now: render_8_hr_forecast(f), False),
+}
+
+
+class RenderCache:
+    """Keeps the last screen rendered by each program, keyed by the forecast
+    version and, for programs showing the time, the current minute. A program
+    is only re-rendered when its key changes.
+    """
+
+    def __init__(self, programs=PROGRAMS, clock=SYSTEM_CLOCK):
+        self.programs = programs
+        self.clock = clock
+        self.entries = {}
+
+    def get_screen(self, name, forecast_state):
+        program = self.programs[name]
+        now = self.clock.time()
+        if program.uses_clock:
+            key = int(now // 60)
+        else:
+            key = forecast_state.version
+        entry = self.entries.get(name)
+        if entry is not None and entry[0] == key:
+            return entry[1]
+        with RENDER_TIME.labels(program=name).time(), memory.track("render"):
+            screen = program.render(forecast_state.get_forecast(), now)
+        self.entries[name] = (key, screen)
+        return screen
+
+
 class ForecastState:
-    def __init__(self, timeout):
+    def __init__(self, timeout, fetch=None, clock=SYSTEM_CLOCK, provider="climacell"):
+        """fetch() returns a new Forecast or None, by default from ClimaCell
+        with the apikey, lat and lon read from the config in main. provider
+        labels the fetch metrics.
+        """
+        self.fetch = fetch
+        self.clock = clock
+        self.provider = provider
+        self.fetch_seconds = FETCH_TIME.labels(provider=provider)
+        self.fetches = dict(
+            (outcome, FETCHES.labels(provider=provider, outcome=outcome))
+            for outcome in ("ok", "empty", "error")
+        )
+        self.backoff = BACKOFF.labels(provider=provider)
+        FORECAST_AGE.labels(provider=provider).set_function(self.age)
+        # held while fetching, so a background fetch and the main loop never
+        # fetch at the same time
+        self.lock = threading.Lock()
         self.forecast = None
         self.last_fetched = datetime.min
         self.last_updated = datetime.min
         self.timeout_sec = timeout
         self.backoff_sec = 0
+        # bumped on every successful fetch, used to key cached screens
+        self.version = 0
 
     def maybe_refresh(self):
+        """Fetch a new forecast if it is due, unless a fetch is already running."""
+        if not self.lock.acquire(False):
+            return
+        try:
+            self._maybe_refresh()
+        finally:
+            self.lock.release()
+
+    def refresh_in_background(self):
+        """Start fetching on another thread, so the display isn't held up."""
+        thread = threading.Thread(target=self.maybe_refresh)
+        thread.daemon = True
+        thread.start()
+        return thread
+
+    def is_due(self):
+        """True if a fetch should be attempted now."""
         # if we don't haven't forecast or haven't recently updated we need to attempt
-        last_update = datetime.now() - self.last_updated
+        last_update = self.clock.now() - self.last_updated
         need_update = self.forecast is None or (
             last_update.total_seconds() >= self.timeout_sec
         )
         if not need_update:
-            return
-        elapsed = datetime.now() - self.last_fetched
-        if elapsed.total_seconds() < self.backoff_sec:
+            return False
+        elapsed = self.clock.now() - self.last_fetched
+        return elapsed.total_seconds() >= self.backoff_sec
+
+    def _maybe_refresh(self):
+        if not self.is_due():
             return
 
-        print("Fetching new forecast")
+        events.debug("fetch", provider=self.provider)
         f = None
+        outcome = "error"
+        start = time.perf_counter()
         try:
-            f = get_climacell_forecast(apikey, lat, lon)
+            with memory.track("fetch"):
+                if self.fetch is not None:
+                    f = self.fetch()
+                else:
+                    f = get_climacell_forecast(apikey, lat, lon)
+            outcome = "empty" if f is None else "ok"
         except:
-            traceback.print_exc()
-        self.last_fetched = datetime.now()
+            events.exception("fetch failed", provider=self.provider)
+        self.fetch_seconds.observe(time.perf_counter() - start)
+        self.fetches[outcome].inc()
+        self.last_fetched = self.clock.now()
 
         # on failure don't overwrite a forecast if we have one, just set the backoff.
         if f is None:
@@ -287,69 +451,175 @@ class ForecastState:
             else:
                 self.backoff_sec *= 2
             self.backoff_sec = min(self.backoff_sec, self.timeout_sec)
-            print("unable to fetch forecast, backoff_sec: {}".format(self.backoff_sec))
+            self.backoff.set(self.backoff_sec)
+            events.warning(
+                "backoff", provider=self.provider, seconds=self.backoff_sec
+            )
             return
 
         self.backoff_sec = 0
+        self.backoff.set(0)
         self.forecast = f
-        self.last_updated = datetime.now()
-        print_forecast(self.forecast)
-        print("next update in {} seconds".format(self.timeout_sec))
+        self.version += 1
+        self.last_updated = self.clock.now()
+        # just the hour ahead, events stay in the ring buffer for days
+        now = f.predictions[0] if getattr(f, "predictions", None) else None
+        events.info(
+            "forecast",
+            provider=self.provider,
+            version=self.version,
+            temp=now and now.temp,
+            icon=now and now.condition_icon,
+            next_update=self.timeout_sec,
+        )
 
     def get_forecast(self):
         return self.forecast
 
+    def age(self):
+        """Seconds since the forecast was fetched, -1 if there is none."""
+        if self.forecast is None:
+            return -1
+        return (self.clock.now() - self.last_updated).total_seconds()
+
+
+def run(display, program, forecast, cache=None, clock=SYSTEM_CLOCK, until=None, started=None):
+    """Show the programs named in program in turn, fetching the forecast as
+    it falls due, until clock.time() reaches until (forever by default).
+    started(), if given, is called once the first fetch has succeeded or
+    failed, straight away for a lone clock program; returning True from it
+    stops the loop.
+    """
+    # a lone clock program only changes once a minute, so sleep until then
+    # and skip fetching a forecast nobody looks at
+    clock_only = len(program) == 1 and PROGRAMS[program[0]].uses_clock
+    if cache is None:
+        cache = RenderCache(clock=clock)
+    step_seconds = dict((name, STEP_TIME.labels(program=name)) for name in program)
+    overruns = OVERRUNS.labels(loop="forecast")
+    interval = 60 if clock_only else PROGRAM_SECONDS
+    reported = started is None
+    while True:
+        for step in program:
+            if until is not None and clock.time() >= until:
+                return
+            # startup is over once the first fetch has succeeded or failed
+            if not reported and (
+                clock_only or forecast.version or forecast.backoff_sec
+            ):
+                reported = True
+                if started():
+                    return
+            profiling.poll()
+            try:
+                start = clock.monotonic()
+                with profiling.span(step):
+                    if not clock_only:
+                        with profiling.span("refresh"):
+                            forecast.maybe_refresh()
+                    with profiling.span("render"):
+                        screen = cache.get_screen(step, forecast)
+                    # the scroll in update_screen is paced to take its time,
+                    # only refreshing and rendering count against the interval
+                    work = clock.monotonic() - start
+                    if screen is not None:
+                        # only matrices that differ from the previous step change
+                        with profiling.span("draw"), memory.track("display"):
+                            display.update_screen(screen)
+                if screen is not None:
+                    step_seconds[step].observe(clock.monotonic() - start)
+                    if work > interval:
+                        overruns.inc()
+                    memory.quiet(clock.monotonic())
+                    clock.sleep(
+                        seconds_to_next_minute(clock.time())
+                        if clock_only
+                        else PROGRAM_SECONDS
+                    )
+                else:
+                    # waiting for the first forecast
+                    clock.sleep(0.1)
+            except:
+                events.exception("step failed", program=step)
+                clock.sleep(2)
+
 
 # -------------------------------------------------------------------------------
 #  M A I N
 # -------------------------------------------------------------------------------
 if __name__ == "__main__":
-    if len(sys.argv) > 1:
-        filename = sys.argv[1]
+    timeline = StartupTimeline()
+    timeline.mark("imports")
+
+    # --sim draws on simulated matrices, --startup exits once the startup
+    # timeline is complete, for benchmarking cold starts with startup.py,
+    # --metrics serves metrics on localhost and dumps them to METRICS_FILE,
+    # --log=FILE writes events to FILE instead of /tmp/weather_climacell.log
+    # ("-" for stdout), --log-level=LEVEL and --log-sample=LEVEL=RATE,... set
+    # the lowest level logged and the fraction of events kept per level,
+    # --memory-budget=MB tracks memory use and warns when the RSS goes over MB
+    options = [arg for arg in sys.argv[1:] if arg.startswith("--")]
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    if len(args) > 0:
+        filename = args[0]
     else:
         filename = "climacell_cfg.json"
 
-    programs = {
-        "clock": lambda d, f: display_clock(d),  # 24h default
-        "clock_12": lambda d, f: display_clock(d, format24=False),
-        "clock_24": lambda d, f: display_clock(d, format24=True),
-        "hi_forecast": lambda d, f: display_hi_low(d, f, show_hi=False),
-        "low_forecast": display_hi_low,
-        "current_forecast": display_current_forecast,  # moon phase || current condition || temp
-        "8_hr_forecast": display_8_hr_forecast,
-    }
     program = []
-    for arg in sys.argv[2:]:
-        if arg in programs:
-            program.append(programs[arg])
+    for arg in args[1:]:
+        if arg in PROGRAMS:
+            program.append(arg)
         else:
-            raise Exception("expected one of {}, found {}".format(programs.keys(), arg))
+            raise Exception("expected one of {}, found {}".format(PROGRAMS.keys(), arg))
 
     if not len(program):
-        program = [display_current_forecast]
+        program = ["current_forecast"]
 
     apikey, lat, lon = read_config(filename)
+    log_path = log_level = log_sample = None
+    for arg in options:
+        if arg.startswith("--log="):
+            log_path = arg[len("--log=") :]
+        elif arg.startswith("--log-level="):
+            log_level = events.parse_level(arg[len("--log-level=") :])
+        elif arg.startswith("--log-sample="):
+            log_sample = events.parse_sample(arg[len("--log-sample=") :])
+    events.start(log_path, "weather_climacell", level=log_level, sample=log_sample)
+    for arg in options:
+        if arg.startswith("--memory-budget="):
+            memory.enable(int(float(arg[len("--memory-budget=") :]) * 1024 * 1024))
+    profiling.install("weather_climacell")
+    if "--metrics" in options:
+        metrics.serve(path=METRICS_FILE)
     display = None
     while True:
         try:
-            print("creating display")
+            events.info("creating display")
             # power through any initial I/O errors
-            display = LEDDisplay()
-            reset_display(display)
+            if "--sim" in options:
+                from led_sim import SimDisplay
+
+                display = SimDisplay()
+            else:
+                display = LEDDisplay()
+            timeline.mark("bus init")
+            # banner first, the forecast scrolls in over it once fetched
+            show_banner(display)
+            timeline.mark("first frame")
             break
         except:
-            traceback.print_exc()
+            events.exception("display failed")
             time.sleep(1)
 
     timeout = 60 * 60  # 1 hour
     forecast = ForecastState(timeout)
-    while True:
-        for step in program:
-            try:
-                forecast.maybe_refresh()
-                if step(display, forecast.get_forecast()):
-                    time.sleep(2)
-                    display.clear_display()
-            except:
-                traceback.print_exc()
-                time.sleep(2)
+    if not (len(program) == 1 and PROGRAMS[program[0]].uses_clock):
+        forecast.refresh_in_background()
+
+    def started():
+        if forecast.version:
+            timeline.mark("first forecast")
+        timeline.report()
+        return "--startup" in options
+
+    run(display, program, forecast, started=started)
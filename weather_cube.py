@@ -1,8 +1,7 @@
 import sys
 import time
-from led_disp import LEDDisplay
+from led_disp import LEDDisplay, reset_display
 from weather_climacell import (
-    reset_display,
     get_climacell_forecast,
     print_forecast,
     read_config,
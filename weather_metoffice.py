@@ -14,22 +14,20 @@
 # ===============================================================================
 
 import time
-import httplib
+import http.client
 import sys
 import json
-import ConfigParser
+import configparser
 
-from led_disp import LEDDisplay
 from led8x8icons import LED8x8ICONS
 
-display = LEDDisplay()
-
 METOFFICE_URL = "datapoint.metoffice.gov.uk"
+USE_HTTPS = False
 REQ_BASE = r"/public/data/val/wxfcs/all/json/"
 CONFIG_FILE = "weather.cfg"
-API_KEY = None
-LOCATION_ID = None
- 
+# seconds to wait for the server
+REQUEST_TIMEOUT = 10
+
 ICON_MAP = {  # Day forecast codes only
     #   Met Office weather code         LED 8x8 icon
     "NA": "UNKNOWN",
@@ -57,86 +55,108 @@ ICON_MAP = {  # Day forecast codes only
 }
 
 
-def giveup():
+def giveup(display):
     """Action to take if anything bad happens."""
-    for matrix in range(4):
-        display.set_raw64(LED8x8ICONS['UNKNOWN'], matrix)
-    print "Error occured."
-    sys.exit(1)
+    for matrix in range(len(display.matrices)):
+        display.set_raw64(LED8x8ICONS["UNKNOWN"], matrix)
+    print("Error occured.")
 
 
 def read_config(filename):
-    config = ConfigParser.RawConfigParser()
-    global API_KEY, LOCATION_ID
-    try:
-        config.read(filename)
-        API_KEY = config.get('config', 'API_KEY')
-        LOCATION_ID = config.get('config', 'LOCATION_ID')
-    except Exception as err:
-        print err
-        giveup()
+    """Returns (api_key, location_id) from the config file."""
+    config = configparser.RawConfigParser()
+    config.read(filename)
+    return config.get("config", "API_KEY"), config.get("config", "LOCATION_ID")
 
 
-def make_metoffice_request():
-    """Make request to metoffice.gov.uk and return data."""
-    REQUEST = REQ_BASE + format(LOCATION_ID) + "?res=daily&key=" + API_KEY
-    try:
-        conn = httplib.HTTPConnection(METOFFICE_URL)
-        conn.request("GET", REQUEST)
-        resp = conn.getresponse()
-        data = resp.read()
-    except Exception as err:
-        print err
-        giveup()
-    else:
-        return data
+def make_request_path(api_key, location_id):
+    return REQ_BASE + format(location_id) + "?res=daily&key=" + api_key
 
 
-def get_forecast():
-    """Return a list of forecast results."""
-    json_data = json.loads(make_metoffice_request(
-    ))  # Inlcudes day & night weather for 5 days (including today)
+def make_metoffice_request(api_key, location_id, host=None, https=None):
+    """Make request to metoffice.gov.uk and return data. host and https override
+    METOFFICE_URL and USE_HTTPS.
+    """
+    if https is None:
+        https = USE_HTTPS
+    connection = http.client.HTTPSConnection if https else http.client.HTTPConnection
+    conn = connection(host or METOFFICE_URL, timeout=REQUEST_TIMEOUT)
+    try:
+        conn.request("GET", make_request_path(api_key, location_id))
+        return conn.getresponse().read()
+    finally:
+        conn.close()
+
+
+def parse_forecast(data):
+    """Return a list of forecast results from the response data."""
+    # Inlcudes day & night weather for 5 days (including today)
+    json_data = json.loads(data)
+    periods = json_data["SiteRep"]["DV"]["Location"]["Period"]
+    if len(periods) < 4:
+        raise ValueError("expected 4 days, got {}".format(len(periods)))
     forecast = []
     # Only looking for day weather for first 4 days, ignoring night and 5th day
-    for day in range(4):
-        forecast.append(json_data["SiteRep"]["DV"]
-                        ["Location"]["Period"][day]["Rep"][0]["W"])
+    for period in periods[:4]:
+        forecast.append(period["Rep"][0]["W"])
     return forecast
 
 
-def print_forecast(forecast=None):
+def get_forecast(api_key, location_id):
+    """Return a list of forecast results."""
+    return parse_forecast(make_metoffice_request(api_key, location_id))
+
+
+def forecast_icon(daily):
+    try:
+        return ICON_MAP[int(daily)]
+    except (KeyError, ValueError):
+        return "UNKNOWN"
+
+
+def render_forecast(forecast, size=4):
+    """Render forecast as a screen of icons, one day per matrix, UNKNOWN
+    for days missing from the forecast.
+    """
+    icons = [forecast_icon(daily) for daily in forecast[:size]]
+    icons += ["UNKNOWN"] * (size - len(icons))
+    return tuple(LED8x8ICONS[icon] for icon in icons)
+
+
+def print_forecast(forecast=None, location_id=None):
     """Print forecast to screen."""
     if forecast == None:
         return
-    print '-' * 20
-    print time.strftime('%Y/%m/%d %H:%M:%S')
-    print "Location id: {0}".format(LOCATION_ID)
-    print '-' * 20
+    print("-" * 20)
+    print(time.strftime("%Y/%m/%d %H:%M:%S"))
+    print("Location id: {0}".format(location_id))
+    print("-" * 20)
     for daily in forecast:
-        try:
-            print "Daily code:", daily
-            print "Icon: {0}".format(ICON_MAP[int(daily)])
-        except Exception as err:
-            print "Unknown code: {0}".format(err)
+        print("Daily code:", daily)
+        print("Icon: {0}".format(forecast_icon(daily)))
 
 
-def display_forecast(forecast=None):
+def display_forecast(display, forecast=None):
     """Display forecast as icons on LED 8x8 matrices."""
     if forecast == None:
         return
-    for matrix in range(4):
-        try:
-            icon = ICON_MAP[int(forecast[matrix])]
-            display.set_raw64(LED8x8ICONS[icon], matrix)
-        except:
-            display.set_raw64(LED8x8ICONS["UNKNOWN"], matrix)
+    for matrix, value in enumerate(render_forecast(forecast, len(display.matrices))):
+        display.set_raw64(value, matrix)
 
 
 # -------------------------------------------------------------------------------
 #  M A I N
 # -------------------------------------------------------------------------------
 if __name__ == "__main__":
-    read_config(CONFIG_FILE)
-    forecast = get_forecast()
-    print_forecast(forecast)
-    display_forecast(forecast)
+    from led_disp import LEDDisplay
+
+    display = LEDDisplay()
+    try:
+        api_key, location_id = read_config(CONFIG_FILE)
+        forecast = get_forecast(api_key, location_id)
+    except Exception as err:
+        print(err)
+        giveup(display)
+        sys.exit(1)
+    print_forecast(forecast, location_id)
+    display_forecast(display, forecast)
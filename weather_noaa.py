@@ -12,15 +12,16 @@
 # Carter Nelson
 # ===============================================================================
 import datetime
-import httplib
+import http.client
 import time
 import random
 import sys
 from collections import namedtuple
 from xml.dom.minidom import parseString
 
-from led_disp import LEDDisplay
+from led_disp import LEDDisplay, reset_display
 from clock import display_clock
+from marquee import scroll_text
 from led8x8icons import LED8x8ICONS
 
 icons = ['SUNNY', 'RAIN', 'CLOUD', 'SHOWERS', 'SNOW', 'STORM']
@@ -36,6 +37,9 @@ synonym_map = {
 ZIPCODE = 11225
 NUM_DAYS = 1
 NOAA_URL = "digital.weather.gov"
+USE_HTTPS = True
+# seconds to wait for the server
+REQUEST_TIMEOUT = 10
 REQ_BASE = r"/xml/sample_products/browser_interface/ndfdBrowserClientByDay.php?"
 TIME_FORMAT = "12+hourly"
 HEADERS = {"User-Agent": "Mozilla/5.0"}
@@ -63,37 +67,51 @@ def get_offset():
         return 1
 
 
-def make_noaa_request():
-    """Make request to NOAA REST server and return data."""
-    REQUEST = REQ_BASE + "zipCodeList={0:05d}&".format(ZIPCODE) +\
-        "format={0}&".format(TIME_FORMAT) +\
-        "numDays={0}".format(NUM_DAYS)
+def make_request_path(zipcode):
+    return (
+        REQ_BASE
+        + "zipCodeList={0:05d}&".format(zipcode)
+        + "format={0}&".format(TIME_FORMAT)
+        + "numDays={0}".format(NUM_DAYS)
+    )
+
+
+def make_noaa_request(zipcode=None, host=None, https=None):
+    """Make request to NOAA REST server and return data, None on failure.
+    host and https override NOAA_URL and USE_HTTPS.
+    """
+    if https is None:
+        https = USE_HTTPS
+    request = make_request_path(ZIPCODE if zipcode is None else zipcode)
+    connection = http.client.HTTPSConnection if https else http.client.HTTPConnection
+    conn = connection(host or NOAA_URL, timeout=REQUEST_TIMEOUT)
     try:
-        conn = httplib.HTTPSConnection(NOAA_URL)
-        conn.request("GET", REQUEST, headers=HEADERS)
-        print(NOAA_URL + REQUEST)
-        resp = conn.getresponse()
-        data = resp.read()
-    except:
+        conn.request("GET", request, headers=HEADERS)
+        print((host or NOAA_URL) + request)
+        return conn.getresponse().read()
+    except Exception:
         return None
-    else:
-        return data
+    finally:
+        conn.close()
 
 
-def get_noaa_forecast():
-    """Return a string of forecast results."""
+def parse_noaa_forecast(data, offset=None):
+    """Return a Forecast from the response data, None if it has none.
+    offset picks the day (0) or night (1) conditions of a 12 hourly
+    forecast, by default whichever is next.
+    """
     try:
-        res = parseString(make_noaa_request())
-        conditions = res.getElementsByTagName('weather-conditions')
-        temps = res.getElementsByTagName("temperature")
+        res = parseString(data)
     except Exception as e:
         print(e)
         return None
+    # keep the summaries as strings, not DOM elements holding the document
+    conditions = [e.getAttribute("weather-summary")
+                  for e in res.getElementsByTagName('weather-conditions')]
+    temps = res.getElementsByTagName("temperature")
 
-    if '12' in TIME_FORMAT:
-        offset = get_offset()
-    else:
-        offset = 0
+    if offset is None:
+        offset = get_offset() if '12' in TIME_FORMAT else 0
 
     tempDict = {}
     for i, e in enumerate(temps):
@@ -103,6 +121,8 @@ def get_noaa_forecast():
             continue
         val = int(value[0].firstChild.nodeValue)
         tempDict[typ] = val
+    # the DOM is full of reference cycles, break them rather than wait for gc
+    res.unlink()
 
     if not len(tempDict):
         return None
@@ -113,36 +133,40 @@ def get_noaa_forecast():
 
     condition_icon = 'UNKNOWN'
     if len(conditions) > 0:
-        condition = [e.getAttribute("weather-summary")
-                     for e in conditions[offset::2]][0]
+        condition = conditions[offset::2][0]
         condition_icon = normalize_daily_forecast(condition)
         if condition_icon == 'UNKNOWN':
-            print 'condition:', condition.encode('ascii', 'ignore').upper()
+            print('condition:', condition.upper())
 
     return Forecast(conditions=conditions, condition_icon=condition_icon, **tempDict)
 
 
+def get_noaa_forecast():
+    """Return a string of forecast results."""
+    return parse_noaa_forecast(make_noaa_request())
+
+
 def print_forecast(forecast=None):
     """Print forecast to screen."""
     if forecast is None:
-        print 'null forecast'
+        print('null forecast')
         return
-    print '-' * 20
-    print time.strftime('%Y/%m/%d %H:%M:%S')
-    print "ZIPCODE {0}".format(ZIPCODE)
-    print '-' * 20
-    print 'Condition: {}, Hi: {}, Lo: {}, Conditions: {}'.format(forecast.condition_icon, forecast.maximum, forecast.minimum, forecast.conditions)
+    print('-' * 20)
+    print(time.strftime('%Y/%m/%d %H:%M:%S'))
+    print("ZIPCODE {0}".format(ZIPCODE))
+    print('-' * 20)
+    print('Condition: {}, Hi: {}, Lo: {}, Conditions: {}'.format(forecast.condition_icon, forecast.maximum, forecast.minimum, forecast.conditions))
 
 
 def normalize_daily_forecast(condition):
-    condition = condition.encode('ascii', 'ignore').upper()
+    condition = condition.upper()
     for icon, synonyms in synonym_map.items():
         if icon in condition:
             return icon
         for synonym in synonyms:
             if synonym in condition:
                 return icon
-    print 'Missing icon for daily forecast', condition
+    print('Missing icon for daily forecast', condition)
     return 'UNKNOWN'
 
 
@@ -163,19 +187,14 @@ def display_forecast(display, forecast=None, show_hi=True):
     while temp > 0:
         new_d = temp % 10
         digits.append(new_d)
-        temp /= 10
+        temp //= 10
     offset = 2
     for i, d in enumerate(reversed(digits)):
         display.scroll_raw64(LED8x8ICONS['{0}'.format(d)], i + offset)
 
 
 def display_msg(display, msg, delay):
-    for i, char in enumerate(msg):
-        idx = i % 4
-        icon = char.upper().strip()
-        if icon == '':
-            icon = 'ALL_OFF'
-        display.scroll_raw64(LED8x8ICONS[icon], idx, delay)
+    scroll_text(display, msg, fps=1.0 / delay)
 
 
 
@@ -200,7 +219,7 @@ if __name__ == "__main__":
                 5 if (forecast is None or not len(
                     forecast.conditions)) else 60 * 60
             if elapsed.total_seconds() >= timeout:
-                print 'Fetching new forecast'
+                print('Fetching new forecast')
                 last_fetched = datetime.datetime.now()
                 forecast = get_noaa_forecast()
                 print_forecast(forecast)
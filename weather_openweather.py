@@ -8,22 +8,19 @@
 # Carter Nelson
 # ===============================================================================
 import time
-import httplib
+import http.client
 import sys
 import json
-import ConfigParser
+import configparser
 
-from led_disp import LEDDisplay
 from led8x8icons import LED8x8ICONS
 
-display = LEDDisplay()
-
 OPENWEATHER_URL = "api.openweathermap.org"
+USE_HTTPS = False
 REQ_BASE = r"/data/2.5/forecast?"
 CONFIG_FILE = "weather.cfg"
-APIKEY = None
-LAT = None
-LON = None
+# seconds to wait for the server
+REQUEST_TIMEOUT = 10
 
 ICON_MAP = {
     #   list.weather.main value             LED 8x8 icon
@@ -32,91 +29,115 @@ ICON_MAP = {
     "Rain": "RAIN",
     "Snow": "SNOW",
     "Atmosphere": "UNKNOWN",
-    "Clear": "SUNNY" ,
+    "Clear": "SUNNY",
     "Clouds": "CLOUD",
     "Extreme": "UNKNOWN",
     "Additional": "UNKNOWN",
 }
 
 
-def giveup():
+def giveup(display):
     """Action to take if anything bad happens."""
-    for matrix in range(4):
-        display.set_raw64(LED8x8ICONS['UNKNOWN'], matrix)
-    print "Error occured."
-    sys.exit(1)
+    for matrix in range(len(display.matrices)):
+        display.set_raw64(LED8x8ICONS["UNKNOWN"], matrix)
+    print("Error occured.")
 
 
 def read_config(filename):
-    config = ConfigParser.RawConfigParser()
-    global APIKEY, LAT, LON
-    try:
-        config.read(filename)
-        APIKEY = config.get('config', 'APIKEY')
-        LAT = config.get('config', 'LAT')
-        LON = config.get('config', 'LON')
-    except:
-        giveup()
-
-
-def make_openweather_request():
-    """Make request to forecast.io and return data."""
-    REQUEST = REQ_BASE + "lat={0}&".format(LAT) + \
-        "lon={0}&".format(LON) + \
-        "mode=json&" + \
-        "APPID={0}".format(APIKEY)
+    """Returns (apikey, lat, lon) from the config file."""
+    config = configparser.RawConfigParser()
+    config.read(filename)
+    return (
+        config.get("config", "APIKEY"),
+        config.get("config", "LAT"),
+        config.get("config", "LON"),
+    )
+
+
+def make_request_path(apikey, lat, lon):
+    return (
+        REQ_BASE
+        + "lat={0}&".format(lat)
+        + "lon={0}&".format(lon)
+        + "mode=json&"
+        + "APPID={0}".format(apikey)
+    )
+
+
+def make_openweather_request(apikey, lat, lon, host=None, https=None):
+    """Make request to openweathermap.org and return data. host and https override
+    OPENWEATHER_URL and USE_HTTPS.
+    """
+    if https is None:
+        https = USE_HTTPS
+    connection = http.client.HTTPSConnection if https else http.client.HTTPConnection
+    conn = connection(host or OPENWEATHER_URL, timeout=REQUEST_TIMEOUT)
     try:
-        conn = httplib.HTTPConnection(OPENWEATHER_URL)
-        conn.request("GET", REQUEST)
-        resp = conn.getresponse()
-        data = resp.read()
-    except:
-        giveup()
-    else:
-        return data
+        conn.request("GET", make_request_path(apikey, lat, lon))
+        return conn.getresponse().read()
+    finally:
+        conn.close()
 
 
-def get_forecast():
-    """Return a list of forecast results."""
-    json_data = json.loads(make_openweather_request())
-    daily = json_data['list'][::8]  # crude way of making it daily
+def parse_forecast(data):
+    """Return a list of forecast results from the response data."""
+    json_data = json.loads(data)
+    daily = json_data["list"][::8]  # crude way of making it daily
     if len(daily) < 4:
-        giveup
+        raise ValueError("expected 4 days, got {}".format(len(daily)))
     forecast = []
     for day in daily:
-        forecast.append(day['weather'][0]['main'])
+        forecast.append(day["weather"][0]["main"])
     return forecast
 
 
-def print_forecast(forecast=None):
+def get_forecast(apikey, lat, lon):
+    """Return a list of forecast results."""
+    return parse_forecast(make_openweather_request(apikey, lat, lon))
+
+
+def render_forecast(forecast, size=4):
+    """Render forecast as a screen of icons, one day per matrix, UNKNOWN
+    for days missing from the forecast.
+    """
+    icons = [ICON_MAP.get(daily, "UNKNOWN") for daily in forecast[:size]]
+    icons += ["UNKNOWN"] * (size - len(icons))
+    return tuple(LED8x8ICONS[icon] for icon in icons)
+
+
+def print_forecast(forecast=None, lat=None, lon=None):
     """Print forecast to screen."""
     if forecast == None:
         return
-    print '-' * 20
-    print time.strftime('%Y/%m/%d %H:%M:%S')
-    print "LAT: {0}  LON: {1}".format(LAT, LON)
-    print '-' * 20
+    print("-" * 20)
+    print(time.strftime("%Y/%m/%d %H:%M:%S"))
+    print("LAT: {0}  LON: {1}".format(lat, lon))
+    print("-" * 20)
     for daily in forecast:
-        print daily
+        print(daily)
 
 
-def display_forecast(forecast=None):
+def display_forecast(display, forecast=None):
     """Display forecast as icons on LED 8x8 matrices."""
     if forecast == None:
         return
-    for matrix in range(4):
-        try:
-            icon = ICON_MAP[forecast[matrix]]
-            display.set_raw64(LED8x8ICONS[icon], matrix)
-        except:
-            display.set_raw64(LED8x8ICONS["UNKNOWN"], matrix)
+    for matrix, value in enumerate(render_forecast(forecast, len(display.matrices))):
+        display.set_raw64(value, matrix)
 
 
 # -------------------------------------------------------------------------------
 #  M A I N
 # -------------------------------------------------------------------------------
 if __name__ == "__main__":
-    read_config(CONFIG_FILE)
-    forecast = get_forecast()
-    print_forecast(forecast)
-    display_forecast(forecast)
+    from led_disp import LEDDisplay
+
+    display = LEDDisplay()
+    try:
+        apikey, lat, lon = read_config(CONFIG_FILE)
+        forecast = get_forecast(apikey, lat, lon)
+    except Exception as err:
+        print(err)
+        giveup(display)
+        sys.exit(1)
+    print_forecast(forecast, lat, lon)
+    display_forecast(display, forecast)